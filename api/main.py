@@ -1,10 +1,13 @@
 import os
-from typing import List, Optional, Any, Dict
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+import json
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Optional, Any, Dict
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends, BackgroundTasks
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
 from pathlib import Path
 
 from src.document_ingestion.data_ingestion import (
@@ -12,17 +15,54 @@ from src.document_ingestion.data_ingestion import (
     DocumentComparator,
     ChatIngestor,
 )
+from src.document_ingestion.job_queue import get_job_queue
+from src.document_ingestion.shared_index import get_shared_index
 from src.document_analyzer.data_analysis import DocumentAnalyzer
 from src.document_compare.document_comparator import DocumentComparatorLLM
-from src.document_chat.retrieval import ConversationalRAG
+from src.document_chat.retrieval import ConversationalRAG, VECTORSTORE_CACHE, CHAIN_CACHE
+from src.document_chat.answer_cache import ANSWER_CACHE
+from src.document_chat.history_store import get_history_store
 from utils.document_ops import FastAPIFileAdapter,read_pdf_via_handler
+from utils.file_io import UploadTooLargeError
+from utils.model_loader import MODEL_REGISTRY
+from utils.embedding_cache import embedding_cache_stats
+from utils.result_cache import get_result_cache, result_key
+from utils.storage_lifecycle import get_storage_lifecycle
+from prompt.prompt_library import PROMPT_REGISTRY
+from model.models import PromptType
+from utils.concurrency import (
+    ENDPOINT_LIMITS,
+    ServiceOverloadedError,
+    run_blocking,
+    run_cpu,
+    shutdown_executors,
+)
 from logger import GLOBAL_LOGGER as log
 
 FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
 UPLOAD_BASE = os.getenv("UPLOAD_BASE", "data")
 FAISS_INDEX_NAME = os.getenv("FAISS_INDEX_NAME", "index")  # <--- keep consistent with save_local()
 
-app = FastAPI(title="Document Portal API", version="0.1")
+def _warm_models() -> None:
+    # On the event-loop thread, before anything builds the clients from an io_* thread
+    try:
+        MODEL_REGISTRY.warm()
+    except Exception as e:
+        log.error("Model warm-up failed; clients will be built on first use", error=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _warm_models()
+    jobs = get_job_queue()
+    jobs.start()
+    storage = get_storage_lifecycle()
+    storage.start()
+    yield
+    storage.stop()
+    jobs.stop()
+    shutdown_executors()
+
+app = FastAPI(title="Document Portal API", version="0.1", lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
@@ -36,6 +76,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ServiceOverloadedError)
+async def overloaded_handler(request: Request, exc: ServiceOverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _limited(endpoint: str):
+    """Per-endpoint concurrency slot; full slots + full queue -> 503."""
+    async def acquire_slot():
+        async with ENDPOINT_LIMITS[endpoint]:
+            yield
+    return Depends(acquire_slot)
+
+async def _acquire_slot(endpoint: str) -> Callable[[], Awaitable[None]]:
+    """
+    Take an endpoint slot for a streamed response. A yield dependency exits before a
+    StreamingResponse body runs, so the body releases the slot itself; the returned
+    release is idempotent (body end, background task and setup errors all call it).
+    """
+    limiter = ENDPOINT_LIMITS[endpoint]
+    await limiter.__aenter__()  # full -> ServiceOverloadedError -> 503
+    released = False
+
+    async def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            await limiter.__aexit__(None, None, None)
+    return release
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_ui(request: Request):
     log.info("Serving UI homepage.")
@@ -48,41 +120,137 @@ def health() -> Dict[str, str]:
     log.info("Health check passed.")
     return {"status": "ok", "service": "document-portal"}
 
+@app.post("/models/refresh")
+async def refresh_models() -> Dict[str, str]:
+    # Rebuild config, API keys and model clients (no restart needed), on the event loop
+    MODEL_REGISTRY.refresh()
+    _warm_models()
+    log.info("Model registry refresh requested.")
+    return {"status": "refreshed"}
+
+@app.get("/cache/stats")
+def cache_stats() -> Dict[str, Any]:
+    results = get_result_cache()
+    return {
+        "vectorstore": VECTORSTORE_CACHE.stats(),
+        "chain": CHAIN_CACHE.stats(),
+        "answer": ANSWER_CACHE.stats(),
+        "embeddings": embedding_cache_stats(),
+        "results": results.stats() if results is not None else None,
+        "endpoints": {name: lim.stats() for name, lim in ENDPOINT_LIMITS.items()},
+    }
+
+@app.get("/storage/report")
+async def storage_report() -> Dict[str, Any]:
+    """Dry run of the storage sweeper: per-store usage, quotas and the sessions it would evict."""
+    return await run_blocking(get_storage_lifecycle().sweep, True)
+
+async def _touch(store: str, session_id: Optional[str]) -> None:
+    # Last-access bookkeeping for the storage sweeper (throttled per session)
+    await run_blocking(get_storage_lifecycle().touch, store, session_id)
+
+async def _touch_chat(session_id: Optional[str]) -> None:
+    # A chat session lives in both stores; one kept fresh must not leave the other to be swept
+    await _touch("chat_uploads", session_id)
+    await _touch("chat_index", session_id)
+
+def _cached_result(kind: str, file_hashes: List[str], prompt_types: List[PromptType],
+                   settings: Dict[str, Any], no_cache: bool):
+    """
+    (cache key, cached result or None); key is None when the result cache is disabled.
+    The key covers every prompt and config value the result depends on.
+    """
+    store = get_result_cache()
+    if store is None:
+        return None, None
+    prompts = [PROMPT_REGISTRY[p.value] for p in prompt_types]
+    key = result_key(file_hashes, prompts, MODEL_REGISTRY.get_llm(), settings)
+    # no_cache skips the lookup but still refreshes the stored result
+    return key, (None if no_cache else store.get(kind, key))
+
+def _store_result(kind: str, key: Optional[str], value: Any) -> None:
+    store = get_result_cache()
+    if key is not None and store is not None:
+        store.put(kind, key, value)
+
 # ---------- ANALYZE ----------
 @app.post("/analyze")
-async def analyze_document(file: UploadFile = File(...)) -> Any:
+async def analyze_document(
+    file: UploadFile = File(...),
+    no_cache: bool = Form(False),
+    _slot: None = _limited("analyze"),
+) -> Any:
     try:
         log.info(f"Received file for analysis: {file.filename}")
         dh = DocHandler()
-        saved_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = read_pdf_via_handler(dh, saved_path)
-        analyzer = DocumentAnalyzer()
-        result = analyzer.analyze_document(text)
+        saved_path = await run_blocking(dh.save_pdf, FastAPIFileAdapter(file))
+        await _touch("analysis", dh.session_id)
+        # large documents go through the map/reduce prompts, sized by the analysis budgets
+        analysis_cfg = MODEL_REGISTRY.config.get("analysis", {})
+        key, cached = await run_blocking(
+            _cached_result, "analyze", [dh.last_sha256],
+            [PromptType.DOCUMENT_ANALYSIS, PromptType.DOCUMENT_ANALYSIS_MAP, PromptType.DOCUMENT_ANALYSIS_REDUCE],
+            {name: analysis_cfg.get(name) for name in ("single_shot_max_tokens", "group_max_tokens")},
+            no_cache,
+        )
+        if cached is not None:
+            log.info("Document analysis served from cache.", sha256=dh.last_sha256)
+            return JSONResponse(content=cached, headers={"X-Cache": "hit"})
+        text = await run_cpu(read_pdf_via_handler, dh, saved_path)
+        analyzer = await run_blocking(DocumentAnalyzer)
+        result = await analyzer.aanalyze_document(text)
+        await run_blocking(_store_result, "analyze", key, result)
         log.info("Document analysis complete.")
-        return JSONResponse(content=result)
+        return JSONResponse(content=result, headers={"X-Cache": "miss"})
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         log.exception("Error during document analysis")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
 
 # ---------- COMPARE ----------
 @app.post("/compare")
-async def compare_documents(reference: UploadFile = File(...), actual: UploadFile = File(...)) -> Any:
+async def compare_documents(
+    reference: UploadFile = File(...),
+    actual: UploadFile = File(...),
+    no_cache: bool = Form(False),
+    _slot: None = _limited("compare"),
+) -> Any:
     try:
         log.info(f"Comparing files: {reference.filename} vs {actual.filename}")
         dc = DocumentComparator()
-        ref_path, act_path = dc.save_uploaded_files(
-            FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
+        ref_path, act_path = await run_blocking(
+            dc.save_uploaded_files, FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
         )
         _ = ref_path, act_path
-        combined_text = dc.combine_documents()
-        comp = DocumentComparatorLLM()
-        df = comp.compare_documents(combined_text)
+        await _touch("compare", dc.session_id)
+        compare_cfg = MODEL_REGISTRY.config.get("compare", {})
+        prefilter = compare_cfg.get("prefilter", True)
+        prompt_type = PromptType.DOCUMENT_COMPARISON_DIFF if prefilter else PromptType.DOCUMENT_COMPARISON
+        context_lines = compare_cfg.get("context_lines", 2)
+        settings = {"prefilter": bool(prefilter), "context_lines": context_lines if prefilter else None}
+        key, rows = await run_blocking(_cached_result, "compare", dc.file_hashes, [prompt_type], settings, no_cache)
+        if rows is not None:
+            log.info("Document comparison served from cache.", session_id=dc.session_id)
+            return {"rows": rows, "session_id": dc.session_id, "cached": True}
+        comp = await run_blocking(DocumentComparatorLLM)
+        if prefilter:
+            # unchanged pages are settled locally; only changed pages reach the LLM
+            page_rows = await run_cpu(dc.diff_documents, context_lines)
+            df = await comp.acompare_changes(page_rows)
+        else:
+            combined_text = await run_cpu(dc.combine_documents)
+            df = await comp.acompare_documents(combined_text)
+        rows = df.to_dict(orient="records")
+        await run_blocking(_store_result, "compare", key, rows)
         log.info("Document comparison completed.")
-        return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id}
+        return {"rows": rows, "session_id": dc.session_id, "cached": False}
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         log.exception("Comparison failed")
         raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
@@ -96,52 +264,126 @@ async def chat_build_index(
     chunk_size: int = Form(1000),
     chunk_overlap: int = Form(200),
     k: int = Form(5),
+    async_mode: bool = Form(False),
+    _slot: None = _limited("chat_index"),
 ) -> Any:
     try:
         log.info(f"Indexing chat session. Session ID: {session_id}, Files: {[f.filename for f in files]}")
         wrapped = [FastAPIFileAdapter(f) for f in files]
         # this is my main class for storing a data into VDB
         # created a object of ChatIngestor
-        ci = ChatIngestor(
+        ci = await run_blocking(
+            ChatIngestor,
             temp_base=UPLOAD_BASE,
             faiss_base=FAISS_BASE,
             use_session_dirs=use_session_dirs,
             session_id=session_id or None,
         )
+        paths = await run_blocking(ci.save_files, wrapped)
+        if use_session_dirs:
+            await _touch_chat(ci.session_id)
+        if async_mode:
+            # Files are on disk; parse/split/embed/persist runs on the background job workers
+            job_id = await run_blocking(
+                get_job_queue().submit,
+                ci.session_id,
+                {
+                    "paths": [str(p) for p in paths],
+                    "temp_base": UPLOAD_BASE,
+                    "faiss_base": FAISS_BASE,
+                    "use_session_dirs": use_session_dirs,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                },
+            )
+            return JSONResponse(
+                status_code=202,
+                content={"job_id": job_id, "status": "queued", "session_id": ci.session_id, "k": k},
+            )
         # NOTE: ensure your ChatIngestor saves with index_name="index" or FAISS_INDEX_NAME
         # e.g., if it calls FAISS.save_local(dir, index_name=FAISS_INDEX_NAME)
-        ci.built_retriver(  # if your method name is actually build_retriever, fix it there as well
-            wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+        # parse -> split -> embed -> persist all block, so the pipeline runs off the event loop
+        await run_blocking(
+            ci.ingest_paths, paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap
         )
         log.info(f"Index created successfully for session: {ci.session_id}")
-        return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
+        return {
+            "session_id": ci.session_id,
+            "k": k,
+            "use_session_dirs": use_session_dirs,
+            "ingest": ci.last_report.model_dump() if ci.last_report else None,
+        }
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         log.exception("Chat index building failed")
         raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
 
+@app.get("/chat/index/jobs/{job_id}")
+async def chat_index_job_status(job_id: str) -> Any:
+    job = await run_blocking(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
 # ---------- CHAT: QUERY ----------
+def _resolve_index_dir(session_id: Optional[str], use_session_dirs: bool) -> str:
+    if use_session_dirs and not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
+    index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
+    if not os.path.isdir(index_dir):
+        raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+    return index_dir
+
+async def _resolve_chat_index(session_id: Optional[str], use_session_dirs: bool) -> Optional[str]:
+    """Validate the chat target: the session's own index dir, or None for the shared index."""
+    shared = get_shared_index() if use_session_dirs else None
+    if shared is None:
+        return _resolve_index_dir(session_id, use_session_dirs)
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
+    if not await run_blocking(shared.has_session, session_id):
+        raise HTTPException(status_code=404, detail=f"No indexed documents for session: {session_id}")
+    return None
+
+async def _load_retriever(rag: ConversationalRAG, index_dir: Optional[str], session_id: Optional[str], k: int) -> None:
+    if index_dir is not None:
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME)
+    else:
+        await run_blocking(rag.load_retriever_from_shared, get_shared_index(), session_id, k=k)
+
+async def _load_history(session_id: Optional[str]) -> list:
+    return await run_blocking(get_history_store().load, session_id) if session_id else []
+
+def _save_turn(rag: ConversationalRAG, session_id: Optional[str], question: str, answer: str) -> None:
+    if session_id:
+        get_history_store().append(session_id, question, answer, summarizer=rag.summarize_history)
+
 @app.post("/chat/query")
 async def chat_query(
+    background: BackgroundTasks,
     question: str = Form(...),
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     k: int = Form(5),
+    _slot: None = _limited("chat_query"),
 ) -> Any:
     try:
         log.info(f"Received chat query: '{question}' | session: {session_id}")
-        if use_session_dirs and not session_id:
-            raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
-
-        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
-        if not os.path.isdir(index_dir):
-            raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+        index_dir = await _resolve_chat_index(session_id, use_session_dirs)
+        if use_session_dirs:
+            await _touch_chat(session_id)
 
-        rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=FAISS_INDEX_NAME)  # build retriever + chain
-        response = rag.invoke(question, chat_history=[])
-        log.info("Chat query handled successfully.")
+        rag = await run_blocking(ConversationalRAG, session_id=session_id)
+        # build retriever + chain (cached; a cold load maps the index from disk)
+        await _load_retriever(rag, index_dir, session_id, k)
+        history = await _load_history(session_id)
+        response = await rag.ainvoke(question, chat_history=history)
+        # persisting (and occasionally summarizing) history happens after the response is sent
+        background.add_task(_save_turn, rag, session_id, question, response)
+        log.info("Chat query handled successfully.", history_messages=len(history))
 
         return {
             "answer": response,
@@ -155,6 +397,52 @@ async def chat_query(
         log.exception("Chat query failed")
         raise HTTPException(status_code=500, detail=f"Query failed: {e}")
 
+@app.post("/chat/query/stream")
+async def chat_query_stream(
+    question: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+) -> Any:
+    """Server-sent events: `sources`, then `token`* as generated, then `done` (or `error`)."""
+    release = await _acquire_slot("chat_query")  # held until the stream ends
+    try:
+        log.info(f"Received streaming chat query: '{question}' | session: {session_id}")
+        index_dir = await _resolve_chat_index(session_id, use_session_dirs)
+        if use_session_dirs:
+            await _touch_chat(session_id)
+        rag = await run_blocking(ConversationalRAG, session_id=session_id)
+        await _load_retriever(rag, index_dir, session_id, k)
+        history = await _load_history(session_id)
+    except HTTPException:
+        await release()
+        raise
+    except Exception as e:
+        await release()
+        log.exception("Chat stream setup failed")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+    async def event_stream():
+        try:
+            answer = []
+            async for ev in rag.astream(question, chat_history=history):
+                if ev["event"] == "token":
+                    answer.append(ev["data"])
+                yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+            await run_blocking(_save_turn, rag, session_id, question, "".join(answer))
+        except Exception as e:
+            log.exception("Chat stream failed")
+            yield f"event: error\ndata: {json.dumps({'detail': f'Query failed: {e}'})}\n\n"
+        finally:
+            await release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),  # covers a client gone before the body started
+    )
+
 # command for executing the fast api
 # uvicorn api.main:app --port 8080 --reload    
 #uvicorn api.main:app --host 0.0.0.0 --port 8080 --reload
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Recall vs latency vs memory for FAISS index factories (faiss_db.index in config.yaml).
+
+    python benchmarks/faiss_index_benchmark.py --n 200000 --dim 768
+    python benchmarks/faiss_index_benchmark.py --index-dir faiss_index/<session> \
+        --factory Flat --factory "HNSW32,Flat" --factory "IVF1024,PQ64" --nprobe 8 --nprobe 32
+
+Ground truth is an exact flat search over the same vectors. Without --index-dir the
+vectors are synthetic (clustered Gaussian), which is pessimistic for IVF/PQ compared
+to real embeddings.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.document_ingestion.faiss_segments import (  # noqa: E402
+    SegmentedIndex, VECTORS_FILE, build_index, tune_search,
+)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def index_dir_vectors(index_dir: str, index_name: str) -> np.ndarray:
+    """All vectors of a segmented (or legacy) index directory, in load order."""
+    seg_index = SegmentedIndex(index_dir, index_name)
+    parts = []
+    for seg in seg_index.segments():
+        seg_dir = Path(index_dir) / seg["path"]
+        if (seg_dir / VECTORS_FILE).exists():
+            parts.append(np.load(seg_dir / VECTORS_FILE))
+        else:
+            index = faiss.read_index(str(seg_dir / f"{index_name}.faiss"))
+            parts.append(index.reconstruct_n(0, index.ntotal))
+    return np.ascontiguousarray(np.vstack(parts), dtype=np.float32)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = ids[0]
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    t0 = time.perf_counter()
+    index.search(queries, k)
+    batch_s = time.perf_counter() - t0
+    return {
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "batch_qps": round(len(queries) / batch_s, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--index-dir", help="benchmark the vectors of an existing index directory")
+    ap.add_argument("--index-name", default="index")
+    ap.add_argument("--n", type=int, default=100_000, help="synthetic vectors")
+    ap.add_argument("--dim", type=int, default=768, help="synthetic vector dimension")
+    ap.add_argument("--factory", action="append", help="faiss.index_factory string (repeatable)")
+    ap.add_argument("--nprobe", type=int, action="append", help="IVF nprobe values to sweep")
+    ap.add_argument("--ef", type=int, action="append", help="HNSW efSearch values to sweep")
+    ap.add_argument("--train-sample", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = ap.parse_args()
+
+    vectors = index_dir_vectors(args.index_dir, args.index_name) if args.index_dir \
+        else synthetic_vectors(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+
+    factories = args.factory or ["Flat", "HNSW32,Flat", "IVF1024,Flat", "IVF1024,PQ64"]
+    sweeps = {"nprobe": args.nprobe or [8, 32, 128], "efSearch": args.ef or [32, 128, 512]}
+    print(f"vectors={len(vectors)} dim={vectors.shape[1]} queries={len(queries)} k={args.k}", file=sys.stderr)
+
+    for factory in factories:
+        t0 = time.perf_counter()
+        cfg = {"factory": factory, "min_vectors": 0, "train_sample": args.train_sample}
+        index, used = build_index(vectors, cfg)
+        build_s = round(time.perf_counter() - t0, 2)
+        size_mb = round(len(faiss.serialize_index(index)) / 2**20, 1)
+        if used != factory:
+            print(f"{factory}: build failed, fell back to {used}", file=sys.stderr)
+        param = "nprobe" if "IVF" in used else "efSearch" if "HNSW" in used else None
+        for value in (sweeps[param] if param else [None]):
+            if param:
+                tune_search(index, {param: value})
+            row = {"factory": used, param or "param": value, "build_s": build_s, "size_mb": size_mb,
+                   **measure(index, queries, truth, args.k)}
+            if args.json:
+                print(json.dumps(row))
+            else:
+                print("  ".join(f"{key}={val}" for key, val in row.items()))
+
+
+if __name__ == "__main__":
+    main()
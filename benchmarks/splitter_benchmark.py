@@ -0,0 +1,98 @@
+"""
+Chunking throughput: LangChain's RecursiveCharacterTextSplitter vs FastTextSplitter.
+
+    python benchmarks/splitter_benchmark.py --pages 2000
+    python benchmarks/splitter_benchmark.py --file data/<session>/report.pdf --chunk-size 1000 --overlap 200
+    python benchmarks/splitter_benchmark.py --workers 4 --unit tokens
+
+Both splitters get the same pages; the run fails if their chunks differ (character
+mode, or token mode with the same length function). Without --file the pages are
+synthetic prose with paragraphs, line breaks and the odd unbreakable token.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from langchain.schema import Document  # noqa: E402
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from src.document_ingestion.text_splitter import FastTextSplitter, token_counter  # noqa: E402
+from utils.document_ops import load_documents  # noqa: E402
+
+WORDS = ("the of and to in is for on that with as by this are be from at or an it was which "
+         "revenue quarter agreement section party clause provided however notwithstanding").split()
+
+
+def synthetic_pages(pages: int, chars: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    docs = []
+    for page in range(pages):
+        parts, size = [], 0
+        while size < chars:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+            if rng.random() < 0.01:
+                sentence += " " + "x" * rng.randint(200, 2500)  # table rows, URLs, base64...
+            parts.append(sentence)
+            parts.append(rng.choice([" ", " ", " ", "\n", "\n\n"]))
+            size += len(sentence) + 1
+        docs.append(Document(page_content="".join(parts), metadata={"source": "synthetic", "page": page}))
+    return docs
+
+
+def timed(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--file", action="append", help="split the pages of a real document (repeatable)")
+    ap.add_argument("--pages", type=int, default=1000, help="synthetic pages")
+    ap.add_argument("--page-chars", type=int, default=3000, help="characters per synthetic page")
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    ap.add_argument("--overlap", type=int, default=200)
+    ap.add_argument("--unit", choices=["chars", "tokens"], default="chars")
+    ap.add_argument("--workers", type=int, default=1, help="parallel batches for FastTextSplitter (run on the concurrency.cpu_workers pool)")
+    ap.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    ap.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = ap.parse_args()
+
+    docs = load_documents([Path(f) for f in args.file], max_workers=1) if args.file \
+        else synthetic_pages(args.pages, args.page_chars)
+    chars = sum(len(d.page_content) for d in docs)
+    length_function = token_counter() if args.unit == "tokens" else None
+    print(f"pages={len(docs)} chars={chars} chunk_size={args.chunk_size} overlap={args.overlap} "
+          f"unit={args.unit}", file=sys.stderr)
+
+    extra = {"length_function": length_function} if length_function else {}
+    reference = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.overlap, add_start_index=True, **extra
+    )
+    fast = FastTextSplitter(args.chunk_size, args.overlap, length_function=length_function,
+                            workers=args.workers, parallel_min_chars=0)
+
+    ref_s, ref_chunks = timed(lambda: reference.split_documents(docs), args.repeat)
+    fast_s, fast_chunks = timed(lambda: fast.split_documents(docs), args.repeat)
+    same = [c.page_content for c in ref_chunks] == [c.page_content for c in fast_chunks]
+
+    for name, seconds, chunks in (("langchain", ref_s, ref_chunks), ("fast", fast_s, fast_chunks)):
+        row = {"splitter": name, "seconds": round(seconds, 4), "chunks": len(chunks),
+               "mb_per_s": round(chars / seconds / 2**20, 2), "speedup": round(ref_s / seconds, 2)}
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print("  ".join(f"{key}={val}" for key, val in row.items()))
+    if not same:
+        sys.exit("chunk boundaries differ between splitters")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, RootModel
-from typing import List, Union
+from typing import List, Optional, Union
 from enum import Enum
 
 class Metadata(BaseModel):
@@ -18,8 +18,25 @@ class ChangeFormat(BaseModel):
 
 class SummaryResponse(RootModel[list[ChangeFormat]]):
     pass
+
+class PageChange(BaseModel):
+    Page: str                       # row label, e.g. "4" or "3->4" when pages shifted
+    ref_page: Optional[int] = None  # None for a page added in the actual document
+    act_page: Optional[int] = None  # None for a page removed from the reference
+    changed: bool = True
+    hunks: str = ""                 # line-level diff sent to the LLM
+class IngestReport(BaseModel):
+    seen: int = 0       # chunks offered to the index
+    skipped: int = 0    # already indexed (or duplicated within the batch)
+    embedded: int = 0   # chunks sent to the embedding model
+    written: int = 0    # vectors persisted to the index
+
 class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis"
+    DOCUMENT_ANALYSIS_MAP = "document_analysis_map"
+    DOCUMENT_ANALYSIS_REDUCE = "document_analysis_reduce"
     DOCUMENT_COMPARISON = "document_comparison"
+    DOCUMENT_COMPARISON_DIFF = "document_comparison_diff"
     CONTEXTUALIZE_QUESTION = "contextualize_question"
-    CONTEXT_QA = "context_qa"
\ No newline at end of file
+    CONTEXT_QA = "context_qa"
+    CONVERSATION_SUMMARY = "conversation_summary"
\ No newline at end of file
@@ -11,6 +11,30 @@ Analyze this document:
 {document_text}
 """)
 
+# Map step of map-reduce analysis: one page group of a long document
+document_analysis_map_prompt = ChatPromptTemplate.from_template("""
+You are analyzing one part ({part}) of a longer document.
+Extract what this part reveals and return ONLY valid JSON matching the exact schema below.
+Summarize only this part. Use "Not Available" for fields this part does not show.
+
+{format_instructions}
+
+Document part:
+{document_text}
+""")
+
+# Reduce step of map-reduce analysis: merge per-part results into one
+document_analysis_reduce_prompt = ChatPromptTemplate.from_template("""
+You are given JSON analyses of consecutive parts of one document ({page_count} pages).
+Merge them into a single analysis of the whole document and return ONLY valid JSON matching the exact schema below.
+Combine the summaries into a concise, non-repetitive summary; prefer concrete values over "Not Available".
+
+{format_instructions}
+
+Part analyses:
+{partials}
+""")
+
 # Prompt for document comparison
 document_comparison_prompt = ChatPromptTemplate.from_template("""
 You will be provided with content from two PDFs. Your tasks are as follows:
@@ -29,6 +53,24 @@ Your response should follow this format:
 {format_instruction}
 """)
 
+# Prompt for comparing only the pages a local diff found changed
+document_comparison_diff_prompt = ChatPromptTemplate.from_template("""
+You will be given line-level diffs of the pages that differ between a reference PDF and an actual PDF.
+Lines starting with "-" are only in the reference, lines starting with "+" are only in the actual document.
+Pages without differences have already been handled and are not included.
+
+For every page section below, describe the change in plain language.
+Use the page label exactly as given after "### Page" for the Page field.
+
+Changed pages:
+
+{changes}
+
+Your response should follow this format:
+
+{format_instruction}
+""")
+
 # Prompt for contextual question rewriting
 contextualize_question_prompt = ChatPromptTemplate.from_messages([
     ("system", (
@@ -51,10 +93,26 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}"),
 ])
 
+# Prompt for folding older chat turns into a running summary
+conversation_summary_prompt = ChatPromptTemplate.from_template("""
+Progressively summarize the conversation below, adding onto the existing summary.
+Keep facts, names, numbers and document references the user may refer back to. Return only the new summary.
+
+Existing summary:
+{summary}
+
+New conversation lines:
+{transcript}
+""")
+
 # Central dictionary to register prompts
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
+    "document_analysis_map": document_analysis_map_prompt,
+    "document_analysis_reduce": document_analysis_reduce_prompt,
     "document_comparison": document_comparison_prompt,
+    "document_comparison_diff": document_comparison_diff_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
+    "conversation_summary": conversation_summary_prompt,
 }
@@ -1,12 +1,16 @@
 import os
 import sys
-from utils.model_loader import ModelLoader
+import json
+from typing import Any, Dict, List
+from utils.model_loader import MODEL_REGISTRY
+from utils.document_ops import estimate_tokens
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 from model.models import *
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
 from prompt.prompt_library import PROMPT_REGISTRY # type: ignore
+from src.document_analyzer.map_reduce import split_pages, group_pages, batch_partials
 
 class DocumentAnalyzer:
     """
@@ -15,14 +19,22 @@ class DocumentAnalyzer:
     """
     def __init__(self):
         try:
-            self.loader=ModelLoader()
-            self.llm=self.loader.load_llm()
+            self.loader=MODEL_REGISTRY.loader
+            self.llm=MODEL_REGISTRY.get_llm()
             
             # Prepare parsers
             self.parser = JsonOutputParser(pydantic_object=Metadata)
             self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
             
             self.prompt = PROMPT_REGISTRY["document_analysis"]
+            self.map_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_MAP.value]
+            self.reduce_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_REDUCE.value]
+            
+            # Documents above single_shot_max_tokens are analyzed map-reduce style
+            cfg = self.loader.config.get("analysis", {})
+            self.single_shot_max_tokens = int(cfg.get("single_shot_max_tokens", 24000))
+            self.group_max_tokens = int(cfg.get("group_max_tokens", 8000))
+            self.max_concurrency = int(cfg.get("max_concurrency", 4))
             
             log.info("DocumentAnalyzer initialized successfully")
             
@@ -38,6 +50,9 @@ class DocumentAnalyzer:
         Analyze a document's text and extract structured metadata & summary.
         """
         try:
+            if self.use_map_reduce(document_text):
+                return self._map_reduce(document_text)
+
             chain = self.prompt | self.llm | self.fixing_parser
             
             log.info("Meta-data analysis chain initialized")
@@ -54,5 +69,108 @@ class DocumentAnalyzer:
         except Exception as e:
             log.error("Metadata analysis failed", error=str(e))
             raise DocumentPortalException("Metadata extraction failed",sys)
-        
-    
+
+    async def aanalyze_document(self, document_text:str)-> dict:
+        """
+        Async variant of analyze_document (uses ainvoke, does not block the event loop).
+        """
+        try:
+            if self.use_map_reduce(document_text):
+                return await self._amap_reduce(document_text)
+
+            chain = self.prompt | self.llm | self.fixing_parser
+
+            response = await chain.ainvoke({
+                "format_instructions": self.parser.get_format_instructions(),
+                "document_text": document_text
+            })
+
+            log.info("Metadata extraction successful", keys=list(response.keys()))
+
+            return response
+
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
+
+    def use_map_reduce(self, document_text: str) -> bool:
+        return estimate_tokens(document_text) > self.single_shot_max_tokens
+
+    # ---------- Map-reduce ----------
+
+    def _map_inputs(self, document_text: str):
+        pages = split_pages(document_text)
+        groups = group_pages(pages, self.group_max_tokens)
+        inputs = [
+            {
+                "format_instructions": self.parser.get_format_instructions(),
+                "part": f"pages {first}-{last}" if first != last else f"page {first}",
+                "document_text": text,
+            }
+            for first, last, text in groups
+        ]
+        log.info("Map-reduce analysis", pages=len(pages), groups=len(groups),
+                 tokens=estimate_tokens(document_text))
+        return inputs, len(pages)
+
+    def _reduce_inputs(self, partials: List[Dict[str, Any]], page_count: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "format_instructions": self.parser.get_format_instructions(),
+                "page_count": page_count,
+                "partials": json.dumps(batch, ensure_ascii=False, indent=1),
+            }
+            for batch in batch_partials(partials, self.group_max_tokens)
+        ]
+
+    @staticmethod
+    def _successful(results: List[Any], stage: str) -> List[Dict[str, Any]]:
+        # a failed group only loses its part of the summary, unless every group failed
+        ok = [r for r in results if not isinstance(r, Exception)]
+        for r in results:
+            if isinstance(r, Exception):
+                log.warning("Map-reduce call failed", stage=stage, error=str(r))
+        if not ok:
+            raise results[0]
+        return ok
+
+    @staticmethod
+    def _finish(result: Dict[str, Any], page_count: int) -> Dict[str, Any]:
+        result["PageCount"] = page_count
+        log.info("Metadata extraction successful", keys=list(result.keys()), mode="map_reduce")
+        return result
+
+    def _map_reduce(self, document_text: str) -> dict:
+        inputs, page_count = self._map_inputs(document_text)
+        batch_cfg = {"max_concurrency": self.max_concurrency}
+        map_chain = self.map_prompt | self.llm | self.fixing_parser
+        partials = self._successful(map_chain.batch(inputs, config=batch_cfg, return_exceptions=True), "map")
+
+        reduce_chain = self.reduce_prompt | self.llm | self.fixing_parser
+        # collapse until the partials fit one reduce call
+        while len(partials) > 1:
+            reduce_inputs = self._reduce_inputs(partials, page_count)
+            if len(reduce_inputs) == 1:
+                return self._finish(reduce_chain.invoke(reduce_inputs[0]), page_count)
+            partials = self._successful(
+                reduce_chain.batch(reduce_inputs, config=batch_cfg, return_exceptions=True), "reduce"
+            )
+        return self._finish(partials[0], page_count)
+
+    async def _amap_reduce(self, document_text: str) -> dict:
+        inputs, page_count = self._map_inputs(document_text)
+        batch_cfg = {"max_concurrency": self.max_concurrency}
+        map_chain = self.map_prompt | self.llm | self.fixing_parser
+        partials = self._successful(
+            await map_chain.abatch(inputs, config=batch_cfg, return_exceptions=True), "map"
+        )
+
+        reduce_chain = self.reduce_prompt | self.llm | self.fixing_parser
+        while len(partials) > 1:
+            reduce_inputs = self._reduce_inputs(partials, page_count)
+            if len(reduce_inputs) == 1:
+                return self._finish(await reduce_chain.ainvoke(reduce_inputs[0]), page_count)
+            partials = self._successful(
+                await reduce_chain.abatch(reduce_inputs, config=batch_cfg, return_exceptions=True), "reduce"
+            )
+        return self._finish(partials[0], page_count)
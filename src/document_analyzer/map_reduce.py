@@ -0,0 +1,77 @@
+from __future__ import annotations
+import json
+import re
+from typing import Any, Dict, List, Tuple
+from utils.document_ops import estimate_tokens
+
+# Page markers written by DocHandler.read_pdf ("--- Page 3 ---")
+_PAGE_MARKER = re.compile(r"^[ \t]*---[ \t]*Page[ \t]+(\d+)[ \t]*---[ \t]*$", re.MULTILINE)
+
+# (first page, last page, text with page markers)
+PageGroup = Tuple[int, int, str]
+
+
+def split_pages(text: str) -> List[Tuple[int, str]]:
+    """Split read_pdf output into (page number, page text); unmarked text is one page."""
+    matches = list(_PAGE_MARKER.finditer(text))
+    if not matches:
+        return [(1, text.strip())]
+    pages = []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        pages.append((int(m.group(1)), text[m.end():end].strip()))
+    return pages
+
+
+def _cut(text: str, max_tokens: int) -> List[str]:
+    """Cut a page that alone exceeds the budget, preferring line breaks."""
+    limit = max(1, max_tokens * 4)
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind("\n", limit // 2, limit)
+        cut = cut if cut > 0 else limit
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    pieces.append(text)
+    return pieces
+
+
+def group_pages(pages: List[Tuple[int, str]], max_tokens: int) -> List[PageGroup]:
+    """Pack consecutive pages into groups of at most ~max_tokens each."""
+    groups: List[PageGroup] = []
+    current: List[Tuple[int, str]] = []
+    used = 0
+
+    def flush():
+        nonlocal current, used
+        if current:
+            body = "\n".join(f"--- Page {num} ---\n{piece}" for num, piece in current)
+            groups.append((current[0][0], current[-1][0], body))
+        current, used = [], 0
+
+    for num, body in pages:
+        for piece in _cut(body, max_tokens):
+            tokens = estimate_tokens(piece)
+            if current and used + tokens > max_tokens:
+                flush()
+            current.append((num, piece))
+            used += tokens
+    flush()
+    return groups
+
+
+def batch_partials(partials: List[Dict[str, Any]], max_tokens: int) -> List[List[Dict[str, Any]]]:
+    """
+    Split partial analyses into reduce batches that fit the token budget.
+    Each batch takes at least two partials so repeated reduce rounds always converge.
+    """
+    batches: List[List[Dict[str, Any]]] = [[]]
+    used = 0
+    for p in partials:
+        tokens = estimate_tokens(json.dumps(p, ensure_ascii=False))
+        if len(batches[-1]) >= 2 and used + tokens > max_tokens:
+            batches.append([])
+            used = 0
+        batches[-1].append(p)
+        used += tokens
+    return batches
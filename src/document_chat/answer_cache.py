@@ -0,0 +1,176 @@
+from __future__ import annotations
+import os
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.config_loader import load_config
+from utils.lru_cache import LRUCache
+from logger import GLOBAL_LOGGER as log
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WS.sub(" ", question.casefold()).strip().rstrip("?.! ").strip()
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class AnswerCache:
+    """
+    Answers keyed by (scope, normalized question) and tagged with the index generation,
+    so any ingest into the index makes its cached answers stale.
+
+    `scope` identifies the index plus retriever/LLM settings; its first element must be
+    the absolute index directory (see `invalidate_index`). With `similarity_threshold`
+    set, an exact miss falls back to the closest cached question in the same scope and
+    generation whose embedding cosine similarity is at least the threshold.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: Optional[float] = 3600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        self.similarity_threshold = float(similarity_threshold) if similarity_threshold else None
+        self._entries = LRUCache(
+            "answer", max_entries=max_entries, ttl_seconds=ttl_seconds, on_evict=self._forget
+        )
+        # scope -> {normalized question -> (generation, unit vector)} for the similarity scan
+        self._vectors: Dict[Hashable, Dict[str, Tuple[Any, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold is not None
+
+    def get(
+        self,
+        scope: Hashable,
+        generation: Any,
+        question: str,
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Return (cached entry or None, question embedding or None).
+        `embed` is only called on an exact miss with semantic matching enabled;
+        pass the returned vector to `put` so it is not computed twice.
+        """
+        hit = self._exact(scope, generation, question)
+        if hit is not None or not self.semantic or embed is None:
+            return self._count(hit), None
+        vector = embed(question)
+        return self._count(self._similar(scope, generation, vector)), vector
+
+    async def aget(
+        self,
+        scope: Hashable,
+        generation: Any,
+        question: str,
+        embed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """Async variant of `get` (awaits `embed`)."""
+        hit = self._exact(scope, generation, question)
+        if hit is not None or not self.semantic or embed is None:
+            return self._count(hit), None
+        vector = await embed(question)
+        return self._count(self._similar(scope, generation, vector)), vector
+
+    def put(
+        self,
+        scope: Hashable,
+        generation: Any,
+        question: str,
+        answer: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> None:
+        key = normalize_question(question)
+        entry = {"answer": answer, "sources": sources or []}
+        self._entries.put((scope, key), entry, generation=generation, nbytes=len(answer))
+        if vector is not None and self.semantic:
+            with self._lock:
+                self._vectors.setdefault(scope, {})[key] = (generation, _unit(vector))
+
+    def invalidate_index(self, index_dir: str) -> None:
+        """Drop every answer computed against `index_dir`."""
+        index_dir = os.path.abspath(index_dir)
+        dropped = self._entries.invalidate_if(lambda k: k[0][0] == index_dir)  # type: ignore[index]
+        if dropped:
+            log.info("Answer cache invalidated", index_dir=index_dir, entries=dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        base = self._entries.stats()
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": base["entries"],
+            "bytes": base["bytes"],
+            "evictions": base["evictions"],
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.exact_hits + self.semantic_hits) / total, 4) if total else 0.0,
+        }
+
+    # ---------- Internals ----------
+
+    def _exact(self, scope: Hashable, generation: Any, question: str) -> Optional[Dict[str, Any]]:
+        hit = self._entries.get((scope, normalize_question(question)), generation)
+        if hit is not None:
+            self.exact_hits += 1
+        return hit
+
+    def _similar(self, scope: Hashable, generation: Any, vector: List[float]) -> Optional[Dict[str, Any]]:
+        q = _unit(vector)
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            candidates = self._vectors.get(scope, {})
+            for key, (gen, v) in list(candidates.items()):
+                if gen != generation:
+                    del candidates[key]  # the answer itself goes stale on its next lookup
+                    continue
+                score = float(np.dot(q, v))
+                if score >= best_score:  # type: ignore[operator]
+                    best_key, best_score = key, score
+        if best_key is None:
+            return None
+        hit = self._entries.get((scope, best_key), generation)
+        if hit is not None:
+            self.semantic_hits += 1
+            log.info("Answer cache semantic hit", matched=best_key, score=round(best_score, 4))
+        return hit
+
+    def _count(self, hit: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if hit is None:
+            self.misses += 1
+        return hit
+
+    def _forget(self, key: Hashable) -> None:
+        scope, question = key  # type: ignore[misc]
+        with self._lock:
+            vectors = self._vectors.get(scope)
+            if vectors is not None:
+                vectors.pop(question, None)
+                if not vectors:
+                    del self._vectors[scope]
+
+
+_ANSWER_CFG = load_config().get("cache", {}).get("answer", {})
+ANSWER_CACHE_ENABLED = bool(_ANSWER_CFG.get("enabled", True))
+ANSWER_CACHE = AnswerCache(
+    max_entries=_ANSWER_CFG.get("max_entries", 2048),
+    ttl_seconds=_ANSWER_CFG.get("ttl_seconds", 3600),
+    similarity_threshold=_ANSWER_CFG.get("similarity_threshold"),
+)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config
+from utils.document_ops import estimate_tokens
+
+# summarizer(previous_summary, messages_to_fold) -> new summary
+Summarizer = Callable[[str, List[BaseMessage]], str]
+
+
+class ChatHistoryStore:
+    """
+    Per-session conversation history persisted in SQLite (shared by all workers).
+
+    The most recent `max_turns` question/answer pairs are kept verbatim as long as
+    they fit in `token_budget`; older turns are folded into a running summary.
+    """
+
+    def __init__(self, db_path: Path | str, max_turns: int = 10, token_budget: int = 2000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_turns = max(1, int(max_turns))
+        self.token_budget = int(token_budget)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_turns_session ON turns(session_id, id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+            )
+
+    @classmethod
+    def from_config(cls) -> "ChatHistoryStore":
+        cfg = load_config().get("chat_history", {})
+        return cls(
+            os.getenv("CHAT_HISTORY_DB", cfg.get("db_path", "chat_history/history.sqlite")),
+            max_turns=cfg.get("max_turns", 10),
+            token_budget=cfg.get("token_budget", 2000),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _to_message(role: str, content: str) -> BaseMessage:
+        return HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+
+    def _rows(self, conn: sqlite3.Connection, session_id: str) -> List[Tuple[int, str, str]]:
+        return conn.execute(
+            "SELECT id, role, content FROM turns WHERE session_id=? ORDER BY id", (session_id,)
+        ).fetchall()
+
+    def _summary(self, conn: sqlite3.Connection, session_id: str) -> str:
+        row = conn.execute("SELECT summary FROM summaries WHERE session_id=?", (session_id,)).fetchone()
+        return row[0] if row else ""
+
+    def load(self, session_id: str) -> List[BaseMessage]:
+        """Summary (as a system message, if any) followed by the verbatim recent turns."""
+        with closing(self._connect()) as conn:
+            summary = self._summary(conn, session_id)
+            rows = self._rows(conn, session_id)
+        messages: List[BaseMessage] = []
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        messages.extend(self._to_message(role, content) for _, role, content in rows)
+        return messages
+
+    def append(self, session_id: str, question: str, answer: str, summarizer: Optional[Summarizer] = None) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "INSERT INTO turns(session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(session_id, "human", question, now), (session_id, "ai", answer, now)],
+            )
+        self._compact(session_id, summarizer)
+
+    def clear(self, session_id: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM turns WHERE session_id=?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id=?", (session_id,))
+
+    def _compact(self, session_id: str, summarizer: Optional[Summarizer], attempts: int = 3) -> None:
+        # The summarizer (an LLM call) runs outside any transaction; the fold is then
+        # committed in one BEGIN IMMEDIATE that re-reads the summary and the turns it
+        # folds, and starts over if a concurrent append/compaction changed them.
+        for _ in range(attempts):
+            with closing(self._connect()) as conn:
+                rows = self._rows(conn, session_id)
+                summary = self._summary(conn, session_id)
+            folded = self._to_fold(rows)
+            if not folded:
+                return
+
+            new_summary = summary
+            if summarizer is not None:
+                try:
+                    new_summary = summarizer(summary, [self._to_message(r, c) for _, r, c in folded])
+                except Exception as e:
+                    log.warning("History summarization failed; dropping oldest turns",
+                                session_id=session_id, error=str(e))
+
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                current = self._rows(conn, session_id)[: len(folded)]
+                if self._summary(conn, session_id) != summary or current != folded:
+                    conn.execute("ROLLBACK")
+                    log.info("Chat history changed while summarizing; retrying", session_id=session_id)
+                    continue
+                conn.execute(
+                    "INSERT INTO summaries(session_id, summary) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET summary=excluded.summary",
+                    (session_id, new_summary),
+                )
+                conn.execute(
+                    "DELETE FROM turns WHERE session_id=? AND id <= ?", (session_id, folded[-1][0])
+                )
+                conn.execute("COMMIT")
+            log.info("Chat history compacted", session_id=session_id, folded_messages=len(folded))
+            return
+        log.warning("Chat history compaction gave up after concurrent updates", session_id=session_id)
+
+    def _to_fold(self, rows: List[Tuple[int, str, str]]) -> List[Tuple[int, str, str]]:
+        """Oldest turns that must leave the verbatim window (the latest turn always stays)."""
+        def over_budget(rs) -> bool:
+            return len(rs) // 2 > self.max_turns or sum(estimate_tokens(r[2]) for r in rs) > self.token_budget
+
+        folded: List[Tuple[int, str, str]] = []
+        while len(rows) > 2 and over_budget(rows):
+            folded.extend(rows[:2])
+            rows = rows[2:]
+        return folded
+
+
+_store: Optional[ChatHistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> ChatHistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatHistoryStore.from_config()
+        return _store
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import hashlib
+from typing import Any, Dict, List, Protocol, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from utils.concurrency import run_blocking
+
+
+class LexicalSearch(Protocol):
+    """LexicalIndex, or a view of one (e.g. a shared shard restricted to a session)."""
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]: ...
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[Document]], weights: Sequence[float], rrf_k: int = 60
+) -> List[Document]:
+    """
+    Weighted reciprocal rank fusion: score(d) = sum_i w_i / (rrf_k + rank_i(d)).
+    Documents are identified by content, so the same chunk from both lists is merged.
+    """
+    scores: Dict[bytes, float] = {}
+    docs: Dict[bytes, Document] = {}
+    for results, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(results, start=1):
+            key = hashlib.sha256(doc.page_content.encode("utf-8")).digest()
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [docs[key] for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """FAISS similarity results fused with BM25 (LexicalIndex) results by weighted RRF."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    lexical: Any  # LexicalSearch
+    k: int = 5
+    fetch_k: int = 20            # candidates taken from each list before fusion
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    rrf_k: int = 60
+
+    def _fuse(self, vector_docs: List[Document], query: str) -> List[Document]:
+        lexical_docs = [d for d, _ in self.lexical.search(query, self.fetch_k)]
+        fused = reciprocal_rank_fusion(
+            [vector_docs, lexical_docs], [self.vector_weight, self.lexical_weight], self.rrf_k
+        )
+        return fused[: self.k]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._fuse(self.vector_retriever.invoke(query), query)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs = await self.vector_retriever.ainvoke(query)
+        # the FTS5 query is blocking SQLite work: keep it off the event loop
+        return await run_blocking(self._fuse, vector_docs, query)
+
+    @classmethod
+    def from_config(cls, vector_retriever: BaseRetriever, lexical: LexicalSearch, k: int,
+                    cfg: Dict[str, Any]) -> "HybridRetriever":
+        return cls(
+            vector_retriever=vector_retriever,
+            lexical=lexical,
+            k=k,
+            fetch_k=max(k, int(cfg.get("fetch_k", 20))),
+            vector_weight=float(cfg.get("vector_weight", 1.0)),
+            lexical_weight=float(cfg.get("lexical_weight", 1.0)),
+            rrf_k=int(cfg.get("rrf_k", 60)),
+        )
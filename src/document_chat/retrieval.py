@@ -1,20 +1,70 @@
 import sys
 import os
+import time
 from operator import itemgetter
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnableBranch
 
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from utils.config_loader import load_config
+from utils.file_io import read_index_generation
+from utils.lru_cache import LRUCache
+from src.document_ingestion.faiss_segments import SegmentedIndex, load_vectorstore
+from src.document_ingestion.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE
+from src.document_ingestion.shared_index import SharedIndex
+from src.document_chat.hybrid_retriever import HybridRetriever
+from src.document_chat.session_retriever import SessionLexical, SessionRetriever
+from src.document_chat.answer_cache import ANSWER_CACHE, ANSWER_CACHE_ENABLED
 from exception.custom_exception import DocumentPortalException
 from logger import GLOBAL_LOGGER as log
 from prompt.prompt_library import PROMPT_REGISTRY
 from model.models import PromptType
 
 
+_CACHE_CFG = load_config().get("cache", {})
+_RETRIEVER_CFG = load_config().get("retriever", {})
+# faiss_db.index.search: nprobe / efSearch applied to trained indexes on load
+_FAISS_INDEX_CFG = load_config().get("faiss_db", {}).get("index", {})
+# "similarity" (FAISS only) or "hybrid" (FAISS + BM25 fused by reciprocal rank)
+RETRIEVER_MODE = _RETRIEVER_CFG.get("mode", "similarity")
+# Below this many history messages the question is retrieved as-is (no rewrite LLM call)
+REWRITE_MIN_MESSAGES = int(load_config().get("chat_history", {}).get("rewrite_min_messages", 1))
+
+
+def _close_lexical(entry) -> None:
+    # a hybrid retriever over a per-index BM25 file owns its read-only LexicalIndex
+    retriever = entry[0]
+    if isinstance(retriever, HybridRetriever) and isinstance(retriever.lexical, LexicalIndex):
+        retriever.lexical.close()
+
+
+# (retriever, chain) pairs keyed by index + retriever settings + LLM client
+CHAIN_CACHE = LRUCache(
+    "chain",
+    max_entries=_CACHE_CFG.get("chain", {}).get("max_entries", 64),
+    dispose=_close_lexical,
+)
+
+
+def _drop_chains_of(vs_key) -> None:
+    # A cached retriever holds its vectorstore: drop the chains built on an evicted
+    # vectorstore so it is not kept alive past the vectorstore cache's limits
+    CHAIN_CACHE.invalidate_if(lambda key: key[:2] == vs_key)
+
+
+# Loaded vectorstores keyed by (index_dir, index_name); entries are tagged with the index generation
+VECTORSTORE_CACHE = LRUCache(
+    "vectorstore",
+    max_entries=_CACHE_CFG.get("vectorstore", {}).get("max_entries", 16),
+    max_bytes=_CACHE_CFG.get("vectorstore", {}).get("max_bytes"),
+    on_evict=_drop_chains_of,
+)
+
+
 class ConversationalRAG:
     """
     LCEL-based Conversational RAG with lazy retriever initialization.
@@ -37,10 +87,18 @@ class ConversationalRAG:
             self.qa_prompt: ChatPromptTemplate = PROMPT_REGISTRY[
                 PromptType.CONTEXT_QA.value
             ]
+            self.summary_prompt: ChatPromptTemplate = PROMPT_REGISTRY[
+                PromptType.CONVERSATION_SUMMARY.value
+            ]
 
             # Lazy pieces
             self.retriever = retriever
             self.chain = None
+            self.question_rewriter = None
+            self.answer_chain = None
+            # set by load_retriever_from_faiss; answers are only cached for a known index
+            self._answer_scope = None
+            self._generation = None
             if self.retriever is not None:
                 self._build_lcel_chain()
 
@@ -56,37 +114,76 @@ class ConversationalRAG:
         index_path: str,
         k: int = 5,
         index_name: str = "index",
-        search_type: str = "similarity",
+        search_type: Optional[str] = None,
         search_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """
         Load FAISS vectorstore from disk and build retriever + LCEL chain.
+        Both are cached per index directory and reused until the index generation changes.
+        search_type defaults to retriever.mode; "hybrid" needs the index's BM25 file
+        and falls back to plain similarity without it.
         """
         try:
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
 
-            embeddings = ModelLoader().load_embeddings()
-            vectorstore = FAISS.load_local(
-                index_path,
-                embeddings,
-                index_name=index_name,
-                allow_dangerous_deserialization=True,  # ok if you trust the index
-            )
-
             if search_kwargs is None:
                 search_kwargs = {"k": k}
+            search_type = search_type or RETRIEVER_MODE
+            lexical_path = os.path.join(index_path, LEXICAL_INDEX_FILE)
+            if search_type == "hybrid" and not os.path.exists(lexical_path):
+                log.warning("No lexical index, using similarity search", index_path=index_path)
+                search_type = "similarity"
 
-            self.retriever = vectorstore.as_retriever(
-                search_type=search_type, search_kwargs=search_kwargs
-            )
+            vs_key = (os.path.abspath(index_path), index_name)
+            generation = read_index_generation(index_path)
+            chain_key = vs_key + (search_type, repr(sorted(search_kwargs.items())), id(self.llm))
+            self._answer_scope, self._generation = chain_key, generation
+
+            cached = CHAIN_CACHE.get(chain_key, generation)
+            if cached is not None:
+                self.retriever, self.chain, self.question_rewriter, self.answer_chain = cached
+                log.info("RAG chain served from cache", index_path=index_path, session_id=self.session_id)
+                return self.retriever
+
+            vectorstore = VECTORSTORE_CACHE.get(vs_key, generation)
+            if vectorstore is None:
+                embeddings = MODEL_REGISTRY.get_embeddings()
+                # merges base + delta segments (or reads a legacy single-file index)
+                vectorstore = load_vectorstore(
+                    index_path, embeddings, index_name=index_name, index_cfg=_FAISS_INDEX_CFG
+                )
+                VECTORSTORE_CACHE.put(
+                    vs_key, vectorstore, generation=generation,
+                    nbytes=SegmentedIndex(index_path, index_name).nbytes(),
+                )
+
+            if search_type == "hybrid":
+                hybrid_cfg = _RETRIEVER_CFG.get("hybrid", {})
+                fetch_k = max(search_kwargs.get("k", k), int(hybrid_cfg.get("fetch_k", 20)))
+                self.retriever = HybridRetriever.from_config(
+                    vectorstore.as_retriever(search_type="similarity", search_kwargs={**search_kwargs, "k": fetch_k}),
+                    LexicalIndex(lexical_path, generation, read_only=True),
+                    search_kwargs.get("k", k),
+                    hybrid_cfg,
+                )
+            else:
+                self.retriever = vectorstore.as_retriever(
+                    search_type=search_type, search_kwargs=search_kwargs
+                )
             self._build_lcel_chain()
+            CHAIN_CACHE.put(
+                chain_key,
+                (self.retriever, self.chain, self.question_rewriter, self.answer_chain),
+                generation=generation,
+            )
 
             log.info(
                 "FAISS retriever loaded successfully",
                 index_path=index_path,
                 index_name=index_name,
                 k=k,
+                search_type=search_type,
                 session_id=self.session_id,
             )
             return self.retriever
@@ -95,6 +192,56 @@ class ConversationalRAG:
             log.error("Failed to load retriever from FAISS", error=str(e))
             raise DocumentPortalException("Loading error in ConversationalRAG", sys)
 
+    def load_retriever_from_shared(
+        self,
+        shared: SharedIndex,
+        session_id: str,
+        k: int = 5,
+        search_type: Optional[str] = None,
+    ):
+        """
+        Build retriever + LCEL chain over the shared multi-tenant index, restricted to
+        `session_id`'s chunks. Cached like load_retriever_from_faiss; the cache generation
+        moves with both the shard's writes and the session's own uploads.
+        """
+        try:
+            shard_dir, generation = shared.session_scope(session_id)
+            search_type = search_type or RETRIEVER_MODE
+            chain_key = (os.path.abspath(shard_dir), session_id, search_type, k, id(self.llm))
+            self._answer_scope, self._generation = chain_key, generation
+
+            cached = CHAIN_CACHE.get(chain_key, generation)
+            if cached is not None:
+                self.retriever, self.chain, self.question_rewriter, self.answer_chain = cached
+                log.info("RAG chain served from cache", shard=shard_dir, session_id=session_id)
+                return self.retriever
+
+            embeddings = MODEL_REGISTRY.get_embeddings()
+            if search_type == "hybrid":
+                hybrid_cfg = _RETRIEVER_CFG.get("hybrid", {})
+                fetch_k = max(k, int(hybrid_cfg.get("fetch_k", 20)))
+                self.retriever = HybridRetriever.from_config(
+                    SessionRetriever(shared=shared, session_id=session_id, embeddings=embeddings, k=fetch_k),
+                    SessionLexical(shared, session_id),
+                    k,
+                    hybrid_cfg,
+                )
+            else:
+                self.retriever = SessionRetriever(shared=shared, session_id=session_id, embeddings=embeddings, k=k)
+            self._build_lcel_chain()
+            CHAIN_CACHE.put(
+                chain_key,
+                (self.retriever, self.chain, self.question_rewriter, self.answer_chain),
+                generation=generation,
+            )
+            log.info("Shared index retriever loaded", shard=shard_dir, session_id=session_id,
+                     k=k, search_type=search_type)
+            return self.retriever
+
+        except Exception as e:
+            log.error("Failed to load retriever from shared index", error=str(e))
+            raise DocumentPortalException("Loading error in ConversationalRAG", sys)
+
     def invoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
         """Invoke the LCEL pipeline."""
         try:
@@ -102,9 +249,62 @@ class ConversationalRAG:
                 raise DocumentPortalException(
                     "RAG chain not initialized. Call load_retriever_from_faiss() before invoke().", sys
                 )
-            chat_history = chat_history or []
-            payload = {"input": user_input, "chat_history": chat_history}
-            answer = self.chain.invoke(payload)
+            payload = {"input": user_input, "chat_history": chat_history or []}
+            # follow-ups are rewritten first, so the cache sees the standalone question
+            question = self.question_rewriter.invoke(payload)  # type: ignore[union-attr]
+            cacheable = self._answer_cacheable()
+            vector = None
+            if cacheable:
+                hit, vector = ANSWER_CACHE.get(
+                    self._answer_scope, self._generation, question, self._embed_question
+                )
+                if hit is not None:
+                    log.info("Answer served from cache", session_id=self.session_id, user_input=user_input)
+                    return hit["answer"]
+            docs = self.retriever.invoke(question)  # type: ignore[union-attr]
+            answer = self.answer_chain.invoke(  # type: ignore[union-attr]
+                {**payload, "context": self._format_docs(docs)}
+            )
+            if not answer:
+                log.warning(
+                    "No answer generated", user_input=user_input, session_id=self.session_id
+                )
+                return "no answer generated."
+            log.info(
+                "Chain invoked successfully",
+                session_id=self.session_id,
+                user_input=user_input,
+                answer_preview=str(answer)[:150],
+            )
+            if cacheable:
+                ANSWER_CACHE.put(self._answer_scope, self._generation, question, answer, vector=vector)
+            return answer
+        except Exception as e:
+            log.error("Failed to invoke ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
+
+    async def ainvoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Async variant of invoke (uses chain.ainvoke, does not block the event loop)."""
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before ainvoke().", sys
+                )
+            payload = {"input": user_input, "chat_history": chat_history or []}
+            question = await self.question_rewriter.ainvoke(payload)  # type: ignore[union-attr]
+            cacheable = self._answer_cacheable()
+            vector = None
+            if cacheable:
+                hit, vector = await ANSWER_CACHE.aget(
+                    self._answer_scope, self._generation, question, self._aembed_question
+                )
+                if hit is not None:
+                    log.info("Answer served from cache", session_id=self.session_id, user_input=user_input)
+                    return hit["answer"]
+            docs = await self.retriever.ainvoke(question)  # type: ignore[union-attr]
+            answer = await self.answer_chain.ainvoke(  # type: ignore[union-attr]
+                {**payload, "context": self._format_docs(docs)}
+            )
             if not answer:
                 log.warning(
                     "No answer generated", user_input=user_input, session_id=self.session_id
@@ -116,16 +316,90 @@ class ConversationalRAG:
                 user_input=user_input,
                 answer_preview=str(answer)[:150],
             )
+            if cacheable:
+                ANSWER_CACHE.put(self._answer_scope, self._generation, question, answer, vector=vector)
             return answer
         except Exception as e:
             log.error("Failed to invoke ConversationalRAG", error=str(e))
             raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
 
+    async def astream(
+        self, user_input: str, chat_history: Optional[List[BaseMessage]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream an answer as events: one "sources" event with the retrieved chunk
+        metadata, then "token" events as the LLM generates, then "done".
+        """
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before astream().", sys
+                )
+            payload = {"input": user_input, "chat_history": chat_history or []}
+            t0 = time.perf_counter()
+
+            question = await self.question_rewriter.ainvoke(payload)  # type: ignore[union-attr]
+            cacheable = self._answer_cacheable()
+            vector = None
+            if cacheable:
+                hit, vector = await ANSWER_CACHE.aget(
+                    self._answer_scope, self._generation, question, self._aembed_question
+                )
+                if hit is not None:
+                    yield {"event": "sources", "data": hit["sources"]}
+                    yield {"event": "token", "data": hit["answer"]}
+                    total_ms = round((time.perf_counter() - t0) * 1000, 1)
+                    log.info("Answer served from cache", session_id=self.session_id, user_input=user_input)
+                    yield {"event": "done", "data": {"ttft_ms": total_ms, "total_ms": total_ms, "cached": True}}
+                    return
+
+            docs = await self.retriever.ainvoke(question)  # type: ignore[union-attr]
+            sources = [self._source_info(d) for d in docs]
+            yield {"event": "sources", "data": sources}
+
+            ttft_ms = None
+            parts: List[str] = []
+            async for token in self.answer_chain.astream(  # type: ignore[union-attr]
+                {**payload, "context": self._format_docs(docs)}
+            ):
+                if not token:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - t0) * 1000, 1)
+                    log.info("First token streamed", session_id=self.session_id, ttft_ms=ttft_ms)
+                parts.append(token)
+                yield {"event": "token", "data": token}
+
+            total_ms = round((time.perf_counter() - t0) * 1000, 1)
+            log.info(
+                "Chain streamed successfully",
+                session_id=self.session_id,
+                user_input=user_input,
+                ttft_ms=ttft_ms,
+                total_ms=total_ms,
+                answer_preview="".join(parts)[:150],
+            )
+            if cacheable and parts:
+                ANSWER_CACHE.put(
+                    self._answer_scope, self._generation, question, "".join(parts),
+                    sources=sources, vector=vector,
+                )
+            yield {"event": "done", "data": {"ttft_ms": ttft_ms, "total_ms": total_ms, "cached": False}}
+        except Exception as e:
+            log.error("Failed to stream ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Streaming error in ConversationalRAG", sys)
+
+    def summarize_history(self, summary: str, messages: List[BaseMessage]) -> str:
+        """Fold `messages` into the running conversation `summary` (used by ChatHistoryStore)."""
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        chain = self.summary_prompt | self.llm | StrOutputParser()
+        return chain.invoke({"summary": summary or "(none)", "transcript": transcript})
+
     # ---------- Internals ----------
 
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.get_llm()
             if not llm:
                 raise ValueError("LLM could not be loaded")
             log.info("LLM loaded successfully", session_id=self.session_id)
@@ -134,6 +408,27 @@ class ConversationalRAG:
             log.error("Failed to load LLM", error=str(e))
             raise DocumentPortalException("LLM loading error in ConversationalRAG", sys)
 
+    def _answer_cacheable(self) -> bool:
+        # keyed by the standalone (rewritten) question, so follow-ups can hit too
+        return ANSWER_CACHE_ENABLED and self._answer_scope is not None
+
+    @staticmethod
+    def _embed_question(question: str) -> List[float]:
+        return MODEL_REGISTRY.get_embeddings().embed_query(question)
+
+    @staticmethod
+    async def _aembed_question(question: str) -> List[float]:
+        return await MODEL_REGISTRY.get_embeddings().aembed_query(question)
+
+    @staticmethod
+    def _source_info(doc) -> Dict[str, Any]:
+        md = getattr(doc, "metadata", {}) or {}
+        return {
+            "source": md.get("source") or md.get("file_path"),
+            "page": md.get("page"),
+            "preview": getattr(doc, "page_content", "")[:200],
+        }
+
     @staticmethod
     def _format_docs(docs) -> str:
         return "\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
@@ -144,27 +439,32 @@ class ConversationalRAG:
                 raise DocumentPortalException("No retriever set before building chain", sys)
 
             # 1) Rewrite user question with chat history context
-            question_rewriter = (
+            #    (skipped when there is no real history: the raw question is already standalone)
+            full_rewriter = (
                 {"input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
                 | self.llm
                 | StrOutputParser()
             )
+            question_rewriter = RunnableBranch(
+                (lambda x: len(x.get("chat_history") or []) < REWRITE_MIN_MESSAGES, itemgetter("input")),
+                full_rewriter,
+            )
 
             # 2) Retrieve docs for rewritten question
             retrieve_docs = question_rewriter | self.retriever | self._format_docs
 
             # 3) Answer using retrieved context + original input + chat history
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser()
             self.chain = (
                 {
                     "context": retrieve_docs,
                     "input": itemgetter("input"),
                     "chat_history": itemgetter("chat_history"),
                 }
-                | self.qa_prompt
-                | self.llm
-                | StrOutputParser()
+                | self.answer_chain
             )
+            self.question_rewriter = question_rewriter
 
             log.info("LCEL graph built successfully", session_id=self.session_id)
         except Exception as e:
@@ -0,0 +1,46 @@
+from __future__ import annotations
+from typing import Any, List, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from src.document_ingestion.shared_index import SharedIndex
+from utils.concurrency import run_blocking
+
+
+class SessionRetriever(BaseRetriever):
+    """Similarity search over the shared index, restricted to one session's chunks."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    shared: SharedIndex
+    session_id: str
+    embeddings: Any
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.shared.similarity_search(self.session_id, vector, self.k)]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        # membership lookup, segment mmap and FAISS search are blocking: keep them off the event loop
+        hits = await run_blocking(self.shared.similarity_search, self.session_id, vector, self.k)
+        return [doc for doc, _ in hits]
+
+
+class SessionLexical:
+    """BM25 search of the session's shard, restricted to the session (for HybridRetriever)."""
+
+    def __init__(self, shared: SharedIndex, session_id: str):
+        self.shared = shared
+        self.session_id = session_id
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        return self.shared.lexical_search(self.session_id, query, k)
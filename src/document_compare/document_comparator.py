@@ -1,23 +1,23 @@
 import sys
-from dotenv import load_dotenv
 import pandas as pd
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 from prompt.prompt_library import PROMPT_REGISTRY
-from model.models import SummaryResponse,PromptType
+from model.models import SummaryResponse,PromptType,PageChange
+from src.document_compare.page_diff import format_changes, merge_rows
 
 class DocumentComparatorLLM:
     def __init__(self):
-        load_dotenv()
-        self.loader = ModelLoader()
-        self.llm = self.loader.load_llm()
+        self.loader = MODEL_REGISTRY.loader
+        self.llm = MODEL_REGISTRY.get_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
         self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
         self.prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON.value]
         self.chain = self.prompt | self.llm | self.parser
+        self.diff_chain = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON_DIFF.value] | self.llm | self.parser
         log.info("DocumentComparatorLLM initialized", model=self.llm)
 
     def compare_documents(self, combined_docs: str) -> pd.DataFrame:
@@ -35,6 +35,57 @@ class DocumentComparatorLLM:
             log.error("Error in compare_documents", error=str(e))
             raise DocumentPortalException("Error comparing documents", sys)
 
+    async def acompare_documents(self, combined_docs: str) -> pd.DataFrame:
+        """Async variant of compare_documents (uses ainvoke)."""
+        try:
+            inputs = {
+                "combined_docs": combined_docs,
+                "format_instruction": self.parser.get_format_instructions()
+            }
+
+            log.info("Invoking document comparison LLM chain (async)")
+            response = await self.chain.ainvoke(inputs)
+            log.info("Chain invoked successfully", response_preview=str(response)[:200])
+            return self._format_response(response)
+        except Exception as e:
+            log.error("Error in acompare_documents", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    def compare_changes(self, rows: list[PageChange]) -> pd.DataFrame:
+        """
+        Compare from a local page diff: only changed pages (as diff hunks) go to the LLM,
+        unchanged pages become "NO CHANGE" rows without any LLM call.
+        """
+        try:
+            llm_rows = []
+            if any(r.changed for r in rows):
+                inputs = {
+                    "changes": format_changes(rows),
+                    "format_instruction": self.parser.get_format_instructions()
+                }
+                log.info("Invoking document comparison diff chain", changed=sum(r.changed for r in rows))
+                llm_rows = self.diff_chain.invoke(inputs)
+            return self._format_response(merge_rows(rows, llm_rows))
+        except Exception as e:
+            log.error("Error in compare_changes", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    async def acompare_changes(self, rows: list[PageChange]) -> pd.DataFrame:
+        """Async variant of compare_changes (uses ainvoke)."""
+        try:
+            llm_rows = []
+            if any(r.changed for r in rows):
+                inputs = {
+                    "changes": format_changes(rows),
+                    "format_instruction": self.parser.get_format_instructions()
+                }
+                log.info("Invoking document comparison diff chain (async)", changed=sum(r.changed for r in rows))
+                llm_rows = await self.diff_chain.ainvoke(inputs)
+            return self._format_response(merge_rows(rows, llm_rows))
+        except Exception as e:
+            log.error("Error in acompare_changes", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
     def _format_response(self, response_parsed: list[dict]) -> pd.DataFrame: #type: ignore
         try:
             df = pd.DataFrame(response_parsed)
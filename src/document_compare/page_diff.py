@@ -0,0 +1,125 @@
+from __future__ import annotations
+import difflib
+import hashlib
+import re
+from typing import List, Optional, Tuple
+from model.models import ChangeFormat, PageChange
+
+NO_CHANGE = "NO CHANGE"
+# Pages in a changed block are paired when at least this similar (by lines)
+PAIR_MIN_SIMILARITY = 0.5
+# Larger changed blocks are paired positionally instead of by similarity
+_MAX_PAIRING_CELLS = 400
+_WS = re.compile(r"[ \t\f\v]+")
+
+
+def normalize_page(text: str) -> str:
+    """Collapse runs of spaces and drop blank lines so re-flowed text compares equal."""
+    lines = (_WS.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha1(normalize_page(text).encode("utf-8")).hexdigest()
+
+
+def _label(ref_page: Optional[int], act_page: Optional[int]) -> str:
+    if ref_page is None:
+        return f"{act_page} (added)"
+    if act_page is None:
+        return f"{ref_page} (removed)"
+    return str(act_page) if ref_page == act_page else f"{ref_page}->{act_page}"
+
+
+def _hunks(ref_text: str, act_text: str, context: int) -> str:
+    diff = difflib.unified_diff(
+        normalize_page(ref_text).splitlines(),
+        normalize_page(act_text).splitlines(),
+        fromfile="reference", tofile="actual", n=context, lineterm="",
+    )
+    return "\n".join(list(diff)[2:])  # drop the ---/+++ file header
+
+
+def _pair_block(refs: List[str], acts: List[str]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Pair pages of one changed block in order. When the block grew or shrank, pages are
+    paired to maximise total line similarity; unpaired pages come back as (i, None) / (None, j).
+    """
+    n, m = len(refs), len(acts)
+    # same page count on both sides: pages were edited in place
+    if n == m or n * m > _MAX_PAIRING_CELLS:
+        return [(k if k < n else None, k if k < m else None) for k in range(max(n, m))]
+    ref_lines = [normalize_page(t).splitlines() for t in refs]
+    act_lines = [normalize_page(t).splitlines() for t in acts]
+    sim = [[difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() for b in act_lines] for a in ref_lines]
+    score = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            best = max(score[i - 1][j], score[i][j - 1])
+            if sim[i - 1][j - 1] >= PAIR_MIN_SIMILARITY:
+                best = max(best, score[i - 1][j - 1] + sim[i - 1][j - 1])
+            score[i][j] = best
+    pairs: List[Tuple[Optional[int], Optional[int]]] = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and sim[i - 1][j - 1] >= PAIR_MIN_SIMILARITY \
+                and score[i][j] == score[i - 1][j - 1] + sim[i - 1][j - 1]:
+            pairs.append((i - 1, j - 1)); i -= 1; j -= 1
+        elif i > 0 and (j == 0 or score[i][j] == score[i - 1][j]):
+            pairs.append((i - 1, None)); i -= 1
+        else:
+            pairs.append((None, j - 1)); j -= 1
+    return pairs[::-1]
+
+
+def diff_pages(ref_pages: List[str], act_pages: List[str], context: int = 2) -> List[PageChange]:
+    """
+    Align reference and actual pages by content hash (difflib.SequenceMatcher), so an
+    inserted or removed page does not mark every later page as changed.
+    Returns one PageChange per aligned row, in document order; only rows with
+    `changed=True` carry diff hunks.
+    """
+    ref_hashes = [page_hash(p) for p in ref_pages]
+    act_hashes = [page_hash(p) for p in act_pages]
+    rows: List[PageChange] = []
+    matcher = difflib.SequenceMatcher(None, ref_hashes, act_hashes, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                rows.append(PageChange(Page=_label(i + 1, j + 1), ref_page=i + 1, act_page=j + 1, changed=False))
+            continue
+        # replace/insert/delete: pair similar pages; the rest are additions/removals
+        for bi, bj in _pair_block(ref_pages[i1:i2], act_pages[j1:j2]):
+            i = i1 + bi if bi is not None else None
+            j = j1 + bj if bj is not None else None
+            ref_text = ref_pages[i] if i is not None else ""
+            act_text = act_pages[j] if j is not None else ""
+            ref_no = i + 1 if i is not None else None
+            act_no = j + 1 if j is not None else None
+            rows.append(PageChange(
+                Page=_label(ref_no, act_no), ref_page=ref_no, act_page=act_no,
+                hunks=_hunks(ref_text, act_text, context),
+            ))
+    return rows
+
+
+def format_changes(rows: List[PageChange]) -> str:
+    """Prompt text for the changed rows only."""
+    return "\n\n".join(f"### Page {r.Page}\n{r.hunks or '(no extractable text)'}" for r in rows if r.changed)
+
+
+def merge_rows(rows: List[PageChange], llm_rows: List[dict]) -> List[dict]:
+    """Local NO CHANGE rows plus the LLM's rows for changed pages, in document order."""
+    if isinstance(llm_rows, dict):  # a single change sometimes comes back unwrapped
+        llm_rows = [llm_rows]
+    by_page = {str(r.get("Page", "")).strip(): r for r in llm_rows}
+    merged = []
+    for row in rows:
+        if not row.changed:
+            merged.append(ChangeFormat(Page=row.Page, Changes=NO_CHANGE).model_dump())
+            continue
+        found = by_page.pop(row.Page, None)
+        merged.append({"Page": row.Page, "Changes": found["Changes"] if found else row.hunks})
+    # anything the LLM labelled differently is kept rather than dropped
+    merged.extend(by_page.values())
+    return merged
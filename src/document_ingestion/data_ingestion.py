@@ -1,95 +1,269 @@
 from __future__ import annotations
 import os
 import sys
-import json
-import uuid
 import hashlib
 import shutil
+import sqlite3
 from pathlib import Path
-from typing import Iterable, List, Optional, Dict, Any
-import fitz  # PyMuPDF
+from typing import Callable, Iterable, List, Optional, Dict, Any, Set
 from langchain.schema import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from utils.model_loader import ModelLoader
+from utils.model_loader import ModelLoader, MODEL_REGISTRY
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
-from utils.file_io import generate_session_id, save_uploaded_files
-from utils.document_ops import load_documents, concat_for_analysis, concat_for_comparison
+from utils.file_io import (
+    generate_session_id,
+    save_uploaded_files,
+    bump_index_generation,
+    index_write_lock,
+    read_index_generation,
+    stream_upload_to_path,
+    UploadTooLargeError,
+)
+from utils.blob_store import BlobStore, PARSED_ARTIFACT, chunks_artifact, get_blob_store
+from utils.document_ops import load_documents
+from utils.pdf_extract import get_pdf_extractor, pages_to_text
+from model.models import IngestReport, PageChange
+from src.document_ingestion.embedding_pipeline import EmbeddingPipeline
+from src.document_ingestion.faiss_segments import SegmentedIndex
+from src.document_ingestion.sqlite_docstore import SqliteDocstore
+from src.document_ingestion.text_splitter import build_splitter
+from src.document_ingestion.shared_index import SharedIndex, get_shared_index
+from src.document_ingestion.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE
+from src.document_chat.answer_cache import ANSWER_CACHE
+from src.document_compare.page_diff import diff_pages
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
+# progress(stage, **counts) -- used by background jobs to report where an ingest is
+ProgressCallback = Callable[..., None]
+
+def _no_progress(stage: str, **counts: Any) -> None:
+    pass
+
+# Fingerprint store (which chunks are already in the index)
+class FingerprintStore:
+    """
+    SQLite set of ingested chunk fingerprints (sha256 of chunk text).
+
+    Rows carry the index generation they were written for. They are committed
+    *before* the index is saved, and rows newer than the index's committed
+    generation are purged on open, so a crash between the two writes never
+    leaves fingerprints for vectors that were not persisted.
+    """
+    def __init__(self, path: Path, committed_generation: int):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " key BLOB PRIMARY KEY,"
+            " generation INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        purged = self._conn.execute(
+            "DELETE FROM fingerprints WHERE generation > ?", (committed_generation,)
+        ).rowcount
+        self._conn.commit()
+        if purged:
+            log.warning("Purged fingerprints of an uncommitted index write", path=str(self.path), purged=purged)
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def contains_many(self, keys: Iterable[bytes]) -> Set[bytes]:
+        keys = list(keys)
+        found: Set[bytes] = set()
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            found.update(
+                r[0] for r in self._conn.execute(f"SELECT key FROM fingerprints WHERE key IN ({marks})", part)
+            )
+        return found
+
+    def add_many(self, keys: Iterable[bytes], generation: int) -> None:
+        with self._conn:  # single transaction
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints(key, generation) VALUES (?, ?)",
+                [(k, generation) for k in keys],
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
 # FAISS Manager (load-or-create)
 class FaissManager:
     def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
         
-        self.meta_path = self.index_dir / "ingested_meta.json"
-        self._meta: Dict[str, Any] = {"rows": {}} ## this is dict of rows
-        
-        if self.meta_path.exists():
-            try:
-                self._meta = json.loads(self.meta_path.read_text(encoding="utf-8")) or {"rows": {}} # load it if alrady there
-            except Exception:
-                self._meta = {"rows": {}} # init the empty one if dones not exists
-        
-
-        self.model_loader = model_loader or ModelLoader()
-        self.emb = self.model_loader.load_embeddings()
+        # Reuse the process-wide embedding client unless a dedicated loader is given
+        self.model_loader = model_loader or MODEL_REGISTRY.loader
+        self.segments = SegmentedIndex(
+            self.index_dir, index_cfg=self.model_loader.config.get("faiss_db", {}).get("index", {})
+        )
+        self.lexical: Optional[LexicalIndex] = None
+        # Opening purges rows of an uncommitted write: never while another ingest is writing
+        with index_write_lock(self.index_dir):
+            generation = read_index_generation(self.index_dir)
+            self.fingerprints = FingerprintStore(self.index_dir / "fingerprints.sqlite", generation)
+            # BM25 index over the same chunks, for hybrid retrieval
+            if self.model_loader.config.get("ingestion", {}).get("lexical_index", True):
+                self.lexical = LexicalIndex(self.index_dir / LEXICAL_INDEX_FILE, generation)
+        self.emb = model_loader.load_embeddings() if model_loader else MODEL_REGISTRY.get_embeddings()
         self.vs: Optional[FAISS] = None
         
+    def close(self) -> None:
+        """Release the fingerprint and lexical SQLite connections."""
+        self.fingerprints.close()
+        if self.lexical is not None:
+            self.lexical.close()
+
+    def __enter__(self) -> "FaissManager":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
     def _exists(self)-> bool:
-        return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
+        return self.segments.exists()
     
     @staticmethod
-    def _fingerprint(text: str, md: Dict[str, Any]) -> str:
-        src = md.get("source") or md.get("file_path")
-        rid = md.get("row_id")
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
-    
-    def _save_meta(self):
-        self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _fingerprint(text: str) -> bytes:
+        # One key per chunk, by content
+        return hashlib.sha256(text.encode("utf-8")).digest()
         
+    def _stored_documents(self) -> List[Document]:
+        docstore = self.vs.docstore  # type: ignore[union-attr]
+        if isinstance(docstore, SqliteDocstore):
+            return list(docstore.iter_documents())
+        return list(docstore._dict.values())  # type: ignore[attr-defined]
+
+    def _load(self) -> FAISS:
+        self.vs = self.segments.load(self.emb)
+        if self.fingerprints.count() == 0 and self.vs.index.ntotal:
+            # Index predates the fingerprint store: backfill from the docstore once
+            keys = [self._fingerprint(d.page_content) for d in self._stored_documents()]
+            self.fingerprints.add_many(keys, read_index_generation(self.index_dir))
+            log.info("Fingerprints backfilled from docstore", index=str(self.index_dir), count=len(keys))
+        if self.lexical is not None and self.lexical.is_empty() and self.vs.index.ntotal:
+            docs = self._stored_documents()
+            self.lexical.add_many(docs, read_index_generation(self.index_dir))
+            log.info("Lexical index backfilled from docstore", index=str(self.index_dir), count=len(docs))
+        return self.vs
         
-    def add_documents(self,docs: List[Document]):
-        
-        if self.vs is None:
-            raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
+    def ingest(self, docs: List[Document], progress: Optional[ProgressCallback] = None) -> IngestReport:
+        """
+        Single pass: open (or create) the index, drop already-ingested chunks,
+        embed the new ones once and persist index + fingerprints once.
+        Only the new vectors are written (as a delta segment); the existing
+        index is not loaded unless its fingerprints or lexical index need a one-time backfill.
+        """
+        progress = progress or _no_progress
+        # dedupe -> fingerprints/lexical -> segment -> generation bump, one writer at a time
+        with index_write_lock(self.index_dir):
+            report = self._ingest(docs, progress)
+        if report.written:
+            self._maybe_compact()
+        log.info("Ingest complete", index=str(self.index_dir), **report.model_dump())
+        return report
+
+    def _ingest(self, docs: List[Document], progress: ProgressCallback) -> IngestReport:
+        report = IngestReport(seen=len(docs))
+        existed = self._exists()
+        lexical_missing = self.lexical is not None and self.lexical.is_empty()
+        if self.vs is None and existed and (self.fingerprints.count() == 0 or lexical_missing):
+            self._load()
         
+        keys = [self._fingerprint(d.page_content) for d in docs]
+        known = self.fingerprints.contains_many(keys)
         new_docs: List[Document] = []
-        
-        for d in docs:
-            
-            key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
+        new_keys: List[bytes] = []
+        batch_keys: Set[bytes] = set()
+        for key, d in zip(keys, docs):
+            if key in known or key in batch_keys:
+                report.skipped += 1
                 continue
-            self._meta["rows"][key] = True
+            batch_keys.add(key)
+            new_keys.append(key)
             new_docs.append(d)
-            
-        if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
-        return len(new_docs)
+        
+        if not new_docs:
+            if not existed:
+                raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
+            log.info("Ingest skipped: all chunks already indexed", index=str(self.index_dir), **report.model_dump())
+            return report
+        
+        delta: Optional[FAISS] = None
+        embedded = 0
+        progress("embedding", done=0, total=len(new_docs), skipped=report.skipped)
+        
+        def add_batch(start: int, vectors: List[List[float]]):
+            nonlocal delta, embedded
+            batch = new_docs[start:start + len(vectors)]
+            pairs = list(zip([d.page_content for d in batch], vectors))
+            metas = [d.metadata for d in batch]
+            # Docstore id = chunk fingerprint, so the same chunk has the same id everywhere
+            ids = [k.hex() for k in new_keys[start:start + len(vectors)]]
+            if delta is None:
+                delta = FAISS.from_embeddings(pairs, self.emb, metadatas=metas, ids=ids)
+            else:
+                delta.add_embeddings(pairs, metadatas=metas, ids=ids)
+            embedded += len(vectors)
+            progress("embedding", done=embedded, total=len(new_docs), skipped=report.skipped)
+        
+        pipeline = EmbeddingPipeline.from_config(
+            self.emb, self.model_loader.config.get("ingestion", {}).get("embedding", {})
+        )
+        report.embedded = pipeline.embed([d.page_content for d in new_docs], add_batch)
+        
+        progress("persisting", vectors=report.embedded)
+        # Fingerprints first (tagged with the upcoming generation), then the segment, then the generation bump
+        generation = read_index_generation(self.index_dir) + 1
+        self.fingerprints.add_many(batch_keys, generation)
+        if self.lexical is not None:
+            self.lexical.add_many(new_docs, generation)
+        self.segments.append(delta, generation)  # type: ignore[arg-type]
+        bump_index_generation(self.index_dir)
+        ANSWER_CACHE.invalidate_index(str(self.index_dir))
+        report.written = len(new_docs)
+        
+        if existed:
+            self.vs = None  # loaded views are read-only; reopen (cheap, memory-mapped) on next use
+        else:
+            self.vs = delta
+        return report
+        
+    def _maybe_compact(self):
+        cfg = self.model_loader.config.get("faiss_db", {}).get("compaction", {})
+        if not cfg.get("enabled", True) or not self.segments.needs_compaction(cfg.get("max_deltas", 8)):
+            return
+        if cfg.get("background", True):
+            self.segments.compact_in_background(self.emb)
+        else:
+            self.segments.compact(self.emb)
+    
+    def vectorstore(self) -> FAISS:
+        """Read view of the whole index (memory-maps the segments if not open yet)."""
+        return self.vs if self.vs is not None else self._load()
+        
+    def add_documents(self,docs: List[Document]):
+        
+        if self.vs is None and not self._exists():
+            raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
+        return self.ingest(docs).written
     
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.emb,
-                allow_dangerous_deserialization=True,
-            )
-            return self.vs
-        
+            return self._load()
         
         if not texts:
             raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.emb, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        metadatas = metadatas or [{} for _ in texts]
+        self.ingest([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)])
         return self.vs
         
         
@@ -99,24 +273,33 @@ class ChatIngestor:
         faiss_base: str = "faiss_index",
         use_session_dirs: bool = True,
         session_id: Optional[str] = None,
+        shared: Optional[SharedIndex] = None,
     ):
         try:
-            self.model_loader = ModelLoader()
+            self.model_loader = MODEL_REGISTRY.loader
             
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
+            # Sessions go to the shared multi-tenant index when shared_index.enabled
+            self.shared = shared or (get_shared_index() if use_session_dirs else None)
             
             self.temp_base = Path(temp_base); self.temp_base.mkdir(parents=True, exist_ok=True)
             self.faiss_base = Path(faiss_base); self.faiss_base.mkdir(parents=True, exist_ok=True)
             
             self.temp_dir = self._resolve_dir(self.temp_base)
-            self.faiss_dir = self._resolve_dir(self.faiss_base)
+            self.faiss_dir = self.shared.root if self.shared is not None else self._resolve_dir(self.faiss_base)
+            # Uploads stored once by content; parse/split results are kept per blob
+            self.blobs: Optional[BlobStore] = get_blob_store()
+            # chunk sizing unit (chars | tokens) and split workers
+            self.splitter_cfg: Dict[str, Any] = self.model_loader.config.get("ingestion", {}).get("splitter", {})
+            self.last_report: Optional[IngestReport] = None
 
             log.info("ChatIngestor initialized",
                       session_id=self.session_id,
                       temp_dir=str(self.temp_dir),
                       faiss_dir=str(self.faiss_dir),
-                      sessionized=self.use_session)
+                      sessionized=self.use_session,
+                      shared=self.shared is not None)
         except Exception as e:
             log.error("Failed to initialize ChatIngestor", error=str(e))
             raise DocumentPortalException("Initialization error in ChatIngestor", e) from e
@@ -130,11 +313,104 @@ class ChatIngestor:
         return base # fallback: "faiss_index/"
         
     def _split(self, docs: List[Document], chunk_size=1000, chunk_overlap=200) -> List[Document]:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        splitter = build_splitter(chunk_size, chunk_overlap, self.splitter_cfg)
         chunks = splitter.split_documents(docs)
-        log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap)
+        log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap,
+                 unit=self.splitter_cfg.get("unit", "chars"))
+        return chunks
+    
+    def save_files(self, uploaded_files: Iterable) -> List[Path]:
+        """Persist uploads into this session's temp dir."""
+        return save_uploaded_files(uploaded_files, self.temp_dir, blobs=self.blobs)
+
+    def _load_chunks(self, paths: List[Path], chunk_size: int, chunk_overlap: int,
+                     progress: ProgressCallback) -> List[Document]:
+        """
+        Chunks of every file, reusing the blob store's parse/split artifacts: a file seen
+        before (same bytes) is neither parsed nor split again.
+        """
+        blobs = self.blobs
+        if blobs is None:
+            progress("loading", files=len(paths))
+            docs = load_documents(paths)
+            if not docs:
+                raise ValueError("No valid documents loaded")
+            progress("splitting", documents=len(docs))
+            return self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        splitter_id = build_splitter(chunk_size, chunk_overlap, self.splitter_cfg).cache_id
+        chunk_key = chunks_artifact(chunk_size, chunk_overlap, splitter_id)
+        per_file: Dict[Path, List[Document]] = {}
+        parsed: Dict[Path, List[Document]] = {}
+        to_parse: List[Path] = []
+        digests = {p: blobs.digest_of(p) for p in paths}
+        for p, sha in digests.items():
+            chunks = blobs.load_docs(sha, chunk_key)
+            if chunks is not None:
+                per_file[p] = chunks
+                continue
+            docs = blobs.load_docs(sha, PARSED_ARTIFACT)
+            if docs is not None:
+                parsed[p] = docs
+            else:
+                to_parse.append(p)
+        reused = len(per_file)
+
+        if to_parse:
+            progress("loading", files=len(to_parse))
+            by_source: Dict[str, List[Document]] = {}
+            for d in load_documents(to_parse):
+                by_source.setdefault(str(d.metadata.get("source")), []).append(d)
+            for p in to_parse:
+                docs = by_source.get(str(p))
+                if not docs:
+                    continue  # failed to parse: nothing to keep
+                # Stable source: the same bytes give the same chunks (and metadata) in every session
+                for d in docs:
+                    d.metadata["source"] = str(blobs.blob_path(digests[p]) or p)
+                blobs.save_docs(digests[p], PARSED_ARTIFACT, docs)
+                parsed[p] = docs
+
+        if parsed:
+            progress("splitting", documents=sum(len(d) for d in parsed.values()))
+            for p, docs in parsed.items():
+                per_file[p] = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+                blobs.save_docs(digests[p], chunk_key, per_file[p])
+
+        log.info("Chunks prepared", files=len(paths), reused=reused, parsed=len(to_parse), split=len(parsed))
+        chunks = [c for p in paths for c in per_file.get(p, [])]
+        if not chunks:
+            raise ValueError("No valid documents loaded")
         return chunks
     
+    def ingest_paths( self,
+        paths: List[Path],
+        *,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        progress: Optional[ProgressCallback] = None,) -> IngestReport:
+        """
+        load -> split -> embed -> persist for files already on disk.
+        """
+        progress = progress or _no_progress
+        try:
+            chunks = self._load_chunks(paths, chunk_size, chunk_overlap, progress)
+            
+            if self.shared is not None:
+                # chunks go to the session's shard, tagged with the session id
+                self.last_report = self.shared.ingest(self.session_id, chunks, progress=progress)
+                return self.last_report
+
+            ## FAISS manager very very important class for the docchat
+            with FaissManager(self.faiss_dir) as fm:
+                # open-or-create, dedupe, embed once, persist once
+                self.last_report = fm.ingest(chunks, progress=progress)
+            log.info("FAISS index updated", index=str(self.faiss_dir), **self.last_report.model_dump())
+            return self.last_report
+        except Exception as e:
+            log.error("Failed to ingest documents", error=str(e))
+            raise DocumentPortalException("Failed to ingest documents", e) from e
+    
     def built_retriver( self,
         uploaded_files: Iterable,
         *,
@@ -142,29 +418,20 @@ class ChatIngestor:
         chunk_overlap: int = 200,
         k: int = 5,):
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
-            docs = load_documents(paths)
-            if not docs:
-                raise ValueError("No valid documents loaded")
-            
-            chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            
-            ## FAISS manager very very important class for the docchat
-            fm = FaissManager(self.faiss_dir, self.model_loader)
-            
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
-            
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-                
-            added = fm.add_documents(chunks)
-            log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
-            
+            paths = self.save_files(uploaded_files)
+            self.ingest_paths(paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            if self.shared is not None:
+                from src.document_chat.session_retriever import SessionRetriever
+                return SessionRetriever(
+                    shared=self.shared, session_id=self.session_id,
+                    embeddings=MODEL_REGISTRY.get_embeddings(), k=k,
+                )
+            with FaissManager(self.faiss_dir) as fm:
+                vs = fm.vectorstore()
             return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
             
+        except UploadTooLargeError:
+            raise
         except Exception as e:
             log.error("Failed to build retriever", error=str(e))
             raise DocumentPortalException("Failed to build retriever", e) from e
@@ -180,6 +447,8 @@ class DocHandler:
         self.data_dir = data_dir or os.getenv("DATA_STORAGE_PATH", os.path.join(os.getcwd(), "data", "document_analysis"))
         self.session_id = session_id or generate_session_id("session")
         self.session_path = os.path.join(self.data_dir, self.session_id)
+        self.last_sha256: Optional[str] = None  # sha256 of the last saved PDF (result cache key)
+        self.last_path: Optional[str] = None
         os.makedirs(self.session_path, exist_ok=True)
         log.info("DocHandler initialized", session_id=self.session_id, session_path=self.session_path)
 
@@ -189,26 +458,24 @@ class DocHandler:
             if not filename.lower().endswith(".pdf"):
                 raise ValueError("Invalid file type. Only PDFs are allowed.")
             save_path = os.path.join(self.session_path, filename)
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
-            log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id)
+            sha256, size = stream_upload_to_path(uploaded_file, Path(save_path))
+            self.last_sha256, self.last_path = sha256, save_path
+            log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id,
+                     bytes=size, sha256=sha256)
             return save_path
+        except UploadTooLargeError:
+            raise
         except Exception as e:
             log.error("Failed to save PDF", error=str(e), session_id=self.session_id)
             raise DocumentPortalException(f"Failed to save PDF: {str(e)}", e) from e
 
     def read_pdf(self, pdf_path: str) -> str:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page.get_text()}")  # type: ignore
-            text = "\n".join(text_chunks)
-            log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(text_chunks))
+            # hashed while saving: no second pass over the file for the text cache key
+            sha256 = self.last_sha256 if pdf_path == self.last_path else None
+            pages = get_pdf_extractor().page_texts(pdf_path, sha256)
+            text = pages_to_text(pages)
+            log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(pages))
             return text
         except Exception as e:
             log.error("Failed to read PDF", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
@@ -221,6 +488,9 @@ class DocumentComparator:
         self.base_dir = Path(base_dir)
         self.session_id = session_id or generate_session_id()
         self.session_path = self.base_dir / self.session_id
+        self.file_hashes: List[str] = []  # sha256 of (reference, actual) once saved
+        self.ref_path: Optional[Path] = None
+        self.act_path: Optional[Path] = None
         self.session_path.mkdir(parents=True, exist_ok=True)
         log.info("DocumentComparator initialized", session_path=str(self.session_path))
 
@@ -228,37 +498,48 @@ class DocumentComparator:
         try:
             ref_path = self.session_path / reference_file.name
             act_path = self.session_path / actual_file.name
+            hashes = []
             for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
+                hashes.append(stream_upload_to_path(fobj, out)[0])
+            self.file_hashes = hashes
+            self.ref_path, self.act_path = ref_path, act_path
             log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
             return ref_path, act_path
+        except UploadTooLargeError:
+            raise
         except Exception as e:
             log.error("Error saving PDF files", error=str(e), session=self.session_id)
             raise DocumentPortalException("Error saving files", e) from e
 
-    def read_pdf(self, pdf_path: Path) -> str:
+    def read_pages(self, pdf_path: Path) -> List[str]:
+        """Text of every page (empty pages included, so indexes are page numbers - 1)."""
         try:
-            with fitz.open(pdf_path) as doc:
-                if doc.is_encrypted:
-                    raise ValueError(f"PDF is encrypted: {pdf_path.name}")
-                parts = []
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text = page.get_text()  # type: ignore
-                    if text.strip():
-                        parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
-            log.info("PDF read successfully", file=str(pdf_path), pages=len(parts))
-            return "\n".join(parts)
+            known = dict(zip((self.ref_path, self.act_path), self.file_hashes))
+            return get_pdf_extractor().page_texts(pdf_path, known.get(Path(pdf_path)))
         except Exception as e:
             log.error("Error reading PDF", file=str(pdf_path), error=str(e))
             raise DocumentPortalException("Error reading PDF", e) from e
 
+    def read_pdf(self, pdf_path: Path) -> str:
+        pages = self.read_pages(pdf_path)
+        log.info("PDF read successfully", file=str(pdf_path), pages=len(pages))
+        return pages_to_text(pages)
+
+    def diff_documents(self, context_lines: int = 2) -> List[PageChange]:
+        """Page-aligned local diff of the saved reference vs actual PDF (see page_diff.diff_pages)."""
+        try:
+            if self.ref_path is None or self.act_path is None:
+                raise ValueError("save_uploaded_files() must run before diff_documents()")
+            rows = diff_pages(self.read_pages(self.ref_path), self.read_pages(self.act_path), context_lines)
+            log.info("Documents diffed", pages=len(rows), changed=sum(r.changed for r in rows),
+                     session=self.session_id)
+            return rows
+        except Exception as e:
+            log.error("Error diffing documents", error=str(e), session=self.session_id)
+            raise DocumentPortalException("Error diffing documents", e) from e
+
     def combine_documents(self) -> str:
         try:
             doc_parts = []
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from logger import GLOBAL_LOGGER as log
+from exception.custom_exception import DocumentPortalException
+
+# Called once per finished batch with (start offset into texts, vectors)
+BatchCallback = Callable[[int, List[List[float]]], None]
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    name = type(exc).__name__.lower()
+    msg = str(exc).lower()
+    return (
+        "ratelimit" in name
+        or "resourceexhausted" in name
+        or "429" in msg
+        or "resource_exhausted" in msg
+        or "rate limit" in msg
+        or "quota" in msg
+    )
+
+
+class EmbeddingPipeline:
+    """
+    Batched, concurrency-bounded embedding stage.
+
+    Texts are split into fixed-size batches, at most `max_concurrency` batches
+    are in flight (each on a thread, through the client's sync embed_documents), request starts are paced by a token bucket and throttled
+    batches (429 / RESOURCE_EXHAUSTED) are retried with exponential backoff.
+    `on_batch` fires as each batch completes so callers can add vectors to the
+    index incrementally.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, int(batch_size))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+
+    @classmethod
+    def from_config(cls, embeddings: Embeddings, cfg: Optional[Dict[str, Any]] = None) -> "EmbeddingPipeline":
+        cfg = cfg or {}
+        return cls(
+            embeddings,
+            batch_size=cfg.get("batch_size", 64),
+            max_concurrency=cfg.get("max_concurrency", 4),
+            requests_per_minute=cfg.get("requests_per_minute"),
+            max_retries=cfg.get("max_retries", 6),
+            backoff_base=cfg.get("backoff_base", 1.0),
+            backoff_max=cfg.get("backoff_max", 30.0),
+        )
+
+    async def aembed(self, texts: List[str], on_batch: BatchCallback) -> int:
+        """Embed all texts; returns the number of texts embedded."""
+        if not texts:
+            return 0
+        bucket = TokenBucket(self.requests_per_minute / 60.0) if self.requests_per_minute else None
+        sem = asyncio.Semaphore(self.max_concurrency)
+        starts = list(range(0, len(texts), self.batch_size))
+        t0 = time.perf_counter()
+
+        async def run_batch(start: int):
+            batch = texts[start:start + self.batch_size]
+            async with sem:
+                vectors = await self._embed_with_retry(batch, bucket, start)
+            return start, vectors
+
+        tasks = [asyncio.create_task(run_batch(s)) for s in starts]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                start, vectors = await fut
+                on_batch(start, vectors)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+
+        log.info(
+            "Embedding pipeline finished",
+            texts=len(texts),
+            batches=len(starts),
+            batch_size=self.batch_size,
+            max_concurrency=self.max_concurrency,
+            seconds=round(time.perf_counter() - t0, 3),
+        )
+        return len(texts)
+
+    def embed(self, texts: List[str], on_batch: BatchCallback) -> int:
+        """Sync entry point; safe to call from inside a running event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aembed(texts, on_batch))
+        # Already inside an event loop (e.g. an async endpoint): run on a helper thread
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            return ex.submit(asyncio.run, self.aembed(texts, on_batch)).result()
+
+    async def _embed_with_retry(self, batch: List[str], bucket: Optional[TokenBucket], start: int):
+        attempt = 0
+        while True:
+            if bucket is not None:
+                await bucket.acquire()
+            try:
+                # The sync client on a worker thread: a provider's async client (e.g. Gemini's
+                # grpc.aio channel) is bound to the loop it was created on, not to this one
+                return await asyncio.to_thread(self.embeddings.embed_documents, batch)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt >= self.max_retries:
+                    log.error("Embedding batch failed", start=start, size=len(batch), attempt=attempt, error=str(e))
+                    raise DocumentPortalException("Embedding batch failed", e) from e
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * (0.5 + random.random() / 2)
+                attempt += 1
+                log.warning("Embedding batch throttled, backing off", start=start, attempt=attempt, delay=round(delay, 2))
+                await asyncio.sleep(delay)
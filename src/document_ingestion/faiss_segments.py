@@ -0,0 +1,487 @@
+from __future__ import annotations
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from logger import GLOBAL_LOGGER as log
+from exception.custom_exception import DocumentPortalException
+from src.document_ingestion.sqlite_docstore import DOCSTORE_FILE, SqliteDocstore
+
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+LEGACY_PATH = "."  # pre-segment layout: index.faiss / index.pkl directly in the index dir
+FLAT = "Flat"
+VECTORS_FILE = "vectors.npy"  # raw float32 vectors kept next to a trained (non-flat) base
+IDS_FILE = "ids.npy"  # docstore id of each vector, in index order (marks the non-pickle segment format)
+
+# IFC maps flat/HNSW codes in place; IVF only supports mapping its inverted lists
+_MMAP_FLAG_SETS = (
+    faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+    faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+)
+
+_compacting: set = set()
+_compacting_lock = threading.Lock()
+
+
+def build_index(vectors: np.ndarray, index_cfg: Dict[str, Any]) -> Tuple[faiss.Index, str]:
+    """
+    Build a FAISS index over `vectors` from faiss_db.index config; returns (index, factory used).
+    Small sets (below min_vectors) and failed trainings fall back to an exact flat index.
+    """
+    factory = index_cfg.get("factory", FLAT) or FLAT
+    n, d = vectors.shape
+    if factory != FLAT and n >= int(index_cfg.get("min_vectors", 50_000)):
+        try:
+            index = faiss.index_factory(d, factory)
+            if not index.is_trained:
+                sample_size = min(n, int(index_cfg.get("train_sample", 100_000)))
+                rng = np.random.default_rng(0)
+                sample = vectors[rng.choice(n, sample_size, replace=False)] if sample_size < n else vectors
+                t0 = time.perf_counter()
+                index.train(sample)
+                log.info("FAISS index trained", factory=factory, sample=sample_size,
+                         seconds=round(time.perf_counter() - t0, 3))
+            index.add(vectors)
+            return index, factory
+        except Exception as e:
+            log.warning("FAISS index build failed, using flat index", factory=factory, vectors=n, error=str(e))
+    index = faiss.IndexFlatL2(d)
+    index.add(vectors)
+    return index, FLAT
+
+
+def tune_search(index: faiss.Index, params: Optional[Dict[str, Any]]) -> None:
+    """Apply query-time knobs (nprobe for IVF, efSearch for HNSW) that the index supports."""
+    if not params or isinstance(index, faiss.IndexFlat):
+        return
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # parameter does not apply to this index type
+
+
+def read_index_mapped(path: Path | str) -> faiss.Index:
+    """
+    Open a FAISS index file memory-mapped and read-only, so its pages live in the OS
+    page cache (shared by every worker process) instead of each process's heap.
+    Falls back to a regular read for index types faiss cannot map.
+    """
+    for flags in _MMAP_FLAG_SETS:
+        try:
+            return faiss.read_index(str(path), flags)
+        except RuntimeError:
+            continue
+    log.warning("FAISS index cannot be memory-mapped, reading into memory", path=str(path))
+    return faiss.read_index(str(path))
+
+
+class LazyIdMap(Mapping):
+    """
+    Read-only index_to_docstore_id over the memory-mapped ids.npy of each segment;
+    position i of the combined index resolves to (segment, local offset) by bisection.
+    """
+
+    def __init__(self, parts: List[np.ndarray]):
+        self._parts = parts
+        self._offsets: List[int] = []
+        total = 0
+        for ids in parts:
+            self._offsets.append(total)
+            total += len(ids)
+        self._total = total
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self._total:
+            raise KeyError(i)
+        seg = bisect_right(self._offsets, i) - 1
+        return str(self._parts[seg][i - self._offsets[seg]])
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._total))
+
+
+class MappedSegment(NamedTuple):
+    index: faiss.Index              # memory-mapped, search params applied
+    ids: np.ndarray                 # docstore id per position (memory-mapped)
+    vectors: Optional[np.ndarray]   # raw vectors of a trained base (memory-mapped), else None
+
+
+def merge_into(vs: FAISS, part: FAISS) -> None:
+    """merge_from, or re-adding part's vectors when the target index type cannot merge (HNSW)."""
+    try:
+        vs.merge_from(part)
+        return
+    except RuntimeError:
+        pass
+    start = len(vs.index_to_docstore_id)
+    vs.index.add(part.index.reconstruct_n(0, part.index.ntotal))
+    ids = [part.index_to_docstore_id[i] for i in range(part.index.ntotal)]
+    vs.docstore.add({_id: part.docstore.search(_id) for _id in ids})  # type: ignore[attr-defined]
+    vs.index_to_docstore_id.update({start + i: _id for i, _id in enumerate(ids)})
+
+
+class SegmentedIndex:
+    """
+    Segmented on-disk layout for one FAISS index directory.
+
+        <index_dir>/manifest.json          ordered list of live segments
+        <index_dir>/docstore.sqlite        chunk text + metadata of every segment, by id
+        <index_dir>/segments/base_*/       immutable base (index.faiss + ids.npy)
+        <index_dir>/segments/delta_*/      small per-ingest deltas
+
+    Appends write only the new delta, so write cost follows the size of the new
+    data. load() memory-maps the live segments and reads chunks lazily from the
+    docstore; compact() folds deltas into a new base. Segments written before the
+    docstore existed (index.pkl) are merged in memory until compaction migrates them.
+    """
+
+    def __init__(self, index_dir: Path | str, index_name: str = "index",
+                 index_cfg: Optional[Dict[str, Any]] = None):
+        self.index_dir = Path(index_dir)
+        self.index_name = index_name
+        # faiss_db.index: factory used for compacted bases + query-time search params
+        self.index_cfg = index_cfg or {}
+        self.manifest_path = self.index_dir / MANIFEST_FILE
+        self.docstore_path = self.index_dir / DOCSTORE_FILE
+
+    # ---------- Manifest ----------
+
+    @contextmanager
+    def _locked(self):
+        # Serialises manifest read-modify-write across threads and worker processes
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_dir / ".manifest.lock", "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _compaction_lock(self):
+        # One compaction per index across processes; yields False when another holds it
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_dir / ".compact.lock", "a") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _legacy_exists(self) -> bool:
+        return (self.index_dir / f"{self.index_name}.faiss").exists() and (
+            self.index_dir / f"{self.index_name}.pkl"
+        ).exists()
+
+    def read_manifest(self) -> Dict[str, Any]:
+        if self.manifest_path.exists():
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        if self._legacy_exists():
+            return {"segments": [{"path": LEGACY_PATH, "kind": "base", "ntotal": None}]}
+        return {"segments": []}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self.index_dir / f".{MANIFEST_FILE}.{uuid.uuid4().hex[:6]}"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def exists(self) -> bool:
+        return bool(self.read_manifest()["segments"])
+
+    def segments(self) -> List[Dict[str, Any]]:
+        return self.read_manifest()["segments"]
+
+    def nbytes(self) -> int:
+        total = 0
+        for seg in self.segments():
+            for name in (f"{self.index_name}.faiss", f"{self.index_name}.pkl", IDS_FILE):
+                p = self.index_dir / seg["path"] / name
+                if p.exists():
+                    total += p.stat().st_size
+        return total
+
+    def _is_pickled(self, seg: Dict[str, Any]) -> bool:
+        return not (self.index_dir / seg["path"] / IDS_FILE).exists()
+
+    def docstore(self) -> SqliteDocstore:
+        return SqliteDocstore(self.docstore_path)
+
+    # ---------- Read ----------
+
+    def _load_pickled(self, seg: Dict[str, Any], embeddings) -> FAISS:
+        return FAISS.load_local(
+            str(self.index_dir / seg["path"]),
+            embeddings,
+            index_name=self.index_name,
+            allow_dangerous_deserialization=True,  # legacy segments were written by us
+        )
+
+    def _open_mapped(self, segments: List[Dict[str, Any]]) -> List[MappedSegment]:
+        opened = []
+        for seg in segments:
+            seg_dir = self.index_dir / seg["path"]
+            index = read_index_mapped(seg_dir / f"{self.index_name}.faiss")
+            tune_search(index, self.index_cfg.get("search"))
+            raw = seg_dir / VECTORS_FILE
+            opened.append(MappedSegment(
+                index,
+                np.load(seg_dir / IDS_FILE, mmap_mode="r"),
+                np.load(raw, mmap_mode="r") if raw.exists() else None,
+            ))
+        return opened
+
+    def open_segments(self) -> List[MappedSegment]:
+        """The live segments in order, memory-mapped (position = segment offset + local id)."""
+        for attempt in range(3):
+            segments = self.segments()
+            try:
+                return self._open_mapped(segments)
+            except (FileNotFoundError, RuntimeError):
+                if attempt == 2:
+                    raise
+                time.sleep(0.05)
+        raise DocumentPortalException(f"Could not open FAISS segments in {self.index_dir}", None)
+
+    def _load_mapped(self, segments: List[Dict[str, Any]], embeddings) -> FAISS:
+        opened = self._open_mapped(segments)
+        if len(opened) == 1:
+            index = opened[0].index
+        else:
+            # Search every segment and merge hits; successive ids keep positions aligned with LazyIdMap
+            index = faiss.IndexShards(opened[0].index.d, False, True)
+            for part in opened:
+                index.add_shard(part.index)
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=self.docstore(),
+            index_to_docstore_id=LazyIdMap([part.ids for part in opened]),  # type: ignore[arg-type]
+        )
+
+    def _load_merged(self, segments: List[Dict[str, Any]], embeddings) -> FAISS:
+        vs: Optional[FAISS] = None
+        docstore: Optional[SqliteDocstore] = None
+        for seg in segments:
+            if self._is_pickled(seg):
+                part = self._load_pickled(seg, embeddings)
+            else:
+                seg_dir = self.index_dir / seg["path"]
+                ids = np.load(seg_dir / IDS_FILE)
+                docstore = docstore or self.docstore()
+                part = FAISS(
+                    embedding_function=embeddings,
+                    index=faiss.read_index(str(seg_dir / f"{self.index_name}.faiss")),
+                    docstore=docstore,
+                    index_to_docstore_id={i: str(_id) for i, _id in enumerate(ids)},
+                )
+            if vs is None:
+                vs = part
+            else:
+                merge_into(vs, part)
+        tune_search(vs.index, self.index_cfg.get("search"))  # type: ignore[union-attr]
+        return vs  # type: ignore[return-value]
+
+    def load(self, embeddings) -> FAISS:
+        """
+        Open all live segments as one read-only vectorstore: index files are memory-mapped
+        and chunks are fetched from the docstore by id, so a cold load reads almost nothing.
+        Indexes that still have pickled segments are merged in memory instead.
+        """
+        for attempt in range(3):
+            segments = self.segments()
+            if not segments:
+                raise FileNotFoundError(f"No FAISS segments in {self.index_dir}")
+            try:
+                if any(self._is_pickled(seg) for seg in segments):
+                    return self._load_merged(segments, embeddings)
+                return self._load_mapped(segments, embeddings)
+            except (FileNotFoundError, RuntimeError):
+                # A concurrent compaction may have swapped the manifest under us; retry with the new one
+                if attempt == 2:
+                    raise
+                time.sleep(0.05)
+        raise DocumentPortalException(f"Could not load FAISS segments from {self.index_dir}", None)
+
+    # ---------- Write ----------
+
+    def _write_segment(self, rel: str, index: faiss.Index, ids: List[str]) -> None:
+        seg_dir = self.index_dir / rel
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(index, str(seg_dir / f"{self.index_name}.faiss"))
+        np.save(seg_dir / IDS_FILE, np.array(ids, dtype=str))
+
+    def append(self, delta: FAISS, generation: int) -> str:
+        """Persist `delta` as a new segment (base if the index is empty) and publish it."""
+        suffix = f"{generation:06d}_{uuid.uuid4().hex[:6]}"
+        incoming = f"{SEGMENTS_DIR}/.incoming_{suffix}"
+        ids = [delta.index_to_docstore_id[i] for i in range(delta.index.ntotal)]
+        # Chunks first: a published segment must never reference ids the docstore lacks
+        docstore = self.docstore()
+        try:
+            docstore.add({_id: delta.docstore.search(_id) for _id in ids})  # type: ignore[misc]
+        finally:
+            docstore.close()
+        self._write_segment(incoming, delta.index, ids)
+        with self._locked():
+            manifest = self.read_manifest()
+            # base vs delta is decided under the lock: a concurrent append may create the base
+            kind = "delta" if manifest["segments"] else "base"
+            rel = f"{SEGMENTS_DIR}/{kind}_{suffix}"
+            os.replace(self.index_dir / incoming, self.index_dir / rel)
+            manifest["segments"].append({"path": rel, "kind": kind, "ntotal": delta.index.ntotal})
+            self._write_manifest(manifest)
+        log.info("FAISS segment written", index=str(self.index_dir), segment=rel, vectors=delta.index.ntotal)
+        return rel
+
+    def needs_rebuild(self) -> bool:
+        """
+        True when the index has grown past min_vectors but its base was not built with
+        the configured factory. A base whose build fell back to flat records the factory
+        it attempted, so a failing factory is only retried once the config changes.
+        """
+        factory = self.index_cfg.get("factory", FLAT) or FLAT
+        segments = self.segments()
+        if factory == FLAT or not segments:
+            return False
+        total = sum(s.get("ntotal") or 0 for s in segments)
+        base = segments[0]
+        return total >= int(self.index_cfg.get("min_vectors", 50_000)) and \
+            base.get("attempted", base.get("factory", FLAT)) != factory
+
+    def needs_compaction(self, max_deltas: int) -> bool:
+        deltas = sum(1 for s in self.segments() if s["kind"] == "delta")
+        return deltas >= max_deltas or self.needs_rebuild()
+
+    def _segment_vectors(self, seg: Dict[str, Any], index: faiss.Index) -> np.ndarray:
+        raw = self.index_dir / seg["path"] / VECTORS_FILE
+        if raw.exists():
+            return np.load(raw)
+        return index.reconstruct_n(0, index.ntotal)  # flat segments reconstruct exactly
+
+    def compact(self, embeddings) -> Optional[str]:
+        """
+        Fold the current base + deltas into a single new base segment, built with the
+        configured index factory (flat below min_vectors). Vector positions are kept:
+        the base holds the folded segments in manifest order, newer deltas follow it. Chunks of pickled segments
+        are moved into the docstore, so the new base is always memory-mappable.
+        """
+        with self._compaction_lock() as acquired:
+            if not acquired:
+                log.info("FAISS compaction already running elsewhere, skipped", index=str(self.index_dir))
+                return None
+            return self._compact(embeddings)
+
+    def _compact(self, embeddings) -> Optional[str]:
+        snapshot = self.segments()
+        if len(snapshot) < 2 and not self.needs_rebuild() and not any(map(self._is_pickled, snapshot)):
+            return None
+        t0 = time.perf_counter()
+        vectors: List[np.ndarray] = []
+        ids: List[str] = []
+        docstore = self.docstore()
+        try:
+            for seg in snapshot:
+                if self._is_pickled(seg):
+                    part = self._load_pickled(seg, embeddings)
+                    seg_ids = [part.index_to_docstore_id[i] for i in range(part.index.ntotal)]
+                    docstore.add({_id: part.docstore.search(_id) for _id in seg_ids})  # type: ignore[misc]
+                    index = part.index
+                else:
+                    seg_dir = self.index_dir / seg["path"]
+                    seg_ids = [str(_id) for _id in np.load(seg_dir / IDS_FILE)]
+                    index = faiss.read_index(str(seg_dir / f"{self.index_name}.faiss"))
+                vectors.append(self._segment_vectors(seg, index))
+                ids.extend(seg_ids)
+        finally:
+            docstore.close()
+        all_vectors = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        index, factory = build_index(all_vectors, self.index_cfg)
+        configured = self.index_cfg.get("factory", FLAT) or FLAT
+        # what build_index tried: below min_vectors it goes straight to flat
+        attempted = configured if len(all_vectors) >= int(self.index_cfg.get("min_vectors", 50_000)) else FLAT
+        rel = f"{SEGMENTS_DIR}/base_c{int(time.time())}_{uuid.uuid4().hex[:6]}"
+        self._write_segment(rel, index, ids)
+        if factory != FLAT:
+            # trained/lossy indexes cannot give back exact vectors for the next compaction
+            np.save(self.index_dir / rel / VECTORS_FILE, all_vectors)
+
+        folded = {s["path"] for s in snapshot}
+        with self._locked():
+            manifest = self.read_manifest()
+            current = [s["path"] for s in manifest["segments"]]
+            if current[:len(snapshot)] != [s["path"] for s in snapshot]:
+                # The segments we folded are no longer the manifest's prefix: publishing would
+                # duplicate vectors and shift positions, so drop this base
+                shutil.rmtree(self.index_dir / rel, ignore_errors=True)
+                log.warning("FAISS compaction aborted, manifest changed", index=str(self.index_dir), base=rel)
+                return None
+            # Keep deltas appended while we were merging
+            newer = manifest["segments"][len(snapshot):]
+            base = {"path": rel, "kind": "base", "ntotal": index.ntotal, "factory": factory}
+            if attempted != factory:
+                base["attempted"] = attempted  # build failed and fell back to flat
+            manifest["segments"] = [base] + newer
+            self._write_manifest(manifest)
+
+        for path in folded:
+            if path == LEGACY_PATH:
+                for suffix in (".faiss", ".pkl"):
+                    (self.index_dir / f"{self.index_name}{suffix}").unlink(missing_ok=True)
+            else:
+                shutil.rmtree(self.index_dir / path, ignore_errors=True)
+        log.info(
+            "FAISS segments compacted",
+            index=str(self.index_dir),
+            folded=len(folded),
+            base=rel,
+            factory=factory,
+            seconds=round(time.perf_counter() - t0, 3),
+        )
+        return rel
+
+    def compact_in_background(self, embeddings) -> bool:
+        """Start compaction on a daemon thread unless one is already running for this index."""
+        key = str(self.index_dir.resolve())
+        with _compacting_lock:
+            if key in _compacting:
+                return False
+            _compacting.add(key)
+
+        def run():
+            try:
+                self.compact(embeddings)
+            except Exception as e:
+                log.error("Background compaction failed", index=key, error=str(e))
+            finally:
+                with _compacting_lock:
+                    _compacting.discard(key)
+
+        threading.Thread(target=run, name=f"faiss-compact-{self.index_dir.name}", daemon=True).start()
+        return True
+
+
+def load_vectorstore(index_dir: Path | str, embeddings, index_name: str = "index",
+                     index_cfg: Optional[Dict[str, Any]] = None) -> FAISS:
+    """Load a FAISS index dir in either the segmented or the legacy single-file layout."""
+    return SegmentedIndex(index_dir, index_name, index_cfg).load(embeddings)
@@ -0,0 +1,264 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from logger import GLOBAL_LOGGER as log
+from exception.custom_exception import DocumentPortalException
+from utils.config_loader import load_config
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class IngestionJobQueue:
+    """
+    Persistent (SQLite) queue of /chat/index ingestion jobs plus a local worker pool.
+
+    Uploads are saved to the session dir before a job is enqueued, so a job only
+    needs file paths and parameters and survives a process restart. Running jobs
+    hold a lease that a heartbeat thread renews while the job runs; jobs whose lease
+    ran out (worker died) are put back in the queue. Each claim writes its own token
+    to `worker`, and a run only updates its job while that token is still there.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | str,
+        workers: int = 2,
+        lease_seconds: float = 600.0,
+        poll_interval: float = 1.0,
+        max_attempts: int = 3,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, int(workers))
+        self.lease_seconds = float(lease_seconds)
+        self.poll_interval = float(poll_interval)
+        self.max_attempts = int(max_attempts)
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    session_id TEXT,
+                    payload TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    timings TEXT NOT NULL DEFAULT '{}',
+                    report TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status, created_at)")
+
+    @classmethod
+    def from_config(cls) -> "IngestionJobQueue":
+        cfg = load_config().get("jobs", {})
+        return cls(
+            os.getenv("JOBS_DB_PATH", cfg.get("db_path", "jobs/ingestion_jobs.sqlite")),
+            workers=cfg.get("workers", 2),
+            lease_seconds=cfg.get("lease_seconds", 600),
+            poll_interval=cfg.get("poll_interval", 1.0),
+            max_attempts=cfg.get("max_attempts", 3),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ---------- Producer side ----------
+
+    def submit(self, session_id: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs(id, status, stage, session_id, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, session_id, json.dumps(payload), now, now),
+            )
+        self._wake.set()
+        log.info("Ingestion job queued", job_id=job_id, session_id=session_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "session_id": row["session_id"],
+            "progress": json.loads(row["progress"]),
+            "timings": json.loads(row["timings"]),
+            "report": json.loads(row["report"]) if row["report"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    # ---------- Worker side ----------
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker stopped renewing its lease go back to the queue (bounded retries)
+                conn.execute(
+                    "UPDATE jobs SET status=CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                    "error=CASE WHEN attempts >= ? THEN 'worker lost (lease expired)' ELSE error END, "
+                    "worker=NULL WHERE status=? AND lease_until < ?",
+                    (self.max_attempts, FAILED, QUEUED, self.max_attempts, RUNNING, now),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status=? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status=?, worker=?, lease_until=?, updated_at=?, attempts=attempts+1 "
+                        "WHERE id=?",
+                        (RUNNING, f"{self.worker_id}/{uuid.uuid4().hex[:6]}", now + self.lease_seconds, now,
+                         row["id"]),
+                    )
+                    row = conn.execute("SELECT * FROM jobs WHERE id=?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+                return row
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _update(self, job_id: str, worker: Optional[str] = None, **fields: Any) -> bool:
+        """Update a job; with `worker`, only while that claim still owns it. True if a row changed."""
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k}=?" for k in fields)
+        where, args = "id=?", [job_id]
+        if worker is not None:
+            where, args = "id=? AND worker=?", [job_id, worker]
+        with closing(self._connect()) as conn:
+            return conn.execute(f"UPDATE jobs SET {cols} WHERE {where}", (*fields.values(), *args)).rowcount > 0
+
+    def _heartbeat(self, job_id: str, worker: str, stop: threading.Event) -> None:
+        # Loading/splitting a large upload may not report progress for a long time
+        while not stop.wait(max(0.05, self.lease_seconds / 3)):
+            if not self._update(job_id, worker, lease_until=time.time() + self.lease_seconds):
+                log.warning("Ingestion job lease lost", job_id=job_id, worker=worker)
+                return
+
+    def _run(self, row: sqlite3.Row) -> None:
+        # Imported here: the pipeline pulls in the model stack, the queue itself should not
+        from src.document_ingestion.data_ingestion import ChatIngestor
+
+        job_id, worker = row["id"], row["worker"]
+        payload = json.loads(row["payload"])
+        timings: Dict[str, float] = {}
+        state = {"stage": None, "started": time.perf_counter()}
+
+        def progress(stage: str, **counts: Any) -> None:
+            now = time.perf_counter()
+            if stage != state["stage"]:
+                if state["stage"] is not None:
+                    timings[state["stage"]] = round(now - state["started"], 3)
+                state["stage"], state["started"] = stage, now
+            self._update(
+                job_id,
+                worker,
+                stage=stage,
+                progress=json.dumps(counts),
+                timings=json.dumps(timings),
+                lease_until=time.time() + self.lease_seconds,
+            )
+
+        log.info("Ingestion job started", job_id=job_id, session_id=row["session_id"])
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, worker, stop),
+                                     name=f"ingest-lease-{job_id[:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            ci = ChatIngestor(
+                temp_base=payload["temp_base"],
+                faiss_base=payload["faiss_base"],
+                use_session_dirs=payload["use_session_dirs"],
+                session_id=row["session_id"],
+            )
+            report = ci.ingest_paths(
+                [Path(p) for p in payload["paths"]],
+                chunk_size=payload["chunk_size"],
+                chunk_overlap=payload["chunk_overlap"],
+                progress=progress,
+            )
+            progress("done")
+            # no lease renewal may land after the final write
+            stop.set()
+            heartbeat.join()
+            if self._update(job_id, worker, status=SUCCEEDED, report=report.model_dump_json(), lease_until=None):
+                log.info("Ingestion job finished", job_id=job_id, timings=timings, **report.model_dump())
+            else:
+                log.warning("Ingestion job finished after losing its lease, result dropped", job_id=job_id)
+        except Exception as e:
+            stop.set()
+            heartbeat.join()
+            err = e.error_message if isinstance(e, DocumentPortalException) else str(e)
+            self._update(job_id, worker, status=FAILED, error=err, lease_until=None)
+            log.error("Ingestion job failed", job_id=job_id, error=err)
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except Exception as e:
+                log.error("Failed to claim ingestion job", error=str(e))
+                row = None
+            if row is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(row)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        log.info("Ingestion workers started", workers=self.workers, db=str(self.db_path))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+
+_queue: Optional[IngestionJobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> IngestionJobQueue:
+    """Process-wide queue, created on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IngestionJobQueue.from_config()
+        return _queue
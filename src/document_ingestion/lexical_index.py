@@ -0,0 +1,127 @@
+from __future__ import annotations
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from langchain.schema import Document
+from logger import GLOBAL_LOGGER as log
+
+LEXICAL_INDEX_FILE = "lexical.sqlite"
+
+# Dropped from queries: they match most chunks, add nothing to BM25 and make lookups slow
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the this to was "
+    "what when where which who why will with".split()
+)
+# same split as FTS5 unicode61: letters and digits, everything else separates
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def to_match_query(query: str) -> str:
+    """
+    FTS5 MATCH expression for a free-text question: terms are OR-ed, and identifiers
+    with inner punctuation ("12.3", "SKU-4411") become phrases so their parts must be adjacent.
+    """
+    terms: List[str] = []
+    for raw in query.split():
+        tokens = [t.lower() for t in _WORD.findall(raw)]
+        if not tokens:
+            continue
+        if len(tokens) == 1 and tokens[0] in _STOPWORDS:
+            continue
+        phrase = '"' + " ".join(tokens) + '"'
+        if phrase not in terms:
+            terms.append(phrase)
+    return " OR ".join(terms)
+
+
+class LexicalIndex:
+    """
+    Per-index BM25 inverted index (SQLite FTS5) over the same chunks as the FAISS index.
+
+    Like FingerprintStore, rows carry the generation they were written for and rows
+    newer than the committed index generation are purged on open. Readers pass
+    read_only=True instead: the file is opened read-only (no DDL, no purge of an ingest
+    still in progress) on first search, rows newer than `committed_generation` are
+    never returned, and close() may be called at any time; the next search reopens.
+    """
+
+    def __init__(self, path: Path | str, committed_generation: int, purge: bool = True, read_only: bool = False):
+        self.path = Path(path)
+        self.committed_generation = committed_generation
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if read_only:
+            return
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            " content, metadata UNINDEXED, generation UNINDEXED,"
+            " tokenize='unicode61 remove_diacritics 2')"
+        )
+        # highest generation written, so the purge scan only runs after an interrupted ingest
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lexical_state (generation INTEGER NOT NULL)")
+        row = self._conn.execute("SELECT generation FROM lexical_state").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO lexical_state(generation) VALUES (?)", (committed_generation,))
+        elif purge and row[0] > committed_generation:
+            purged = self._conn.execute(
+                "DELETE FROM chunks WHERE generation > ?", (committed_generation,)
+            ).rowcount
+            self._conn.execute("UPDATE lexical_state SET generation=?", (committed_generation,))
+            log.warning("Purged lexical rows of an uncommitted index write", path=str(self.path), purged=purged)
+        self._conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # caller holds self._lock
+        if self._conn is None:
+            if not self.read_only:
+                raise sqlite3.ProgrammingError(f"Lexical index is closed: {self.path}")
+            self._conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False, timeout=30
+            )
+        return self._conn
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def add_many(self, docs: Iterable[Document], generation: int) -> None:
+        rows = [
+            (d.page_content, json.dumps(d.metadata, ensure_ascii=False, default=str), generation)
+            for d in docs
+        ]
+        if self.read_only:
+            raise sqlite3.ProgrammingError(f"Lexical index opened read-only: {self.path}")
+        self.committed_generation = max(self.committed_generation, generation)
+        with self._lock, self._connection() as conn:  # single transaction
+            conn.executemany(
+                "INSERT INTO chunks(content, metadata, generation) VALUES (?, ?, ?)", rows
+            )
+            conn.execute(
+                "UPDATE lexical_state SET generation=MAX(generation, ?)", (generation,)
+            )
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 (higher score is better)."""
+        match = to_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT content, metadata, bm25(chunks) AS score FROM chunks "
+                "WHERE chunks MATCH ? AND generation <= ? ORDER BY score LIMIT ?",
+                (match, self.committed_generation, int(k)),
+            ).fetchall()
+        # FTS5's bm25() is negated so that ORDER BY ascending puts the best match first
+        return [(Document(page_content=c, metadata=json.loads(m)), -s) for c, m, s in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,299 @@
+from __future__ import annotations
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from langchain.schema import Document
+from model.models import IngestReport
+from utils.config_loader import load_config
+from utils.file_io import read_index_generation
+from utils.lru_cache import LRUCache
+from logger import GLOBAL_LOGGER as log
+from src.document_ingestion.faiss_segments import LazyIdMap, MappedSegment, SegmentedIndex
+from src.document_ingestion.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from src.document_ingestion.sqlite_docstore import DOCSTORE_FILE, SqliteDocstore
+
+MEMBERSHIP_FILE = "sessions.sqlite"
+
+
+def chunk_id(text: str) -> str:
+    """Docstore id of a chunk (hex sha256 of its text, as written by FaissManager)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _filtered_params(index: faiss.Index, selector: faiss.IDSelector, k: int) -> faiss.SearchParameters:
+    # Per-call params replace the index's own knobs, so carry its nprobe / efSearch over
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, k))
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_positions(
+    segments: Sequence[MappedSegment], query: np.ndarray, positions: np.ndarray, k: int, exact_max: int
+) -> List[Tuple[float, int]]:
+    """
+    Top-k (L2 distance, position) over `segments`, restricted to the sorted global `positions`.
+
+    Flat segments, and trained segments with raw vectors when few positions fall in
+    them, are scored exactly on just those rows; larger selections use the index
+    with an ID selector.
+    """
+    q = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+    hits: List[Tuple[float, int]] = []
+    offset = 0
+    for seg in segments:
+        n = seg.index.ntotal
+        lo, hi = np.searchsorted(positions, [offset, offset + n])
+        local = np.asarray(positions[lo:hi], dtype=np.int64) - offset
+        if len(local):
+            if isinstance(seg.index, faiss.IndexFlat) or (seg.vectors is not None and len(local) <= exact_max):
+                rows = seg.index.reconstruct_batch(local) if seg.vectors is None else np.asarray(seg.vectors[local])
+                dist = ((rows - q) ** 2).sum(axis=1)
+                top = np.argsort(dist)[:k]
+                hits.extend((float(dist[i]), offset + int(local[i])) for i in top)
+            else:
+                selector = faiss.IDSelectorBatch(local)
+                D, I = seg.index.search(q, min(k, len(local)), params=_filtered_params(seg.index, selector, k))
+                hits.extend((float(d), offset + int(i)) for d, i in zip(D[0], I[0]) if i >= 0)
+        offset += n
+    hits.sort()
+    return hits[:k]
+
+
+class SharedIndex:
+    """
+    Multi-tenant chat index: the chunks of all sessions live in a few shards, and
+    each session searches only its own chunks.
+
+        <root>/sessions.sqlite     session -> shard, session -> chunk ids, chunk id -> vector position
+        <root>/shard_NN/           a regular segmented index (FaissManager layout)
+
+    A chunk uploaded by several sessions of a shard is embedded and stored once.
+    Sessions keep the shard they were first assigned (crc32 of the id mod `shards`).
+    Vector positions never change, since compaction keeps segment order.
+    """
+
+    def __init__(self, root: Path | str, shards: int = 4, model_loader=None, exact_max: int = 20_000):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shards = int(shards)
+        self.exact_max = int(exact_max)
+        self.model_loader = model_loader
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / MEMBERSHIP_FILE), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, shard INTEGER NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS session_chunks ("
+            " session_id TEXT NOT NULL, chunk_id TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, chunk_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS chunk_positions ("
+            " shard INTEGER NOT NULL, chunk_id TEXT NOT NULL, position INTEGER NOT NULL,"
+            " PRIMARY KEY (shard, chunk_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS shard_state ("
+            " shard INTEGER PRIMARY KEY, indexed INTEGER NOT NULL);"
+        )
+        self._conn.commit()
+        config = model_loader.config if model_loader is not None else load_config()
+        self._index_cfg = config.get("faiss_db", {}).get("index", {})
+        # (shard, generation) -> opened segments / docstore / BM25 index
+        self._shard_cache = LRUCache(
+            "shared_shards", max_entries=max(self.shards, 1) * 2, dispose=self._close_shard
+        )
+        # (shard, session) -> (positions, chunk ids), tagged with (shard generation, session version)
+        self._session_cache = LRUCache("shared_sessions", max_entries=1024)
+
+    def shard_dir(self, shard: int) -> Path:
+        return self.root / f"shard_{shard:02d}"
+
+    # ---------- Membership ----------
+
+    def shard_of(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT shard FROM sessions WHERE session_id=?", (session_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def has_session(self, session_id: str) -> bool:
+        return self.shard_of(session_id) is not None
+
+    def _assign(self, session_id: str) -> int:
+        shard = zlib.crc32(session_id.encode("utf-8")) % self.shards
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions(session_id, shard, created_at) VALUES (?, ?, ?)",
+                (session_id, shard, time.time()),
+            )
+        return self.shard_of(session_id)  # type: ignore[return-value]
+
+    def _version(self, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE session_id=?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _scope(self, session_id: str) -> Tuple[int, Tuple[int, int]]:
+        shard = self.shard_of(session_id)
+        if shard is None:
+            raise KeyError(f"Unknown session in shared index: {session_id}")
+        return shard, (read_index_generation(self.shard_dir(shard)), self._version(session_id))
+
+    def session_scope(self, session_id: str) -> Tuple[str, Tuple[int, int]]:
+        """(shard dir, cache generation) of a session; the generation moves on any write that affects it."""
+        shard, generation = self._scope(session_id)
+        return str(self.shard_dir(shard)), generation
+
+    # ---------- Write ----------
+
+    @contextmanager
+    def _shard_locked(self, shard: int):
+        # One ingest per shard at a time, across threads and worker processes
+        shard_dir = self.shard_dir(shard)
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        with open(shard_dir / ".ingest.lock", "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _record_positions(self, shard: int) -> None:
+        """Map chunk id -> position for vectors appended to the shard since the last call."""
+        with self._lock:
+            row = self._conn.execute("SELECT indexed FROM shard_state WHERE shard=?", (shard,)).fetchone()
+        indexed = row[0] if row else 0
+        offset = 0
+        rows: List[Tuple[int, str, int]] = []
+        for seg in SegmentedIndex(self.shard_dir(shard)).open_segments():
+            n = len(seg.ids)
+            if offset + n > indexed:
+                start = max(indexed - offset, 0)
+                rows.extend((shard, str(seg.ids[i]), offset + i) for i in range(start, n))
+            offset += n
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_positions(shard, chunk_id, position) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT INTO shard_state(shard, indexed) VALUES (?, ?) "
+                "ON CONFLICT(shard) DO UPDATE SET indexed=MAX(indexed, excluded.indexed)",
+                (shard, offset),
+            )
+
+    def ingest(self, session_id: str, chunks: List[Document], progress=None) -> IngestReport:
+        """Add `chunks` to the session's shard (embedding only chunks the shard lacks) and tag them."""
+        from src.document_ingestion.data_ingestion import FaissManager
+
+        shard = self._assign(session_id)
+        with self._shard_locked(shard):
+            with FaissManager(self.shard_dir(shard), self.model_loader) as fm:
+                report = fm.ingest(chunks, progress=progress)
+            self._record_positions(shard)
+        ids = {chunk_id(c.page_content) for c in chunks}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO session_chunks(session_id, chunk_id) VALUES (?, ?)",
+                [(session_id, i) for i in ids],
+            )
+            self._conn.execute("UPDATE sessions SET version = version + 1 WHERE session_id=?", (session_id,))
+        log.info("Shared index updated", session_id=session_id, shard=shard, chunks=len(ids), **report.model_dump())
+        return report
+
+    # ---------- Read ----------
+
+    @staticmethod
+    def _close_shard(opened) -> None:
+        # the read-only BM25 reader reopens itself if a search still holds it
+        if opened[3] is not None:
+            opened[3].close()
+
+    def _open_shard(
+        self, shard: int
+    ) -> Tuple[List[MappedSegment], LazyIdMap, SqliteDocstore, Optional[LexicalIndex]]:
+        shard_dir = self.shard_dir(shard)
+        generation = read_index_generation(shard_dir)
+        opened = self._shard_cache.get(shard, generation)
+        if opened is None:
+            lexical_path = shard_dir / LEXICAL_INDEX_FILE
+            segments = SegmentedIndex(shard_dir, index_cfg=self._index_cfg).open_segments()
+            opened = (
+                segments,
+                LazyIdMap([seg.ids for seg in segments]),
+                SqliteDocstore(shard_dir / DOCSTORE_FILE),
+                LexicalIndex(lexical_path, generation, read_only=True) if lexical_path.exists() else None,
+            )
+            self._shard_cache.put(shard, opened, generation=generation)
+        return opened
+
+    def _session(self, session_id: str) -> Tuple[int, np.ndarray, FrozenSet[str]]:
+        shard, generation = self._scope(session_id)
+        cached = self._session_cache.get((shard, session_id), generation)
+        if cached is None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT c.chunk_id, p.position FROM session_chunks c "
+                    "JOIN chunk_positions p ON p.shard=? AND p.chunk_id=c.chunk_id "
+                    "WHERE c.session_id=?",
+                    (shard, session_id),
+                ).fetchall()
+            positions = np.sort(np.fromiter((p for _, p in rows), dtype=np.int64, count=len(rows)))
+            cached = (positions, frozenset(c for c, _ in rows))
+            self._session_cache.put((shard, session_id), cached, generation=generation)
+        return shard, cached[0], cached[1]  # type: ignore[return-value]
+
+    def similarity_search(self, session_id: str, embedding: Sequence[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """Nearest chunks of this session only, with their L2 distance (lower is closer)."""
+        shard, positions, _ = self._session(session_id)
+        if not len(positions):
+            return []
+        segments, ids, docstore, _ = self._open_shard(shard)
+        hits = search_positions(segments, np.asarray(embedding), positions, k, self.exact_max)
+        results = []
+        for dist, position in hits:
+            doc = docstore.search(ids[position])
+            if isinstance(doc, Document):
+                results.append((doc, dist))
+        return results
+
+    def lexical_search(self, session_id: str, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """BM25 hits of this session only; the shard-wide ranking is over-fetched and filtered."""
+        shard, _, members = self._session(session_id)
+        lexical = self._open_shard(shard)[3]
+        if lexical is None or not members:
+            return []
+        hits: List[Tuple[Document, float]] = []
+        for limit in (k * 4, k * 32, k * 256):
+            rows = lexical.search(query, limit)
+            hits = [(d, s) for d, s in rows if chunk_id(d.page_content) in members]
+            if len(hits) >= k or len(rows) < limit:
+                break
+        return hits[:k]
+
+
+_SHARED: Optional[SharedIndex] = None
+_SHARED_LOCK = threading.Lock()
+
+def get_shared_index() -> Optional[SharedIndex]:
+    """Process-wide shared index, or None when `shared_index.enabled` is false."""
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            cfg = load_config().get("shared_index", {})
+            if not cfg.get("enabled", False):
+                return None
+            _SHARED = SharedIndex(
+                os.getenv("SHARED_INDEX_PATH", cfg.get("path", "faiss_index/_shared")),
+                shards=cfg.get("shards", 4),
+                exact_max=cfg.get("exact_max", 20_000),
+            )
+        return _SHARED
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+class SqliteDocstore(Docstore, AddableMixin):
+    """
+    Chunk text + metadata by docstore id, for every segment of one index directory.
+
+    Replaces the pickled InMemoryDocstore: readers fetch only the ids a search returns,
+    and nothing is unpickled. Rows are written before their segment is published, so a
+    crash in between leaves unreferenced rows behind, never a segment without its text.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id TEXT PRIMARY KEY,"
+            " content TEXT NOT NULL,"
+            " metadata TEXT NOT NULL"
+            ")"
+        )
+        self._conn.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata FROM documents WHERE id=?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        rows = [
+            (_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+            for _id, doc in texts.items()
+        ]
+        with self._lock, self._conn:  # single transaction
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents(id, content, metadata) VALUES (?, ?, ?)", rows
+            )
+
+    def delete(self, ids: List) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM documents WHERE id=?", [(i,) for i in ids])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Document]:
+        """All stored chunks (used to backfill fingerprints / the lexical index)."""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, content, metadata FROM documents WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for _id, content, metadata in rows:
+                yield Document(id=_id, page_content=content, metadata=json.loads(metadata))
+            last = rows[-1][0]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,206 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from langchain.schema import Document
+from utils.concurrency import get_cpu_executor
+from utils.document_ops import estimate_tokens
+from logger import GLOBAL_LOGGER as log
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+# Part of the stored chunks' artifact name; bump when chunk boundaries or metadata change
+# (v2: FastTextSplitter, chunks carry start_index)
+SPLITTER_VERSION = 2
+Span = Tuple[int, int]
+
+
+class TiktokenCounter:
+    """Token count with a tiktoken encoding; picklable, so it can travel to split workers."""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self.encoding = encoding
+        self._enc = None
+
+    def __call__(self, text: str) -> int:
+        if self._enc is None:
+            import tiktoken
+            self._enc = tiktoken.get_encoding(self.encoding)
+        return len(self._enc.encode(text, disallowed_special=()))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"encoding": self.encoding, "_enc": None}
+
+
+def token_counter(encoding: str = "cl100k_base") -> Callable[[str], int]:
+    """tiktoken counter when the package is installed, else the ~4 chars/token estimate."""
+    try:
+        import tiktoken  # noqa: F401
+    except ImportError:
+        log.warning("tiktoken not installed; estimating tokens as chars/4")
+        return estimate_tokens
+    return TiktokenCounter(encoding)
+
+
+class FastTextSplitter:
+    """
+    Drop-in for RecursiveCharacterTextSplitter (default separators, keep_separator,
+    strip_whitespace) that produces the same chunks from character offsets.
+
+    Each level scans its span once with str.find and keeps (start, end) offsets
+    instead of substrings, so a chunk is sliced out of the source text exactly once
+    and its `start_index` is known without searching for it. Chunks can be sized in
+    tokens by passing `length_function` (see token_counter). Metadata is copied
+    shallowly per chunk (loader metadata is flat) and page numbers carry over.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        length_function: Optional[Callable[[str], int]] = None,
+        separators: Sequence[str] = DEFAULT_SEPARATORS,
+        add_start_index: bool = True,
+        workers: int = 1,
+        parallel_min_chars: int = 2_000_000,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function  # None = characters, measured from offsets
+        self.separators = list(separators)
+        self.add_start_index = add_start_index
+        self.workers = max(1, int(workers))
+        self.parallel_min_chars = parallel_min_chars
+
+    @property
+    def cache_id(self) -> str:
+        """Version + sizing unit (tiktoken encoding, or the estimate) of the chunks this splitter makes."""
+        fn = self.length_function
+        if fn is None:
+            unit = "chars"
+        elif isinstance(fn, TiktokenCounter):
+            unit = f"tokens_{fn.encoding}"
+        elif fn is estimate_tokens:
+            unit = "tokens_estimate"
+        else:
+            unit = getattr(fn, "__name__", type(fn).__name__)
+        return f"v{SPLITTER_VERSION}_{unit}"
+
+    # ---------- Spans ----------
+
+    def split_spans(self, text: str) -> List[Span]:
+        """(start, end) offsets of the chunks of `text`, in order."""
+        out: List[Span] = []
+        if text:
+            self._split(text, 0, len(text), self.separators, out)
+        return out
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[a:b] for a, b in self.split_spans(text)]
+
+    @staticmethod
+    def _pieces(text: str, start: int, end: int, separator: str) -> List[Span]:
+        # Separator kept at the start of the piece that follows it
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+        pieces: List[Span] = []
+        prev, step = start, len(separator)
+        pos = text.find(separator, start, end)
+        while pos != -1:
+            if pos > prev:
+                pieces.append((prev, pos))
+            prev = pos
+            pos = text.find(separator, pos + step, end)
+        if end > prev:
+            pieces.append((prev, end))
+        return pieces
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], out: List[Span]) -> None:
+        separator, rest = separators[-1], []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if text.find(sep, start, end) != -1:
+                separator, rest = sep, separators[i + 1:]
+                break
+
+        length, size = self.length_function, self.chunk_size
+        good: List[Tuple[int, int, int]] = []
+        for a, b in self._pieces(text, start, end, separator):
+            n = b - a if length is None else length(text[a:b])
+            if n < size:
+                good.append((a, b, n))
+                continue
+            if good:
+                self._merge(text, good, out)
+                good = []
+            if rest:
+                self._split(text, a, b, rest, out)
+            else:
+                out.append((a, b))  # unsplittable, kept as is
+        if good:
+            self._merge(text, good, out)
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int, int]], out: List[Span]) -> None:
+        # The window is pieces[lo:hi]; consecutive pieces are contiguous, so it is one
+        # slice of the text. The empty joiner still counts length_function("") per join,
+        # as LangChain does.
+        sep = 0 if self.length_function is None else self.length_function("")
+        size, overlap = self.chunk_size, self.chunk_overlap
+        lo = total = 0
+        for hi, (_, _, n) in enumerate(pieces):
+            if hi > lo and total + n + sep > size:
+                self._emit(text, pieces[lo][0], pieces[hi - 1][1], out)
+                while total > overlap or (total + n + (sep if hi > lo else 0) > size and total > 0):
+                    total -= pieces[lo][2] + (sep if hi - lo > 1 else 0)
+                    lo += 1
+            total += n + (sep if hi > lo else 0)
+        if lo < len(pieces):
+            self._emit(text, pieces[lo][0], pieces[-1][1], out)
+
+    @staticmethod
+    def _emit(text: str, a: int, b: int, out: List[Span]) -> None:
+        chunk = text[a:b]
+        stripped = chunk.strip()
+        if stripped:
+            a += len(chunk) - len(chunk.lstrip())
+            out.append((a, a + len(stripped)))
+
+    # ---------- Documents ----------
+
+    def _all_spans(self, texts: List[str]) -> List[List[Span]]:
+        # Runs on the shared spawn CPU pool (utils.concurrency); `workers` sets how many
+        # batches the pages are cut into, the pool's size caps how many run at once
+        workers = min(self.workers, len(texts))
+        if workers > 1 and sum(len(t) for t in texts) >= self.parallel_min_chars:
+            try:
+                ex = get_cpu_executor()
+                return list(ex.map(self.split_spans, texts, chunksize=max(1, len(texts) // (workers * 4))))
+            except Exception as e:  # e.g. an unpicklable length_function
+                log.warning("Parallel split failed, splitting serially", error=str(e))
+        return [self.split_spans(t) for t in texts]
+
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        """Chunk documents (in parallel when configured and the batch is large); order is kept."""
+        texts = [d.page_content for d in docs]
+        chunks: List[Document] = []
+        for doc, text, spans in zip(docs, texts, self._all_spans(texts)):
+            for a, b in spans:
+                metadata = dict(doc.metadata)
+                if self.add_start_index:
+                    metadata["start_index"] = a
+                chunks.append(Document(page_content=text[a:b], metadata=metadata))
+        return chunks
+
+
+def build_splitter(chunk_size: int, chunk_overlap: int, cfg: Optional[Dict[str, Any]] = None) -> FastTextSplitter:
+    """Splitter from the `ingestion.splitter` config (unit chars|tokens, encoding, workers)."""
+    cfg = cfg or {}
+    length_function = token_counter(cfg.get("encoding", "cl100k_base")) if cfg.get("unit") == "tokens" else None
+    return FastTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=length_function,
+        workers=cfg.get("workers", 1),
+        parallel_min_chars=cfg.get("parallel_min_chars", 2_000_000),
+    )
@@ -0,0 +1,100 @@
+# tests/test_answer_cache.py
+
+import os
+
+from langchain.schema import Document
+
+from src.document_chat.answer_cache import AnswerCache, normalize_question
+
+SCOPE = (os.path.abspath("faiss_index/s1"), "index", "similarity", "[('k', 5)]", 1)
+
+def test_normalize_question():
+    assert normalize_question("  What is the   Termination clause?? ") == "what is the termination clause"
+
+def test_exact_hit_and_generation_invalidation():
+    """Same normalized question hits; a new index generation makes it a miss"""
+    cache = AnswerCache(similarity_threshold=None)
+    cache.put(SCOPE, 1, "What is X?", "X is 42", sources=[{"source": "a.pdf"}])
+    hit, _ = cache.get(SCOPE, 1, "what is x")
+    assert hit == {"answer": "X is 42", "sources": [{"source": "a.pdf"}]}
+    assert cache.get(SCOPE, 2, "what is x")[0] is None
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 0
+
+def test_semantic_hit_above_threshold():
+    """An exact miss falls back to the nearest cached question embedding"""
+    vectors = {"what is x": [1.0, 0.0], "define x": [0.99, 0.05], "who is y": [0.0, 1.0]}
+    embed = lambda q: vectors[normalize_question(q)]
+    cache = AnswerCache(similarity_threshold=0.95)
+    _, vec = cache.get(SCOPE, 1, "What is X?", embed)
+    cache.put(SCOPE, 1, "What is X?", "X is 42", vector=vec)
+    assert cache.get(SCOPE, 1, "Define X", embed)[0]["answer"] == "X is 42"
+    assert cache.get(SCOPE, 1, "Who is Y?", embed)[0] is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_invalidate_index_drops_answers_and_vectors():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(SCOPE, 1, "q", "a", vector=[1.0, 0.0])
+    cache.invalidate_index("faiss_index/s1")
+    assert cache.stats()["entries"] == 0
+    assert cache.get(SCOPE, 1, "other", lambda q: [1.0, 0.0])[0] is None
+
+def test_follow_up_hits_cache_through_persisted_history(tmp_path, monkeypatch):
+    """With history loaded by the API, a follow-up is keyed by its rewritten question and can hit"""
+    import asyncio
+    import api.main as main
+    import src.document_chat.history_store as hs
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from utils.model_loader import MODEL_REGISTRY
+    from src.document_chat.answer_cache import ANSWER_CACHE
+    from src.document_chat.retrieval import ConversationalRAG
+
+    llm = FakeListChatModel(responses=[
+        "What is the notice period?", "30 days",  # first follow-up: rewrite + answer
+        "What is the notice period?",             # second phrasing: rewrite only, answer cached
+        "not reached",
+    ])
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", llm)
+    monkeypatch.setattr(MODEL_REGISTRY, "_embeddings", embeddings)
+    monkeypatch.setattr(hs, "_store", hs.ChatHistoryStore(tmp_path / "history.sqlite"))
+    hs.get_history_store().append("s1", "Summarize the contract", "It is a lease.")
+
+    history = asyncio.run(main._load_history("s1"))
+    assert len(history) == 2
+    vs = FAISS.from_texts(["Either party may terminate with 30 days notice."], embeddings)
+    rag = ConversationalRAG(session_id="s1", retriever=vs.as_retriever(search_kwargs={"k": 1}))
+    rag._answer_scope, rag._generation = (str(tmp_path), "s1", "history-test"), 1
+
+    before = ANSWER_CACHE.stats()["exact_hits"]
+    assert rag.invoke("and the notice period?", chat_history=history) == "30 days"
+    assert asyncio.run(rag.ainvoke("how much notice again?", chat_history=history)) == "30 days"
+    assert llm.i == 3 and ANSWER_CACHE.stats()["exact_hits"] == before + 1
+
+def test_evicted_vectorstore_takes_its_chains_along(tmp_path, monkeypatch):
+    """A cached chain must not keep a vectorstore alive after the vectorstore cache evicts it"""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from utils.model_loader import MODEL_REGISTRY
+    from src.document_ingestion.data_ingestion import FaissManager
+    from src.document_chat.retrieval import CHAIN_CACHE, VECTORSTORE_CACHE, ConversationalRAG
+
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(MODEL_REGISTRY, "_loader", type("FakeLoader", (), {"config": {}})())
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", FakeListChatModel(responses=["ok"]))
+    monkeypatch.setattr(MODEL_REGISTRY, "_embeddings", embeddings)
+    monkeypatch.setattr(VECTORSTORE_CACHE, "max_entries", 1)
+    loader = type("Loader", (), {"config": {}, "load_embeddings": lambda self: embeddings})()
+    dirs = []
+    for name in ("a", "b"):
+        FaissManager(tmp_path / name, loader).ingest([Document(page_content=f"doc {name}", metadata={})])
+        dirs.append(str(tmp_path / name))
+
+    rag = ConversationalRAG(session_id=None)
+    rag.load_retriever_from_faiss(dirs[0], search_type="similarity")
+    chain_of = lambda d: [k for k in CHAIN_CACHE._data if k[0] == os.path.abspath(d)]
+    assert chain_of(dirs[0])
+    rag.load_retriever_from_faiss(dirs[1], search_type="similarity")  # evicts a's vectorstore
+    assert chain_of(dirs[0]) == [] and chain_of(dirs[1])
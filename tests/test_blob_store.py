@@ -0,0 +1,44 @@
+# tests/test_blob_store.py
+
+import io
+from utils.blob_store import BlobStore
+from utils.file_io import save_uploaded_files
+
+class Upload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+def test_same_bytes_are_stored_once_and_linked_per_session(tmp_path):
+    """Two sessions uploading the same file share one blob; the blob goes once no session links it"""
+    blobs = BlobStore(tmp_path / "blobs")
+    a = save_uploaded_files([Upload("Report.txt", b"same bytes")], tmp_path / "s1", blobs=blobs)
+    b = save_uploaded_files([Upload("copy.txt", b"same bytes")], tmp_path / "s2", blobs=blobs)
+    assert a[0].name == b[0].name and a[0].stem == blobs.digest_of(a[0])
+    blob = blobs.blob_path(a[0].stem)
+    assert blob.stat().st_nlink == 3
+
+    assert blobs.collect_garbage(min_age_seconds=0) == {"unreferenced": 0, "bytes": 0}
+    a[0].unlink(); b[0].unlink()
+    assert blobs.collect_garbage(min_age_seconds=0)["unreferenced"] == 1
+    assert blobs.blob_path(a[0].stem) is None
+
+def test_reupload_reuses_parse_and_split(tmp_path, monkeypatch):
+    """A file seen before (in any session) is neither parsed nor split again"""
+    from utils.model_loader import MODEL_REGISTRY
+    import src.document_ingestion.data_ingestion as di
+    monkeypatch.setattr(MODEL_REGISTRY, "_loader", type("FakeLoader", (), {"config": {}})())
+    parsed = []
+    real_load = di.load_documents
+    monkeypatch.setattr(di, "load_documents", lambda paths: parsed.extend(paths) or real_load(paths, max_workers=1))
+
+    blobs = BlobStore(tmp_path / "blobs")
+    chunks = []
+    for session in ("s1", "s2"):
+        ci = di.ChatIngestor(temp_base=str(tmp_path / "data"), faiss_base=str(tmp_path / "faiss"),
+                             session_id=session)
+        ci.blobs = blobs
+        paths = ci.save_files([Upload("notes.txt", b"termination requires 30 days notice")])
+        chunks.append(ci._load_chunks(paths, 1000, 200, lambda *a, **k: None))
+    assert len(parsed) == 1
+    assert chunks[0] == chunks[1] and chunks[0][0].metadata["source"] == str(blobs.blob_path(paths[0].stem))
@@ -0,0 +1,18 @@
+# tests/test_document_ops.py
+
+from utils.document_ops import load_documents
+
+def test_parallel_load_keeps_order_and_isolates_errors(tmp_path):
+    """A corrupt file is skipped and the remaining docs come back in input order"""
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"doc{i}.txt"
+        p.write_text(f"document number {i}", encoding="utf-8")
+        paths.append(p)
+    bad = tmp_path / "broken.pdf"
+    bad.write_bytes(b"not a pdf")
+    paths.insert(1, bad)
+
+    docs = load_documents(paths, max_workers=2)
+    assert [d.page_content for d in docs] == [f"document number {i}" for i in range(3)]
+    assert docs == load_documents(paths, max_workers=1)
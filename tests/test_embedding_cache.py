@@ -0,0 +1,52 @@
+# tests/test_embedding_cache.py
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.embedding_cache import CachedEmbeddings, EmbeddingCacheStore
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: int = 0
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+def test_cached_embeddings_reuse_across_wrappers(tmp_path):
+    """Identical texts are embedded once, even through a new wrapper on the same store"""
+    store = EmbeddingCacheStore(tmp_path / "emb.sqlite")
+    base = CountingEmbedding(size=8)
+    first = CachedEmbeddings(base, store, "fake-model").embed_documents(["a", "b", "a"])
+    assert base.calls == 2
+    second = CachedEmbeddings(base, store, "fake-model").embed_documents(["b", "a"])
+    assert base.calls == 2
+    assert second == [first[1], first[0]]
+    assert store.stats()["hits"] == 2
+
+def test_embedding_cache_evicts_least_recent(tmp_path, monkeypatch):
+    """The store never grows beyond max_entries and drops the least recently used entry first"""
+    import itertools
+    import utils.embedding_cache as ec
+    clock = itertools.count(1000)
+    monkeypatch.setattr(ec.time, "time", lambda: float(next(clock)))  # distinct access times
+    store = EmbeddingCacheStore(tmp_path / "emb.sqlite", max_entries=2)
+    base = CountingEmbedding(size=4)
+    cached = CachedEmbeddings(base, store, "fake-model")
+    cached.embed_documents(["one"])
+    cached.embed_documents(["two"])
+    cached.embed_documents(["one"])    # refreshes "one": "two" is now least recent
+    cached.embed_documents(["three"])  # over max_entries: evicts "two"
+    assert store.stats()["entries"] == 2 and store.stats()["evictions"] == 1
+    keys = {name: store.text_key(name) for name in ("one", "two", "three")}
+    remaining = store.get_many("fake-model", "document", list(keys.values()))
+    assert set(remaining) == {keys["one"], keys["three"]}
+    assert base.calls == 3  # the refresh was a cache hit
+
+def test_embedding_cache_counts_rows_only_near_the_cap(tmp_path):
+    """Writes well under max_entries do not scan the table"""
+    store = EmbeddingCacheStore(tmp_path / "emb.sqlite", max_entries=5)
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    store.put_many("m", "document", {"k1": [0.1], "k2": [0.2]})
+    store.put_many("m", "document", {"k1": [0.1], "k3": [0.3]})  # k1 replaced: 3 rows, 4 counted
+    assert not any("COUNT(*)" in sql for sql in statements)
+    store.put_many("m", "document", {f"n{i}": [0.0] for i in range(3)})  # may be over: recount
+    assert sum("COUNT(*)" in sql for sql in statements) == 1
+    assert store.stats()["entries"] == 5 and store.evictions == 1
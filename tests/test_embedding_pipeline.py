@@ -0,0 +1,50 @@
+# tests/test_embedding_pipeline.py
+
+import asyncio
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_ingestion.embedding_pipeline import EmbeddingPipeline
+
+class FlakyEmbedding(DeterministicFakeEmbedding):
+    """Fails the first call with a provider-style 429"""
+    failures: int = 1
+    calls: int = 0
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded")
+        return super().embed_documents(texts)
+
+def test_pipeline_batches_and_retries_throttled_batch():
+    """Every text is delivered exactly once per batch, even after a 429"""
+    texts = [f"chunk {i}" for i in range(10)]
+    emb = FlakyEmbedding(size=4)
+    pipeline = EmbeddingPipeline(emb, batch_size=3, max_concurrency=2, backoff_base=0.01)
+    received = {}
+    count = pipeline.embed(texts, lambda start, vecs: received.update({start: vecs}))
+    assert count == 10
+    assert sorted(received) == [0, 3, 6, 9]
+    assert [len(received[s]) for s in sorted(received)] == [3, 3, 3, 1]
+    assert emb.calls == 5  # 4 batches + 1 retry
+    assert received[3][0] == DeterministicFakeEmbedding(size=4).embed_documents(["chunk 3"])[0]
+
+class LoopBoundEmbedding(DeterministicFakeEmbedding):
+    """Async path tied to the loop it was created on, like a grpc.aio channel"""
+    loop: object = None
+    async def aembed_documents(self, texts):
+        if asyncio.get_running_loop() is not self.loop:
+            raise RuntimeError("Task got Future attached to a different loop")
+        return self.embed_documents(texts)
+
+def test_pipeline_works_with_client_bound_to_another_loop():
+    """A client created on the server's loop still embeds from the pipeline's own loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        emb = LoopBoundEmbedding(size=4, loop=loop)
+        received = {}
+        pipeline = EmbeddingPipeline(emb, batch_size=2, max_concurrency=2)
+        assert pipeline.embed([f"t{i}" for i in range(5)], lambda start, vecs: received.update({start: vecs})) == 5
+        assert sorted(received) == [0, 2, 4]
+    finally:
+        loop.close()
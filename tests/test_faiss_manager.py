@@ -0,0 +1,221 @@
+# tests/test_faiss_manager.py
+
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_ingestion.data_ingestion import FaissManager, FingerprintStore
+
+class FakeLoader:
+    config = {}
+    def load_embeddings(self):
+        return DeterministicFakeEmbedding(size=16)
+
+def _docs(*texts):
+    return [Document(page_content=t, metadata={"source": "a.txt"}) for t in texts]
+
+def test_ingest_is_single_pass_and_idempotent(tmp_path):
+    """A fresh index embeds each chunk once; re-ingesting the same chunks writes nothing"""
+    fm = FaissManager(tmp_path, FakeLoader())
+    report = fm.ingest(_docs("alpha", "beta", "alpha"))
+    assert report.model_dump() == {"seen": 3, "skipped": 1, "embedded": 2, "written": 2}
+    assert fm.vs.index.ntotal == 2
+
+    again = FaissManager(tmp_path, FakeLoader()).ingest(_docs("alpha", "beta", "gamma"))
+    assert again.skipped == 2 and again.written == 1
+
+def test_ingest_report_counts_and_single_persist(tmp_path, monkeypatch):
+    """Fresh session and re-ingest: each new chunk embedded exactly once, known chunks skipped, one persist per call"""
+    import src.document_ingestion.faiss_segments as fs
+    class Counting(DeterministicFakeEmbedding):
+        texts: list = []
+        def embed_documents(self, texts):
+            self.texts.extend(texts)
+            return super().embed_documents(texts)
+    emb = Counting(size=16)
+    class Loader(FakeLoader):
+        config = {"faiss_db": {"compaction": {"enabled": False}}, "ingestion": {"embedding": {"batch_size": 2}}}
+        def load_embeddings(self):
+            return emb
+    appends = []
+    real_append = fs.SegmentedIndex.append
+    monkeypatch.setattr(fs.SegmentedIndex, "append",
+                        lambda self, delta, generation: appends.append(delta.index.ntotal) or real_append(self, delta, generation))
+
+    first = FaissManager(tmp_path, Loader()).ingest(_docs("a", "b", "c", "a", "d"))
+    assert first.model_dump() == {"seen": 5, "skipped": 1, "embedded": 4, "written": 4}
+    assert sorted(emb.texts) == ["a", "b", "c", "d"] and appends == [4]
+
+    second = FaissManager(tmp_path, Loader()).ingest(_docs("b", "e", "d", "f", "e"))
+    assert second.model_dump() == {"seen": 5, "skipped": 3, "embedded": 2, "written": 2}
+    assert sorted(emb.texts) == ["a", "b", "c", "d", "e", "f"] and appends == [4, 2]
+
+    third = FaissManager(tmp_path, Loader()).ingest(_docs("a", "f"))
+    assert third.model_dump() == {"seen": 2, "skipped": 2, "embedded": 0, "written": 0}
+    assert len(emb.texts) == 6 and appends == [4, 2]
+    assert FaissManager(tmp_path, Loader()).vectorstore().index.ntotal == 6
+
+def test_uncommitted_fingerprints_are_purged(tmp_path):
+    """Fingerprints written for a generation the index never reached are dropped on open"""
+    store = FingerprintStore(tmp_path / "fp.sqlite", committed_generation=0)
+    store.add_many([b"k1"], generation=1)
+    store.close()
+    assert FingerprintStore(tmp_path / "fp.sqlite", committed_generation=0).count() == 0
+
+def test_manager_closes_its_sqlite_connections(tmp_path):
+    """Used as a context manager, FaissManager closes the fingerprint and lexical stores"""
+    import sqlite3
+    import pytest
+    with FaissManager(tmp_path, FakeLoader()) as fm:
+        fm.ingest(_docs("alpha"))
+    with pytest.raises(sqlite3.ProgrammingError):
+        fm.fingerprints.count()
+    with pytest.raises(sqlite3.ProgrammingError):
+        fm.lexical.is_empty()
+    with FaissManager(tmp_path, FakeLoader()) as again:
+        assert again.ingest(_docs("alpha")).skipped == 1
+
+def test_concurrent_ingests_into_one_index_are_serialised(tmp_path):
+    """Overlapping uploads ingested at once: every chunk embedded once, one generation per write"""
+    import threading
+    import time
+    from utils.file_io import read_index_generation
+    class SlowCounting(DeterministicFakeEmbedding):
+        texts: list = []
+        def embed_documents(self, texts):
+            self.texts.extend(texts)
+            time.sleep(0.05)  # keep both ingests in flight together
+            return super().embed_documents(texts)
+    emb = SlowCounting(size=16)
+    class Loader(FakeLoader):
+        config = {"faiss_db": {"compaction": {"enabled": False}}}
+        def load_embeddings(self):
+            return emb
+    uploads = [_docs("shared one", "shared two", "only a"), _docs("shared one", "shared two", "only b")]
+    threads = [threading.Thread(target=lambda d=d: FaissManager(tmp_path, Loader()).ingest(d)) for d in uploads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(emb.texts) == ["only a", "only b", "shared one", "shared two"]
+    assert read_index_generation(tmp_path) == 2
+    assert FaissManager(tmp_path, Loader()).vectorstore().index.ntotal == 4
+
+def test_deltas_are_appended_and_compacted(tmp_path):
+    """Each ingest adds one delta segment; compaction folds them into one base with all vectors"""
+    class NoCompactLoader(FakeLoader):
+        config = {"faiss_db": {"compaction": {"enabled": False}}}
+    for i in range(3):
+        FaissManager(tmp_path, NoCompactLoader()).ingest(_docs(f"chunk {i}"))
+    fm = FaissManager(tmp_path, NoCompactLoader())
+    assert [s["kind"] for s in fm.segments.segments()] == ["base", "delta", "delta"]
+    assert fm.vectorstore().index.ntotal == 3
+
+    fm.segments.compact(fm.emb)
+    assert [s["kind"] for s in fm.segments.segments()] == ["base"]
+    assert FaissManager(tmp_path, NoCompactLoader()).vectorstore().index.ntotal == 3
+
+def test_legacy_single_file_index_is_readable(tmp_path):
+    """Indexes saved with save_local() before segmentation still load and accept deltas"""
+    from langchain_community.vectorstores import FAISS
+    FAISS.from_texts(["old chunk"], FakeLoader().load_embeddings()).save_local(str(tmp_path))
+    fm = FaissManager(tmp_path, FakeLoader())
+    report = fm.ingest(_docs("old chunk", "new chunk"))
+    assert report.skipped == 1 and report.written == 1
+    assert FaissManager(tmp_path, FakeLoader()).vectorstore().index.ntotal == 2
+
+def test_compaction_builds_configured_index_type(tmp_path):
+    """Past min_vectors the compacted base uses the factory; later flat deltas still merge on load"""
+    import faiss
+    class HnswLoader(FakeLoader):
+        config = {"faiss_db": {
+            "compaction": {"enabled": True, "max_deltas": 8, "background": False},
+            "index": {"factory": "HNSW16,Flat", "min_vectors": 40, "search": {"efSearch": 32, "nprobe": 4}},
+        }}
+    fm = FaissManager(tmp_path, HnswLoader())
+    fm.ingest(_docs(*[f"chunk {i}" for i in range(30)]))
+    assert fm.segments.segments()[0].get("factory", "Flat") == "Flat"  # below min_vectors
+
+    FaissManager(tmp_path, HnswLoader()).ingest(_docs(*[f"chunk {i}" for i in range(30, 50)]))
+    fm = FaissManager(tmp_path, HnswLoader())
+    assert [(s["kind"], s.get("factory")) for s in fm.segments.segments()] == [("base", "HNSW16,Flat")]
+
+    fm.ingest(_docs("late chunk"))
+    vs = FaissManager(tmp_path, HnswLoader()).vectorstore()
+    base = faiss.downcast_index(vs.index.at(0))  # base + delta are searched as shards
+    assert isinstance(base, faiss.IndexHNSW) and base.hnsw.efSearch == 32
+    assert vs.index.ntotal == 51
+    assert vs.similarity_search("late chunk", k=1)[0].page_content == "late chunk"
+
+def test_segments_are_memory_mapped_without_pickles(tmp_path):
+    """New segments carry no index.pkl; chunks come from the SQLite docstore on demand"""
+    from src.document_ingestion.faiss_segments import LazyIdMap
+    from src.document_ingestion.sqlite_docstore import SqliteDocstore
+    class NoCompactLoader(FakeLoader):
+        config = {"faiss_db": {"compaction": {"enabled": False}}}
+    FaissManager(tmp_path, NoCompactLoader()).ingest(_docs("alpha", "beta"))
+    FaissManager(tmp_path, NoCompactLoader()).ingest(_docs("gamma"))
+    assert not list(tmp_path.rglob("*.pkl"))
+
+    vs = FaissManager(tmp_path, NoCompactLoader()).vectorstore()
+    assert isinstance(vs.docstore, SqliteDocstore) and isinstance(vs.index_to_docstore_id, LazyIdMap)
+    assert vs.index.ntotal == 3 and len(vs.index_to_docstore_id) == 3
+    hit = vs.similarity_search("gamma", k=1)[0]
+    assert hit.page_content == "gamma" and hit.metadata == {"source": "a.txt"}
+
+def test_legacy_pickles_are_migrated_by_compaction(tmp_path):
+    """Compacting a pickled index moves its chunks into the docstore and drops index.pkl"""
+    from langchain_community.vectorstores import FAISS
+    FAISS.from_texts(["old chunk"], FakeLoader().load_embeddings()).save_local(str(tmp_path))
+    fm = FaissManager(tmp_path, FakeLoader())
+    assert fm.segments.compact(fm.emb)
+    assert not list(tmp_path.rglob("*.pkl"))
+    vs = FaissManager(tmp_path, FakeLoader()).vectorstore()
+    assert vs.similarity_search("old chunk", k=1)[0].page_content == "old chunk"
+
+def test_concurrent_compactions_never_duplicate_vectors(tmp_path, monkeypatch):
+    """A compaction whose snapshot was folded by another one is dropped; a held lock skips it"""
+    import src.document_ingestion.faiss_segments as fs
+    class NoCompactLoader(FakeLoader):
+        config = {"faiss_db": {"compaction": {"enabled": False}}}
+    for i in range(3):
+        FaissManager(tmp_path, NoCompactLoader()).ingest(_docs(f"chunk {i}"))
+    fm = FaissManager(tmp_path, NoCompactLoader())
+
+    real_build = fs.build_index
+    def racing_build(vectors, cfg):
+        # another process compacts the same snapshot while this one builds its base
+        monkeypatch.setattr(fs, "build_index", real_build)
+        fs.SegmentedIndex(tmp_path)._compact(fm.emb)
+        return real_build(vectors, cfg)
+    monkeypatch.setattr(fs, "build_index", racing_build)
+    assert fm.segments.compact(fm.emb) is None
+    assert [s["kind"] for s in fm.segments.segments()] == ["base"]
+    assert len(list((tmp_path / fs.SEGMENTS_DIR).iterdir())) == 1
+    assert FaissManager(tmp_path, NoCompactLoader()).vectorstore().index.ntotal == 3
+
+    FaissManager(tmp_path, NoCompactLoader()).ingest(_docs("chunk 3"))
+    with fm.segments._compaction_lock() as acquired:
+        assert acquired and fm.segments.compact(fm.emb) is None
+    assert len(fm.segments.segments()) == 2
+
+def test_failed_factory_build_is_not_retried_on_every_ingest(tmp_path, monkeypatch):
+    """A base that fell back to flat records the attempt; only a config change triggers a rebuild"""
+    import src.document_ingestion.faiss_segments as fs
+    class Pq7Loader(FakeLoader):  # PQ7 does not divide 16 dims: the build always fails
+        config = {"faiss_db": {
+            "compaction": {"enabled": True, "max_deltas": 100, "background": False},
+            "index": {"factory": "PQ7", "min_vectors": 10},
+        }}
+    FaissManager(tmp_path, Pq7Loader()).ingest(_docs(*[f"chunk {i}" for i in range(12)]))
+    base = FaissManager(tmp_path, Pq7Loader()).segments.segments()[0]
+    assert base["factory"] == "Flat" and base["attempted"] == "PQ7"
+
+    compactions = []
+    real_compact = fs.SegmentedIndex.compact
+    monkeypatch.setattr(fs.SegmentedIndex, "compact", lambda self, emb: compactions.append(1) or real_compact(self, emb))
+    for i in range(3):
+        FaissManager(tmp_path, Pq7Loader()).ingest(_docs(f"late {i}"))
+    assert compactions == []
+
+    class Hnsw(Pq7Loader):
+        config = {"faiss_db": {**Pq7Loader.config["faiss_db"], "index": {"factory": "HNSW16,Flat", "min_vectors": 10}}}
+    assert FaissManager(tmp_path, Hnsw()).segments.needs_rebuild()
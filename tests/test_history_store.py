@@ -0,0 +1,50 @@
+# tests/test_history_store.py
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_community.vectorstores import FAISS
+from src.document_chat.history_store import ChatHistoryStore
+from src.document_chat.retrieval import ConversationalRAG
+from utils.model_loader import MODEL_REGISTRY
+
+def test_history_keeps_recent_turns_and_summarizes_older(tmp_path):
+    """Turns beyond max_turns are folded into the summary"""
+    store = ChatHistoryStore(tmp_path / "h.sqlite", max_turns=2, token_budget=10_000)
+    folded = []
+    def summarizer(summary, messages):
+        folded.extend(m.content for m in messages)
+        return f"{summary}+{len(messages)}"
+    for i in range(3):
+        store.append("s1", f"q{i}", f"a{i}", summarizer=summarizer)
+    history = store.load("s1")
+    assert folded == ["q0", "a0"]
+    assert isinstance(history[0], SystemMessage) and history[0].content.endswith("+2")
+    assert [m.content for m in history[1:]] == ["q1", "a1", "q2", "a2"]
+    assert store.load("other") == []
+
+def test_concurrent_compaction_neither_loses_nor_refolds_turns(tmp_path):
+    """An append that compacts while another compaction summarizes: every turn is folded exactly once"""
+    store = ChatHistoryStore(tmp_path / "h.sqlite", max_turns=1, token_budget=10_000)
+    store.append("s1", "q1", "a1")
+    calls = []
+    def summarizer(summary, messages):
+        calls.append([m.content for m in messages])
+        if len(calls) == 1:  # a second request lands while the first one summarizes
+            store.append("s1", "q3", "a3", summarizer=summarizer)
+        return summary + "".join(m.content for m in messages)
+    store.append("s1", "q2", "a2", summarizer=summarizer)
+    history = store.load("s1")
+    assert history[0].content.endswith("q1a1q2a2")
+    assert [m.content for m in history[1:]] == ["q3", "a3"]
+
+def test_rewrite_is_skipped_without_history(monkeypatch):
+    """No chat history -> a single LLM call (answer only); with history the rewrite runs too"""
+    llm = FakeListChatModel(responses=["r1", "r2", "r3", "r4"])
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", llm)
+    vs = FAISS.from_texts(["some context"], DeterministicFakeEmbedding(size=8))
+    rag = ConversationalRAG(session_id="s", retriever=vs.as_retriever(search_kwargs={"k": 1}))
+    rag.invoke("question")
+    assert llm.i == 1
+    rag.invoke("follow up", chat_history=[HumanMessage(content="question")])
+    assert llm.i == 3  # rewrite + answer
@@ -0,0 +1,94 @@
+# tests/test_hybrid_retrieval.py
+
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.document_ingestion.data_ingestion import FaissManager
+from src.document_ingestion.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE, to_match_query
+from src.document_chat.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+
+class FakeLoader:
+    config = {}
+    def load_embeddings(self):
+        return DeterministicFakeEmbedding(size=16)
+
+def _doc(text, **meta):
+    return Document(page_content=text, metadata={"source": "a.txt", **meta})
+
+def test_match_query_keeps_identifiers_as_phrases():
+    assert to_match_query("What is clause 12.3 for SKU-4411?") == '"clause" OR "12 3" OR "sku 4411"'
+    assert to_match_query("what is the") == ""
+
+def test_lexical_search_finds_exact_identifier(tmp_path):
+    index = LexicalIndex(tmp_path / LEXICAL_INDEX_FILE, committed_generation=0)
+    index.add_many([_doc("Pricing for SKU-4411 widgets", page=2), _doc("SKU-9000 gadget"),
+                    _doc("General terms and conditions")], generation=1)
+    hits = index.search("price of sku-4411", k=5)
+    assert hits[0][0].page_content == "Pricing for SKU-4411 widgets"
+    assert hits[0][0].metadata == {"source": "a.txt", "page": 2}
+
+def test_uncommitted_rows_hidden_from_readers_and_purged_by_writers(tmp_path):
+    path = tmp_path / LEXICAL_INDEX_FILE
+    LexicalIndex(path, committed_generation=0).add_many([_doc("orphan clause 7")], generation=1)
+    assert LexicalIndex(path, committed_generation=0, purge=False).search("clause 7") == []
+    assert LexicalIndex(path, committed_generation=0, read_only=True).search("clause 7") == []
+    assert LexicalIndex(path, committed_generation=0).is_empty()
+
+def test_rrf_merges_duplicates_and_respects_weights():
+    a, b, c = _doc("a"), _doc("b"), _doc("c")
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], [1.0, 1.0])
+    assert [d.page_content for d in fused] == ["b", "a", "c"]
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], [0.01, 1.0])
+    assert fused[0].page_content == "c"
+
+def test_ingest_builds_lexical_index_for_hybrid_retrieval(tmp_path):
+    """FaissManager writes BM25 rows with the vectors; hybrid retrieval surfaces the exact identifier"""
+    fm = FaissManager(tmp_path, FakeLoader())
+    fm.ingest([_doc(f"filler paragraph number {i}") for i in range(30)] + [_doc("Clause 12.3: termination")])
+    lexical = LexicalIndex(tmp_path / LEXICAL_INDEX_FILE, committed_generation=1, purge=False)
+    retriever = HybridRetriever(
+        vector_retriever=fm.vectorstore().as_retriever(search_kwargs={"k": 10}),
+        lexical=lexical, k=3, fetch_k=10, lexical_weight=1.5,
+    )
+    docs = retriever.invoke("clause 12.3")
+    assert len(docs) == 3 and docs[0].page_content == "Clause 12.3: termination"
+
+def test_read_only_reader_writes_nothing_and_reopens_after_close(tmp_path):
+    """Readers run no DDL or state writes; close() is safe while cached, the next search reopens"""
+    import sqlite3
+    import pytest
+    path = tmp_path / LEXICAL_INDEX_FILE
+    LexicalIndex(path, committed_generation=0).add_many([_doc("clause 7 applies")], generation=1)
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE lexical_state")  # a reader must not recreate it
+    conn.commit()
+    conn.close()
+
+    reader = LexicalIndex(path, committed_generation=1, read_only=True)
+    assert reader.search("clause 7")[0][0].page_content == "clause 7 applies"
+    reader.close()
+    assert not reader.is_empty()
+    with pytest.raises(sqlite3.ProgrammingError):
+        reader.add_many([_doc("x")], generation=2)
+    tables = {r[0] for r in sqlite3.connect(path).execute("SELECT name FROM sqlite_master")}
+    assert "lexical_state" not in tables
+
+def test_hybrid_chain_eviction_closes_its_lexical_reader(tmp_path, monkeypatch):
+    """The chain cache closes a hybrid retriever's BM25 reader when the chain leaves the cache"""
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from utils.model_loader import MODEL_REGISTRY
+    from src.document_chat.retrieval import CHAIN_CACHE, ConversationalRAG
+
+    monkeypatch.setattr(MODEL_REGISTRY, "_loader", type("FakeLoader", (), {"config": {}})())
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", FakeListChatModel(responses=["ok"]))
+    monkeypatch.setattr(MODEL_REGISTRY, "_embeddings", FakeLoader().load_embeddings())
+    FaissManager(tmp_path, FakeLoader()).ingest([_doc("Clause 12.3: termination"), _doc("filler text")])
+
+    rag = ConversationalRAG(session_id=None)
+    retriever = rag.load_retriever_from_faiss(str(tmp_path), k=1, search_type="hybrid")
+    docs = asyncio.run(retriever.ainvoke("clause 12.3"))  # lexical query runs off the event loop
+    assert docs[0].page_content == "Clause 12.3: termination"
+    assert retriever.lexical.read_only and retriever.lexical._conn is not None
+    CHAIN_CACHE.invalidate_if(lambda key: key[0] == str(tmp_path.resolve()))
+    assert retriever.lexical._conn is None
@@ -0,0 +1,68 @@
+# tests/test_job_queue.py
+
+import threading
+import time
+from model.models import IngestReport
+from src.document_ingestion.job_queue import IngestionJobQueue, RUNNING, SUCCEEDED, FAILED
+
+def _payload():
+    return {"temp_base": "data", "faiss_base": "faiss_index", "use_session_dirs": True,
+            "paths": ["a.txt"], "chunk_size": 100, "chunk_overlap": 10}
+
+def _fake_ingestor(monkeypatch, ingest):
+    import src.document_ingestion.data_ingestion as di
+    class FakeIngestor:
+        def __init__(self, **kwargs):
+            pass
+        def ingest_paths(self, paths, chunk_size, chunk_overlap, progress):
+            return ingest(progress)
+    monkeypatch.setattr(di, "ChatIngestor", FakeIngestor)
+
+def test_job_runs_to_success_with_stages_and_report(tmp_path, monkeypatch):
+    """submit -> claim -> run: the job ends succeeded with per-stage timings and the ingest report"""
+    def ingest(progress):
+        progress("loading", files=1)
+        progress("embedding", chunks=3)
+        return IngestReport(seen=3, skipped=0, embedded=3, written=3)
+    _fake_ingestor(monkeypatch, ingest)
+    q = IngestionJobQueue(tmp_path / "jobs.sqlite", lease_seconds=5)
+    job_id = q.submit("s1", _payload())
+    row = q._claim()
+    assert row["id"] == job_id and q.get(job_id)["status"] == RUNNING
+    q._run(row)
+
+    job = q.get(job_id)
+    assert job["status"] == SUCCEEDED and job["stage"] == "done" and job["attempts"] == 1
+    assert set(job["timings"]) == {"loading", "embedding"}
+    assert job["report"] == {"seen": 3, "skipped": 0, "embedded": 3, "written": 3}
+
+def test_expired_lease_is_retried_and_stale_run_cannot_finish(tmp_path):
+    """A lost worker's job is re-claimed; its late result does not overwrite the new run"""
+    q = IngestionJobQueue(tmp_path / "jobs.sqlite", lease_seconds=0.1)
+    other = IngestionJobQueue(tmp_path / "jobs.sqlite", lease_seconds=5)
+    job_id = q.submit("s1", _payload())
+    stale = q._claim()
+    time.sleep(0.2)  # no heartbeat: the worker "died"
+    retry = other._claim()
+    assert retry["id"] == job_id and retry["attempts"] == 2 and retry["worker"] != stale["worker"]
+    assert not q._update(job_id, stale["worker"], status=FAILED, error="late")
+    assert q.get(job_id)["status"] == RUNNING and q.get(job_id)["error"] is None
+
+def test_heartbeat_keeps_a_silent_job_leased(tmp_path, monkeypatch):
+    """A long step without progress callbacks keeps its lease; nobody else claims the job"""
+    started = threading.Event()
+    def ingest(progress):
+        started.set()
+        time.sleep(0.6)  # several leases long, no progress()
+        return IngestReport(seen=1, skipped=0, embedded=1, written=1)
+    _fake_ingestor(monkeypatch, ingest)
+    q = IngestionJobQueue(tmp_path / "jobs.sqlite", lease_seconds=0.15)
+    other = IngestionJobQueue(tmp_path / "jobs.sqlite", lease_seconds=0.15)
+    job_id = q.submit("s1", _payload())
+    runner = threading.Thread(target=q._run, args=(q._claim(),))
+    runner.start()
+    started.wait(5)
+    time.sleep(0.4)
+    assert other._claim() is None
+    runner.join()
+    assert q.get(job_id)["status"] == SUCCEEDED and q.get(job_id)["attempts"] == 1
@@ -0,0 +1,36 @@
+# tests/test_lru_cache.py
+
+import time
+
+from utils.lru_cache import LRUCache
+
+def test_lru_evicts_by_entries_and_bytes():
+    """Least recently used entries go first when count or byte limits are exceeded"""
+    cache = LRUCache("test", max_entries=2, max_bytes=100)
+    cache.put("a", 1, nbytes=40)
+    cache.put("b", 2, nbytes=40)
+    assert cache.get("a") == 1  # "b" is now least recent
+    cache.put("c", 3, nbytes=40)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    cache.put("d", 4, nbytes=90)
+    assert cache.stats()["entries"] == 1
+    assert cache.get("d") == 4
+
+def test_lru_generation_mismatch_is_miss():
+    """An entry written for an older index generation is dropped on lookup"""
+    cache = LRUCache("test")
+    cache.put("idx", "vs", generation=1)
+    assert cache.get("idx", generation=1) == "vs"
+    assert cache.get("idx", generation=2) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 0
+
+def test_lru_ttl_expires_and_notifies():
+    """Entries past their TTL are misses and reported through on_evict"""
+    dropped = []
+    cache = LRUCache("test", ttl_seconds=0.01, on_evict=dropped.append)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert dropped == ["a"]
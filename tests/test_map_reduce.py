@@ -0,0 +1,49 @@
+# tests/test_map_reduce.py
+
+import json
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.document_analyzer.map_reduce import split_pages, group_pages, batch_partials
+
+def _pdf_text(pages):
+    # same layout DocHandler.read_pdf produces
+    return "\n".join(f"\n--- Page {i + 1} ---\n{body}" for i, body in enumerate(pages))
+
+def test_split_and_group_pages_respects_budget():
+    """Pages are packed in order into groups under the token budget; big pages are cut"""
+    pages = split_pages(_pdf_text(["a" * 400, "b" * 400, "c" * 400, "d" * 2000]))
+    assert [n for n, _ in pages] == [1, 2, 3, 4]
+    groups = group_pages(pages, max_tokens=250)
+    assert [(first, last) for first, last, _ in groups] == [(1, 2), (3, 3), (4, 4), (4, 4)]
+    assert all(len(text) <= 250 * 4 + 50 for _, _, text in groups)
+    assert "--- Page 3 ---" in groups[1][2]
+
+def test_unmarked_text_is_one_page():
+    assert split_pages("plain text") == [(1, "plain text")]
+
+def test_batch_partials_always_pairs_up():
+    """Even partials larger than the budget are reduced at least two at a time"""
+    partials = [{"Summary": ["x" * 100]}] * 5
+    batches = batch_partials(partials, max_tokens=10)
+    assert [len(b) for b in batches] == [2, 2, 1]
+
+def test_analyzer_map_reduce_over_threshold(monkeypatch):
+    """Large documents take the map-reduce path and end with one merged Metadata dict"""
+    from utils.model_loader import MODEL_REGISTRY
+    from src.document_analyzer.data_analysis import DocumentAnalyzer
+
+    part = {"Summary": ["part"], "Title": "T", "Author": ["A"], "DateCreated": "Not Available",
+            "LastModifiedDate": "Not Available", "Publisher": "P", "Language": "en",
+            "PageCount": "Not Available", "SentimentTone": "neutral"}
+    merged = dict(part, Summary=["whole"])
+    llm = FakeListChatModel(responses=[json.dumps(part)] * 2 + [json.dumps(merged)])
+    monkeypatch.setattr(MODEL_REGISTRY, "_loader", type("FakeLoader", (), {"config": {}})())
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", llm)
+    analyzer = DocumentAnalyzer()
+    analyzer.single_shot_max_tokens, analyzer.group_max_tokens, analyzer.max_concurrency = 200, 150, 1
+
+    text = _pdf_text(["x" * 500, "y" * 500])
+    assert analyzer.use_map_reduce(text)
+    result = analyzer.analyze_document(text)
+    assert result["Summary"] == ["whole"] and result["PageCount"] == 2
@@ -0,0 +1,47 @@
+# tests/test_page_diff.py
+
+import json
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.document_compare.page_diff import diff_pages, format_changes, merge_rows, NO_CHANGE
+
+REF = ["Intro\nParties: A and B", "Payment within 30 days\nLate fee 2%\nGoverning law", "Signatures"]
+ACT = ["Intro\nParties:   A and B", "Appendix X\nnew schedule", "Payment within 45 days\nLate fee 2%\nGoverning law", "Signatures"]
+
+def test_inserted_page_does_not_shift_unchanged_pages():
+    """Whitespace-only edits are equal; an inserted page leaves later pages aligned"""
+    rows = diff_pages(REF, ACT)
+    assert [(r.Page, r.changed) for r in rows] == [
+        ("1", False), ("2 (added)", True), ("2->3", True), ("3->4", False)
+    ]
+    assert "-Payment within 30 days" in rows[2].hunks and "+Payment within 45 days" in rows[2].hunks
+    prompt = format_changes(rows)
+    assert "Signatures" not in prompt and "Parties" not in prompt
+
+def test_merge_rows_keeps_document_order():
+    rows = diff_pages(REF, ACT)
+    merged = merge_rows(rows, [{"Page": "2->3", "Changes": "Payment term 30 -> 45 days"},
+                               {"Page": "2 (added)", "Changes": "New appendix"}])
+    assert merged == [
+        {"Page": "1", "Changes": NO_CHANGE},
+        {"Page": "2 (added)", "Changes": "New appendix"},
+        {"Page": "2->3", "Changes": "Payment term 30 -> 45 days"},
+        {"Page": "3->4", "Changes": NO_CHANGE},
+    ]
+
+def test_identical_documents_need_no_llm_call(monkeypatch):
+    """compare_changes only calls the LLM when some page changed"""
+    from utils.model_loader import MODEL_REGISTRY
+    from src.document_compare.document_comparator import DocumentComparatorLLM
+
+    llm = FakeListChatModel(responses=[json.dumps([{"Page": "2", "Changes": "edited"}])] * 2)
+    monkeypatch.setattr(MODEL_REGISTRY, "_loader", type("FakeLoader", (), {"config": {}})())
+    monkeypatch.setattr(MODEL_REGISTRY, "_llm", llm)
+    comp = DocumentComparatorLLM()
+
+    df = comp.compare_changes(diff_pages(REF, REF))
+    assert set(df["Changes"]) == {NO_CHANGE} and llm.i == 0
+
+    df = comp.compare_changes(diff_pages(REF, [REF[0], "edited", REF[2]]))
+    assert df.to_dict(orient="records")[1] == {"Page": "2", "Changes": "edited"} and llm.i == 1
@@ -0,0 +1,77 @@
+# tests/test_pdf_extract.py
+
+import fitz
+from utils.pdf_extract import PdfExtractor, pages_to_text
+from utils.result_cache import ResultCacheStore
+from src.document_analyzer.map_reduce import split_pages
+
+def _pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+def test_pages_are_cached_by_content(tmp_path, monkeypatch):
+    """Per-page Documents; the same bytes under another name are not extracted again"""
+    pdf = _pdf(tmp_path / "a.pdf", ["first page", "", "third page"])
+    extractor = PdfExtractor(ResultCacheStore(tmp_path / "pdf_text.sqlite"))
+    docs = extractor.documents(pdf)
+    assert [d.page_content.strip() for d in docs] == ["first page", "", "third page"]
+    assert [d.metadata["page"] for d in docs] == [0, 1, 2] and docs[0].metadata["total_pages"] == 3
+
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    monkeypatch.setattr(extractor, "_extract", lambda path: (_ for _ in ()).throw(AssertionError("re-extracted")))
+    assert extractor.page_texts(copy) == [d.page_content for d in docs]
+    assert extractor.cache.stats()["hits"] == 1
+
+def test_parallel_extraction_and_page_markers(tmp_path):
+    """Page ranges across processes give the serial result; blank pages drop out of the text"""
+    pages = [f"page {i} body" if i % 5 else "" for i in range(12)]
+    pdf = _pdf(tmp_path / "long.pdf", pages)
+    serial = PdfExtractor().page_texts(pdf)
+    assert PdfExtractor(workers=3, parallel_min_pages=4).page_texts(pdf) == serial
+
+    marked = split_pages(pages_to_text(serial))
+    assert [num for num, _ in marked] == [i + 1 for i in range(12) if i % 5]
+    assert marked[0] == (2, "page 1 body")
+
+def test_saved_uploads_reuse_their_upload_hash(tmp_path, monkeypatch):
+    """DocHandler and DocumentComparator key the text cache by the hash taken while saving"""
+    import io
+    import utils.pdf_extract as pe
+    from src.document_ingestion.data_ingestion import DocHandler, DocumentComparator
+
+    pdf = _pdf(tmp_path / "src.pdf", ["reference text"]).read_bytes()
+    other = _pdf(tmp_path / "other.pdf", ["actual text"]).read_bytes()
+    def upload(name, data):
+        f = io.BytesIO(data)
+        f.name = name
+        return f
+    monkeypatch.setattr(pe, "_EXTRACTOR", PdfExtractor(ResultCacheStore(tmp_path / "pdf_text.sqlite")))
+    monkeypatch.setattr(pe, "file_sha256", lambda path: (_ for _ in ()).throw(AssertionError("re-hashed")))
+
+    dh = DocHandler(data_dir=str(tmp_path / "analysis"))
+    assert "reference text" in dh.read_pdf(dh.save_pdf(upload("a.pdf", pdf)))
+    dc = DocumentComparator(base_dir=str(tmp_path / "compare"))
+    ref, act = dc.save_uploaded_files(upload("ref.pdf", pdf), upload("act.pdf", other))
+    assert dc.read_pages(ref)[0].strip() == "reference text"  # same bytes: served from cache
+    assert dc.read_pages(act)[0].strip() == "actual text"
+    assert pe._EXTRACTOR.cache.stats()["hits"] == 1
+
+def _extract_in_pool_worker(path):
+    from utils import concurrency
+    pages = PdfExtractor(workers=3, parallel_min_pages=2).page_texts(path)
+    return concurrency.in_cpu_worker(), concurrency._cpu_executor is None, pages
+
+def test_pool_workers_extract_serially(tmp_path):
+    """Inside a CPU pool worker the page ranges are not fanned out to a nested pool"""
+    from utils.concurrency import get_cpu_executor
+    pdf = _pdf(tmp_path / "nested.pdf", [f"page {i}" for i in range(6)])
+    in_worker, no_nested_pool, pages = get_cpu_executor().submit(_extract_in_pool_worker, str(pdf)).result()
+    assert in_worker and no_nested_pool
+    assert pages == PdfExtractor().page_texts(pdf)
@@ -0,0 +1,56 @@
+# tests/test_result_cache.py
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from utils.result_cache import ResultCacheStore, result_key
+
+class _LLM:
+    def __init__(self, model_name): self.model_name = model_name
+
+def test_result_cache_roundtrip_and_lru_eviction(tmp_path):
+    """Stored results come back as-is; least recently used rows go past max_entries"""
+    store = ResultCacheStore(tmp_path / "results.sqlite", max_entries=2)
+    store.put("analyze", "a", {"Title": "A", "Summary": ["x"]})
+    store.put("analyze", "b", {"Title": "B"})
+    assert store.get("analyze", "a") == {"Title": "A", "Summary": ["x"]}  # "b" is now least recent
+    store.put("compare", "c", [{"Page": "1", "Changes": "NO CHANGE"}])
+    assert store.get("analyze", "b") is None
+    assert store.get("compare", "c") == [{"Page": "1", "Changes": "NO CHANGE"}]
+    stats = store.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["hits"] == 2
+
+def test_result_key_tracks_prompt_and_model():
+    """Changing the prompt text or the model invalidates the key; file order matters"""
+    p1 = ChatPromptTemplate.from_template("Summarize {document_text}")
+    p2 = ChatPromptTemplate.from_template("Summarize briefly {document_text}")
+    base = result_key(["h1"], p1, _LLM("m1"))
+    assert base == result_key(["h1"], p1, _LLM("m1"))
+    assert base != result_key(["h1"], p2, _LLM("m1"))
+    assert base != result_key(["h1"], p1, _LLM("m2"))
+    assert result_key(["h1", "h2"], p1, _LLM("m1")) != result_key(["h2", "h1"], p1, _LLM("m1"))
+
+def test_result_key_tracks_every_prompt_and_setting():
+    """Map/reduce prompts and the config values that shape the result are part of the key"""
+    single = ChatPromptTemplate.from_template("Summarize {document_text}")
+    reduce_a = ChatPromptTemplate.from_template("Merge {partials}")
+    reduce_b = ChatPromptTemplate.from_template("Merge all {partials}")
+    llm = _LLM("m1")
+    base = result_key(["h1"], [single, reduce_a], llm, {"group_max_tokens": 8000})
+    assert base == result_key(["h1"], [single, reduce_a], llm, {"group_max_tokens": 8000})
+    assert base != result_key(["h1"], [single, reduce_b], llm, {"group_max_tokens": 8000})
+    assert base != result_key(["h1"], [single, reduce_a], llm, {"group_max_tokens": 4000})
+
+def test_byte_cap_evicts_oldest_rows_in_one_pass(tmp_path, monkeypatch):
+    """Over max_bytes only: the least recently used rows go until the payload fits"""
+    import itertools
+    import utils.result_cache as rc
+    clock = itertools.count(1000)
+    monkeypatch.setattr(rc.time, "time", lambda: float(next(clock)))  # distinct access times
+    store = ResultCacheStore(tmp_path / "results.sqlite", max_entries=100, max_bytes=250)
+    for name in "abcde":
+        store.put("analyze", name, "x" * 98)  # 100 bytes of JSON each
+    assert store.get("analyze", "a") is None and store.get("analyze", "c") is None
+    assert store.get("analyze", "d") and store.get("analyze", "e")
+    assert store.stats()["evictions"] == 3
+    store.put("analyze", "big", "y" * 1000)  # alone over the cap: kept
+    assert store.get("analyze", "big") and store.stats()["entries"] == 1
@@ -0,0 +1,73 @@
+# tests/test_shared_index.py
+
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_ingestion.shared_index import SharedIndex
+from src.document_chat.session_retriever import SessionLexical, SessionRetriever
+
+class FakeLoader:
+    config = {"faiss_db": {"compaction": {"enabled": False}}}
+    def load_embeddings(self):
+        return DeterministicFakeEmbedding(size=16)
+
+def _docs(*texts):
+    return [Document(page_content=t, metadata={"source": "a.txt"}) for t in texts]
+
+def _search(shared, session_id, text, k=10):
+    vector = FakeLoader().load_embeddings().embed_query(text)
+    return [d.page_content for d, _ in shared.similarity_search(session_id, vector, k)]
+
+def test_sessions_share_shards_but_only_see_their_chunks(tmp_path):
+    """Chunks of every session live in one shard; common chunks are stored once; search is per session"""
+    shared = SharedIndex(tmp_path, shards=1, model_loader=FakeLoader())
+    shared.ingest("s1", _docs("alpha clause", "common boilerplate"))
+    report = shared.ingest("s2", _docs("beta clause", "common boilerplate"))
+    assert report.skipped == 1 and report.written == 1
+
+    assert set(_search(shared, "s1", "beta clause")) == {"alpha clause", "common boilerplate"}
+    assert set(_search(shared, "s2", "alpha clause")) == {"beta clause", "common boilerplate"}
+    assert _search(shared, "s2", "beta clause", k=1) == ["beta clause"]
+    assert [d.page_content for d, _ in shared.lexical_search("s1", "clause")] == ["alpha clause"]
+    assert not shared.has_session("s3")
+
+def test_filtered_search_spans_trained_base_and_deltas(tmp_path):
+    """After compaction into HNSW, session filtering still covers the base and later flat deltas"""
+    class HnswLoader(FakeLoader):
+        config = {"faiss_db": {
+            "compaction": {"enabled": True, "max_deltas": 2, "background": False},
+            "index": {"factory": "HNSW16,Flat", "min_vectors": 40},
+        }}
+    shared = SharedIndex(tmp_path, shards=1, model_loader=HnswLoader(), exact_max=5)
+    shared.ingest("big", _docs(*[f"big chunk {i}" for i in range(40)]))
+    shared.ingest("small", _docs("small one", "small two"))
+    shared.ingest("small", _docs("small three"))
+    segments = shared._open_shard(0)[0]
+    assert segments[0].vectors is not None  # HNSW base keeps raw vectors for exact scoring
+
+    assert set(_search(shared, "small", "big chunk 3")) == {"small one", "small two", "small three"}
+    hits = _search(shared, "big", "big chunk 7", k=3)  # 40 positions > exact_max -> ID-filtered HNSW search
+    assert hits[0] == "big chunk 7" and all(h.startswith("big chunk") for h in hits)
+
+def test_session_retrievers(tmp_path):
+    shared = SharedIndex(tmp_path, shards=2, model_loader=FakeLoader())
+    shared.ingest("s1", _docs("termination notice period", "payment terms"))
+    retriever = SessionRetriever(shared=shared, session_id="s1", embeddings=FakeLoader().load_embeddings(), k=1)
+    assert [d.page_content for d in retriever.invoke("payment terms")] == ["payment terms"]
+    assert SessionLexical(shared, "s1").search("termination")[0][0].page_content == "termination notice period"
+
+def test_async_session_search_runs_off_the_event_loop(tmp_path, monkeypatch):
+    """The async path hands the blocking shard search to a worker thread"""
+    import asyncio
+    import threading
+    shared = SharedIndex(tmp_path, shards=1, model_loader=FakeLoader())
+    shared.ingest("s1", _docs("payment terms", "notice period"))
+    threads = []
+    search = shared.similarity_search
+    def recording(*args):
+        threads.append(threading.current_thread())
+        return search(*args)
+    monkeypatch.setattr(shared, "similarity_search", recording)
+    retriever = SessionRetriever(shared=shared, session_id="s1", embeddings=FakeLoader().load_embeddings(), k=1)
+    docs = asyncio.run(retriever.ainvoke("payment terms"))
+    assert [d.page_content for d in docs] == ["payment terms"]
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,51 @@
+# tests/test_storage_lifecycle.py
+
+import os
+import time
+from utils.storage_lifecycle import StorageLifecycle
+
+def _session(root, name, nbytes, age_days=0.0):
+    d = root / name
+    d.mkdir(parents=True)
+    (d / "file.bin").write_bytes(b"x" * nbytes)
+    t = time.time() - age_days * 86400
+    os.utime(d, (t, t))
+    return d
+
+def _lifecycle(tmp_path, **store):
+    root = tmp_path / "store"
+    root.mkdir()
+    return root, StorageLifecycle(tmp_path / "ledger.sqlite", {"s": {"path": str(root), **store}}, grace_seconds=60)
+
+def test_ttl_then_lru_until_quota(tmp_path):
+    """Expired sessions go first, then least recently used ones until the byte quota holds"""
+    root, lc = _lifecycle(tmp_path, ttl_days=10, max_bytes=250, exclude=["keep"])
+    _session(root, "expired", 100, age_days=20)
+    _session(root, "old", 100, age_days=5)
+    _session(root, "mid", 100, age_days=3)
+    _session(root, "new", 100, age_days=1)
+    _session(root, "keep", 1000, age_days=99)
+    lc.touch("s", "old")  # a recent use moves "old" to the back of the LRU order
+
+    report = lc.sweep(dry_run=True)["stores"]["s"]
+    assert [(e["session_id"], e["reason"]) for e in report["evict"]] == [("expired", "ttl"), ("mid", "max_bytes")]
+    assert report["bytes"] == 400 and report["bytes_after"] == 200
+    assert (root / "expired").exists()  # dry run deletes nothing
+
+    lc.sweep()
+    assert sorted(p.name for p in root.iterdir()) == ["keep", "new", "old"]
+
+def test_grace_period_and_incremental_measurement(tmp_path):
+    """Recently used sessions survive any quota; folders are re-measured only when their mtime moves"""
+    root, lc = _lifecycle(tmp_path, max_sessions=1)
+    _session(root, "a", 10, age_days=1)
+    _session(root, "b", 10)
+    report = lc.sweep(dry_run=True)["stores"]["s"]
+    assert [e["session_id"] for e in report["evict"]] == ["a"]
+
+    (root / "a" / "file.bin").write_bytes(b"x" * 50)  # file rewritten in place: folder mtime unchanged
+    t = time.time() - 86400
+    os.utime(root / "a", (t, t))
+    assert lc.sweep(dry_run=True)["stores"]["s"]["bytes"] == 20
+    (root / "a" / "more.bin").write_bytes(b"x" * 5)  # new entry bumps the folder mtime
+    assert lc.sweep(dry_run=True)["stores"]["s"]["bytes"] == 65
@@ -0,0 +1,60 @@
+# tests/test_text_splitter.py
+
+import random
+import pytest
+from langchain.schema import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.document_ingestion.text_splitter import FastTextSplitter
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "x" * 120, "clause", "12.5%"]
+
+def _page(rng, n_parts=300):
+    return "".join(rng.choice(WORDS) + rng.choice([" ", " ", "  ", "\n", "\n\n", "\n\n\n", "\t "])
+                   for _ in range(n_parts))
+
+@pytest.mark.parametrize("chunk_size,overlap", [(1000, 200), (300, 0), (120, 119), (40, 10), (7, 3)])
+def test_chunk_boundaries_match_langchain(chunk_size, overlap):
+    """Same chunks as RecursiveCharacterTextSplitter, edge cases included"""
+    rng = random.Random(chunk_size)
+    texts = [_page(rng) for _ in range(20)] + ["", "   ", "\n\nlead", "trail\n\n", "y" * 2500]
+    reference = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
+    fast = FastTextSplitter(chunk_size, overlap)
+    for text in texts:
+        assert fast.split_text(text) == reference.split_text(text)
+
+def test_token_sizing_matches_langchain_with_same_length_function():
+    """chunk_size counted by a length function (tokens) gives LangChain's chunks too"""
+    words = lambda s: max(1, len(s.split()))
+    rng = random.Random(7)
+    reference = RecursiveCharacterTextSplitter(chunk_size=50, chunk_overlap=10, length_function=words)
+    fast = FastTextSplitter(50, 10, length_function=words)
+    for _ in range(20):
+        text = _page(rng)
+        assert fast.split_text(text) == reference.split_text(text)
+
+def test_documents_keep_page_metadata_and_offsets():
+    """Chunks carry the page's metadata and their exact start offset in it; serial == parallel"""
+    rng = random.Random(3)
+    docs = [Document(page_content=_page(rng), metadata={"source": "r.pdf", "page": i}) for i in range(6)]
+    reference = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50, add_start_index=True)
+    expected = reference.split_documents(docs)
+
+    chunks = FastTextSplitter(400, 50).split_documents(docs)
+    assert [(c.page_content, c.metadata) for c in chunks] == [(c.page_content, c.metadata) for c in expected]
+    for c in chunks:
+        page = docs[c.metadata["page"]].page_content
+        assert page[c.metadata["start_index"]:].startswith(c.page_content)
+
+    parallel = FastTextSplitter(400, 50, workers=2, parallel_min_chars=0).split_documents(docs)
+    assert [(c.page_content, c.metadata) for c in parallel] == [(c.page_content, c.metadata) for c in chunks]
+
+def test_chunk_artifact_names_version_and_sizing():
+    """Stored chunks are keyed by splitter version and sizing unit, so old or differently sized chunks miss"""
+    from src.document_ingestion.text_splitter import SPLITTER_VERSION, TiktokenCounter, build_splitter
+    from utils.blob_store import chunks_artifact
+    from utils.document_ops import estimate_tokens
+    chars = build_splitter(1000, 200).cache_id
+    assert chars == f"v{SPLITTER_VERSION}_chars"
+    assert chunks_artifact(1000, 200, chars) == f"chunks_v{SPLITTER_VERSION}_chars_1000_200"
+    assert FastTextSplitter(50, 10, length_function=TiktokenCounter("o200k_base")).cache_id.endswith("tokens_o200k_base")
+    assert FastTextSplitter(50, 10, length_function=estimate_tokens).cache_id.endswith("tokens_estimate")
@@ -96,3 +96,147 @@ def test_chat_query_invalid_session():
     }
     response = client.post("/chat/query", data=data)
     assert response.status_code == 404  # Not found due to invalid session_id
+
+def test_models_refresh():
+    """Test the model registry refresh endpoint"""
+    response = client.post("/models/refresh")
+    assert response.status_code == 200
+    assert response.json() == {"status": "refreshed"}
+
+def test_cache_stats():
+    """Test the cache statistics endpoint"""
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    body = response.json()
+    assert {"vectorstore", "chain"} <= set(body)
+    assert {"hits", "misses", "entries", "bytes"} <= set(body["vectorstore"])
+
+def test_analyze_upload_too_large(sample_pdf, monkeypatch):
+    """Uploads over MAX_UPLOAD_BYTES are rejected mid-stream with 413"""
+    monkeypatch.setenv("MAX_UPLOAD_BYTES", "10")
+    with open(sample_pdf, "rb") as f:
+        response = client.post("/analyze", files={"file": ("big.pdf", f, "application/pdf")})
+    assert response.status_code == 413
+
+def test_analyze_backpressure(sample_pdf, monkeypatch):
+    """A full endpoint queue is rejected with 503 instead of piling up work"""
+    from utils.concurrency import ENDPOINT_LIMITS
+    limiter = ENDPOINT_LIMITS["analyze"]
+    monkeypatch.setattr(limiter, "_pending", limiter.max_concurrent + limiter.max_queue)
+    with open(sample_pdf, "rb") as f:
+        response = client.post("/analyze", files={"file": ("test.pdf", f, "application/pdf")})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+def test_chat_index_job_not_found():
+    """Unknown ingestion job ids return 404"""
+    response = client.get("/chat/index/jobs/does-not-exist")
+    assert response.status_code == 404
+
+def test_chat_query_stream_invalid_session():
+    """Streaming chat query with invalid session ID"""
+    data = {"question": "test question", "session_id": "invalid_session", "use_session_dirs": "true", "k": "5"}
+    response = client.post("/chat/query/stream", data=data)
+    assert response.status_code == 404
+
+def test_chat_query_stream_holds_slot_until_stream_ends(monkeypatch):
+    """The chat_query slot stays taken while tokens stream and is released when the stream ends"""
+    import asyncio
+    import api.main as main
+    from utils.concurrency import ENDPOINT_LIMITS
+    limiter = ENDPOINT_LIMITS["chat_query"]
+
+    async def run():
+        gate = asyncio.Event()
+        class FakeRAG:
+            def __init__(self, session_id=None):
+                pass
+            async def astream(self, question, chat_history=None):
+                yield {"event": "token", "data": "partial"}
+                await gate.wait()
+                yield {"event": "done", "data": {}}
+        async def resolve(session_id, use_session_dirs):
+            return "faiss_index/s"
+        async def noop(*args, **kwargs):
+            return []
+        monkeypatch.setattr(main, "ConversationalRAG", FakeRAG)
+        monkeypatch.setattr(main, "_resolve_chat_index", resolve)
+        monkeypatch.setattr(main, "_load_retriever", noop)
+        monkeypatch.setattr(main, "_load_history", noop)
+        monkeypatch.setattr(main, "_save_turn", lambda *args: None)
+
+        before = limiter._pending
+        response = await main.chat_query_stream(question="q", session_id="s", use_session_dirs=False, k=5)
+        body = response.body_iterator
+        assert "partial" in await body.__anext__()
+        assert limiter._pending == before + 1  # still generating: slot held
+        gate.set()
+        rest = [chunk async for chunk in body]
+        assert "event: done" in rest[-1]
+        assert limiter._pending == before
+        await response.background()  # idempotent
+        assert limiter._pending == before
+
+    asyncio.run(run())
+
+def test_chat_query_touches_uploads_and_index(monkeypatch):
+    """A session used only for queries stays fresh in both chat stores"""
+    import asyncio
+    import api.main as main
+    touched = []
+    class FakeRAG:
+        def __init__(self, session_id=None):
+            pass
+        async def ainvoke(self, question, chat_history=None):
+            return "answer"
+    async def resolve(session_id, use_session_dirs):
+        return "faiss_index/s"
+    async def noop(*args, **kwargs):
+        return []
+    async def touch(store, session_id):
+        touched.append((store, session_id))
+    monkeypatch.setattr(main, "ConversationalRAG", FakeRAG)
+    monkeypatch.setattr(main, "_resolve_chat_index", resolve)
+    monkeypatch.setattr(main, "_load_retriever", noop)
+    monkeypatch.setattr(main, "_load_history", noop)
+    monkeypatch.setattr(main, "_touch", touch)
+
+    from fastapi import BackgroundTasks
+    result = asyncio.run(main.chat_query(BackgroundTasks(), question="q", session_id="s", use_session_dirs=True, k=5))
+    assert result["answer"] == "answer"
+    assert sorted(touched) == [("chat_index", "s"), ("chat_uploads", "s")]
+
+def test_lifespan_builds_model_clients_on_the_event_loop(monkeypatch):
+    """Clients that need a running loop at construction are built before any offloading"""
+    import asyncio
+    import threading
+    import api.main as main
+    from utils.model_loader import ModelRegistry
+    built = []
+    class LoopLoader:
+        config = {}
+        def _check(self, what):
+            asyncio.get_running_loop()  # raises on an io_* thread, like grpc.aio
+            built.append((what, threading.current_thread() is threading.main_thread()))
+            return what
+        def load_llm(self):
+            return self._check("llm")
+        def load_embeddings(self):
+            return self._check("embeddings")
+    class Idle:
+        def start(self):
+            pass
+        def stop(self):
+            pass
+    registry = ModelRegistry()
+    registry._loader = LoopLoader()
+    monkeypatch.setattr(main, "MODEL_REGISTRY", registry)
+    monkeypatch.setattr(main, "get_job_queue", Idle)
+    monkeypatch.setattr(main, "get_storage_lifecycle", Idle)
+    monkeypatch.setattr(main, "shutdown_executors", lambda: None)
+
+    async def run():
+        async with main.lifespan(main.app):
+            assert await main.run_blocking(registry.get_embeddings) == "embeddings"
+    asyncio.run(run())
+    assert built == [("llm", True), ("embeddings", True)]
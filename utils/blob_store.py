@@ -0,0 +1,143 @@
+from __future__ import annotations
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain.schema import Document
+from utils.config_loader import load_config
+from utils.file_io import file_sha256, stream_upload_to_path
+from logger import GLOBAL_LOGGER as log
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+# Parsed pages depend on the loaders: v2 is PyMuPDF page text (utils.pdf_extract),
+# "parsed" was PyPDFLoader's. Bump together with pdf_extract.PDF_PAGES_KIND.
+PARSED_ARTIFACT = "parsed_v2"
+
+
+def chunks_artifact(chunk_size: int, chunk_overlap: int, splitter_id: str) -> str:
+    """Artifact name of split chunks; splitter_id (FastTextSplitter.cache_id) names version and sizing."""
+    return f"chunks_{splitter_id}_{chunk_size}_{chunk_overlap}"
+
+
+class BlobStore:
+    """
+    Content-addressed store for uploaded files, keyed by sha256 of the bytes.
+
+        <root>/<sha[:2]>/<sha>/blob<ext>          the bytes, stored once
+        <root>/<sha[:2]>/<sha>/<artifact>.json    parsed pages / split chunks derived from them
+
+    Sessions reference a blob through a hard link named <sha><ext> in their own folder,
+    so the blob's link count is its reference count: a blob with no links left is
+    garbage. Where hard links are not possible (another filesystem) the file is copied.
+    """
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def blob_dir(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def blob_path(self, sha256: str) -> Optional[Path]:
+        found = list(self.blob_dir(sha256).glob("blob*"))
+        return found[0] if found else None
+
+    # ---------- Blobs ----------
+
+    def put(self, uf, ext: str) -> Tuple[str, int, Path, bool]:
+        """
+        Stream an upload into the store. Returns (sha256, bytes, blob path, reused);
+        when the content is already stored the new copy is dropped.
+        """
+        tmp = self.root / f".incoming-{uuid.uuid4().hex}{ext}"
+        sha256, size = stream_upload_to_path(uf, tmp)
+        blob_dir = self.blob_dir(sha256)
+        blob_dir.mkdir(parents=True, exist_ok=True)
+        final = blob_dir / f"blob{ext}"
+        try:
+            os.link(tmp, final)  # no-clobber publish; a concurrent identical upload may win
+            reused = False
+        except FileExistsError:
+            reused = True
+            os.utime(final)  # fresh mtime keeps the garbage collector off a blob being re-referenced
+        finally:
+            tmp.unlink(missing_ok=True)
+        return sha256, size, final, reused
+
+    def link(self, sha256: str, out: Path) -> Path:
+        """Reference blob `sha256` from `out` (a session file)."""
+        blob = self.blob_path(sha256)
+        if blob is None:
+            raise FileNotFoundError(f"Blob not found: {sha256}")
+        if out.exists():
+            return out
+        try:
+            os.link(blob, out)
+        except OSError:
+            shutil.copyfile(blob, out)
+        return out
+
+    def digest_of(self, path: Path) -> str:
+        """sha256 of a file: read from the name of session links, hashed otherwise."""
+        if _SHA256.match(path.stem) and self.blob_dir(path.stem).is_dir():
+            return path.stem
+        return file_sha256(path)
+
+    # ---------- Artifacts ----------
+
+    def load_docs(self, sha256: str, artifact: str) -> Optional[List[Document]]:
+        try:
+            raw = (self.blob_dir(sha256) / f"{artifact}.json").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.loads(raw)]
+
+    def save_docs(self, sha256: str, artifact: str, docs: List[Document]) -> None:
+        blob_dir = self.blob_dir(sha256)
+        blob_dir.mkdir(parents=True, exist_ok=True)
+        payload = [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+        tmp = blob_dir / f".{artifact}.{uuid.uuid4().hex[:6]}"
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp, blob_dir / f"{artifact}.json")
+
+    # ---------- Garbage ----------
+
+    def collect_garbage(self, min_age_seconds: float = 900, dry_run: bool = False) -> Dict[str, Any]:
+        """Delete blobs (with their artifacts) no session links to any more."""
+        now = time.time()
+        removed, freed = 0, 0
+        for prefix in self.root.iterdir():
+            if not prefix.is_dir() or prefix.name.startswith("."):
+                continue
+            for blob_dir in prefix.iterdir():
+                blobs = list(blob_dir.glob("blob*"))
+                st = blobs[0].stat() if blobs else blob_dir.stat()
+                if (blobs and st.st_nlink > 1) or now - st.st_mtime < min_age_seconds:
+                    continue
+                removed += 1
+                freed += sum(p.stat().st_size for p in blob_dir.iterdir() if p.is_file())
+                if not dry_run:
+                    shutil.rmtree(blob_dir, ignore_errors=True)
+        if removed and not dry_run:
+            log.info("Unreferenced blobs removed", root=str(self.root), blobs=removed, freed=freed)
+        return {"unreferenced": removed, "bytes": freed}
+
+
+_STORE: Optional[BlobStore] = None
+_STORE_LOCK = threading.Lock()
+
+def get_blob_store() -> Optional[BlobStore]:
+    """Process-wide upload blob store, or None when `uploads.blob_store.enabled` is false."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            cfg = load_config().get("uploads", {}).get("blob_store", {})
+            if not cfg.get("enabled", True):
+                return None
+            _STORE = BlobStore(os.getenv("BLOB_STORE_PATH", cfg.get("path", "data/_blobs")))
+        return _STORE
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config
+
+T = TypeVar("T")
+
+_CFG = load_config().get("concurrency", {})
+
+
+class ServiceOverloadedError(RuntimeError):
+    """Raised when an endpoint's concurrency slots and wait queue are both full."""
+
+    def __init__(self, endpoint: str, retry_after: int = 1):
+        super().__init__(f"Endpoint '{endpoint}' is at capacity, retry later")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class EndpointLimiter:
+    """
+    Async admission control for one endpoint: at most `max_concurrent` requests
+    run, up to `max_queue` more wait, anything beyond is rejected immediately.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self._sem = asyncio.Semaphore(self.max_concurrent)
+        self._pending = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self._pending >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            log.warning("Endpoint overloaded, rejecting request", endpoint=self.name, pending=self._pending)
+            raise ServiceOverloadedError(self.name)
+        self._pending += 1
+        try:
+            await self._sem.acquire()
+        except BaseException:
+            self._pending -= 1
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+        self._pending -= 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+def _limiter(name: str, default_concurrent: int, default_queue: int) -> EndpointLimiter:
+    cfg = _CFG.get("endpoints", {}).get(name, {})
+    return EndpointLimiter(
+        name,
+        cfg.get("max_concurrent", default_concurrent),
+        cfg.get("max_queue", default_queue),
+    )
+
+
+ENDPOINT_LIMITS: Dict[str, EndpointLimiter] = {
+    "analyze": _limiter("analyze", 4, 16),
+    "compare": _limiter("compare", 4, 16),
+    "chat_index": _limiter("chat_index", 2, 8),
+    "chat_query": _limiter("chat_query", 16, 64),
+}
+
+# Blocking I/O (file writes, index loads, sync SDK calls)
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=int(_CFG.get("io_workers", 16)), thread_name_prefix="io")
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_cpu_lock = threading.Lock()
+_in_cpu_worker = False
+
+
+def _mark_cpu_worker() -> None:
+    global _in_cpu_worker
+    _in_cpu_worker = True
+
+
+def in_cpu_worker() -> bool:
+    """True inside a CPU pool process: work there runs serially instead of nesting another pool."""
+    return _in_cpu_worker
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """
+    The process pool shared by CPU-bound work (parsing, splitting), also for sync callers
+    such as ingestion jobs. Created lazily; "spawn" avoids forking a process that already
+    runs threads.
+    """
+    global _cpu_executor
+    with _cpu_lock:
+        if _cpu_executor is None:
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=int(_CFG.get("cpu_workers", 2)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_mark_cpu_worker,
+            )
+        return _cpu_executor
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking I/O on the bounded I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run CPU-bound work (e.g. PDF parsing) on the process pool; fn and args must be picklable."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    global _cpu_executor
+    IO_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    with _cpu_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False, cancel_futures=True)
+            _cpu_executor = None
@@ -1,31 +1,71 @@
 from __future__ import annotations
+import time
 from pathlib import Path
-from typing import Iterable, List
+from typing import BinaryIO, Iterable, List, Optional, Tuple
 from fastapi import UploadFile
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
+from utils.config_loader import load_config
+from utils.concurrency import get_cpu_executor
+from utils.pdf_extract import get_pdf_extractor
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 
-def load_documents(paths: Iterable[Path]) -> List[Document]:
-    """Load docs using appropriate loader based on extension."""
+def _load_one(path: str) -> Tuple[List[Document], float, Optional[str]]:
+    """
+    Parse a single file. Runs in worker processes, so it never raises:
+    returns (docs, seconds, error message or None).
+    """
+    t0 = time.perf_counter()
+    try:
+        ext = Path(path).suffix.lower()
+        if ext == ".pdf":
+            return get_pdf_extractor().documents(path), time.perf_counter() - t0, None
+        if ext == ".docx":
+            loader = Docx2txtLoader(path)
+        elif ext == ".txt":
+            loader = TextLoader(path, encoding="utf-8")
+        else:
+            return [], time.perf_counter() - t0, "unsupported extension"
+        return loader.load(), time.perf_counter() - t0, None
+    except Exception as e:
+        return [], time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+def _default_load_workers() -> int:
+    return int(load_config().get("ingestion", {}).get("load_workers", 1))
+
+def load_documents(paths: Iterable[Path], max_workers: Optional[int] = None) -> List[Document]:
+    """
+    Load docs using appropriate loader based on extension.
+    With max_workers > 1 files are parsed on the shared CPU process pool (whose size,
+    concurrency.cpu_workers, caps the parallelism); output keeps input order and a file
+    that fails to parse is logged and skipped instead of aborting the batch.
+    """
     docs: List[Document] = []
     try:
-        for p in paths:
-            ext = p.suffix.lower()
-            if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
-            elif ext == ".docx":
-                loader = Docx2txtLoader(str(p))
-            elif ext == ".txt":
-                loader = TextLoader(str(p), encoding="utf-8")
-            else:
+        paths = [Path(p) for p in paths]
+        workers = _default_load_workers() if max_workers is None else max_workers
+        workers = max(1, min(workers, len(paths)))
+        if workers > 1:
+            results = list(get_cpu_executor().map(_load_one, [str(p) for p in paths]))
+        else:
+            results = [_load_one(str(p)) for p in paths]
+
+        failed = 0
+        for p, (file_docs, seconds, error) in zip(paths, results):
+            if error == "unsupported extension":
                 log.warning("Unsupported extension skipped", path=str(p))
-                continue
-            docs.extend(loader.load())
-        log.info("Documents loaded", count=len(docs))
+            elif error:
+                failed += 1
+                log.error("Failed loading document, skipped", path=str(p), error=error, seconds=round(seconds, 3))
+            else:
+                log.info("Document parsed", path=str(p), pages=len(file_docs), seconds=round(seconds, 3))
+            docs.extend(file_docs)
+        if failed and failed == len(paths):
+            raise RuntimeError(f"All {failed} documents failed to load")
+        log.info("Documents loaded", count=len(docs), files=len(paths), failed=failed, workers=workers)
         return docs
     except Exception as e:
         log.error("Failed loading documents", error=str(e))
@@ -43,12 +83,20 @@ def concat_for_comparison(ref_docs: List[Document], act_docs: List[Document]) ->
     right = concat_for_analysis(act_docs)
     return f"<<REFERENCE_DOCUMENTS>>\n{left}\n\n<<ACTUAL_DOCUMENTS>>\n{right}"
 
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return max(1, len(text) // 4)
+
 # ---------- Helpers ----------
 class FastAPIFileAdapter:
-    """Adapt FastAPI UploadFile -> .name + .getbuffer() API"""
+    """Adapt FastAPI UploadFile -> .name + .open_stream() / .getbuffer() API"""
     def __init__(self, uf: UploadFile):
         self._uf = uf
         self.name = uf.filename
+    def open_stream(self) -> BinaryIO:
+        """Rewound underlying file for chunked reads (preferred over getbuffer)."""
+        self._uf.file.seek(0)
+        return self._uf.file  # type: ignore
     def getbuffer(self) -> bytes:
         self._uf.file.seek(0)
         return self._uf.file.read()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+from logger import GLOBAL_LOGGER as log
+
+
+class EmbeddingCacheStore:
+    """
+    Content-addressed on-disk embedding store (SQLite, WAL mode).
+    Rows are keyed by (model, kind, sha256(text)); vectors are float32 blobs.
+    """
+
+    def __init__(self, path: Path | str, max_entries: int = 500_000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vec BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                UNIQUE (model, kind, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_access ON embeddings(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Upper bound on the row count (every put counted as new), so the table is only
+        # counted when it may be over max_entries; recounting also picks up other workers' rows
+        self._approx_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, kind: str, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model=? AND kind=? AND key IN ({marks})",
+                    (model, kind, *part),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access=? WHERE model=? AND kind=? AND key=?",
+                    [(now, model, kind, k) for k in found],
+                )
+                self._conn.commit()
+            hit = sum(1 for k in keys if k in found)
+            self.hits += hit
+            self.misses += len(keys) - hit
+        return found
+
+    def put_many(self, model: str, kind: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(model, kind, key, vec, last_access) VALUES (?,?,?,?,?)",
+                [(model, kind, k, array("f", v).tobytes(), now) for k, v in items.items()],
+            )
+            self._conn.commit()
+            self._approx_entries += len(items)
+            if self._approx_entries > self.max_entries:
+                self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        self._approx_entries = count - max(excess, 0)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self.evictions += excess
+        log.info("Embedding cache evicted", evicted=excess, max_entries=self.max_entries)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingCacheStore and
+    only sends cache misses to the underlying provider.
+    """
+
+    def __init__(self, underlying: Embeddings, store: EmbeddingCacheStore, model_name: str):
+        self.underlying = underlying
+        self.store = store
+        self.model_name = model_name
+
+    def _lookup(self, texts: List[str], kind: str):
+        keys = [self.store.text_key(t) for t in texts]
+        found = self.store.get_many(self.model_name, kind, keys)
+        missing: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found:
+                missing.setdefault(k, t)
+        return keys, found, missing
+
+    def _finish(self, keys, found, missing, vectors, kind: str) -> List[List[float]]:
+        # Round-trip through float32 so fresh and cached results are identical (FAISS stores float32 anyway)
+        fresh = {k: array("f", v).tolist() for k, v in zip(missing.keys(), vectors)}
+        self.store.put_many(self.model_name, kind, fresh)
+        found.update(fresh)
+        if missing:
+            log.info("Embedding cache lookup", total=len(keys), embedded=len(missing), model=self.model_name)
+        return [found[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts, "document")
+        vectors = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._finish(keys, found, missing, vectors, "document")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts, "document")
+        vectors = await self.underlying.aembed_documents(list(missing.values())) if missing else []
+        return self._finish(keys, found, missing, vectors, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text], "query")
+        vectors = [self.underlying.embed_query(text)] if missing else []
+        return self._finish(keys, found, missing, vectors, "query")[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text], "query")
+        vectors = [await self.underlying.aembed_query(text)] if missing else []
+        return self._finish(keys, found, missing, vectors, "query")[0]
+
+
+_STORES: Dict[str, EmbeddingCacheStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_embedding_cache_store(path: Path | str, max_entries: int = 500_000) -> EmbeddingCacheStore:
+    """One store (and SQLite connection) per cache file per process."""
+    key = str(Path(path).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = EmbeddingCacheStore(path, max_entries=max_entries)
+        return store
+
+def embedding_cache_stats() -> Dict[str, Any]:
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    return {s.path.name: s.stats() for s in stores}
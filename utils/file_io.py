@@ -1,15 +1,31 @@
 from __future__ import annotations
+import os
+import io
 import re
 import uuid
+import fcntl
+import hashlib
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import uuid
-from typing import Iterable, List
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
+from utils.config_loader import load_config
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+INDEX_GENERATION_FILE = "generation"
+# flock held by the ingest that is writing an index directory
+INDEX_WRITE_LOCK_FILE = ".write.lock"
+
+_UPLOAD_CFG = load_config().get("uploads", {})
+UPLOAD_CHUNK_SIZE = int(_UPLOAD_CFG.get("chunk_size", 1024 * 1024))
+
+
+class UploadTooLargeError(ValueError):
+    """Raised mid-stream when an upload exceeds the configured maximum size."""
 
 # ----------------------------- #
 # Helpers (file I/O + loading)  #
@@ -18,8 +34,101 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
-    """Save uploaded files (Streamlit-like) and return local paths."""
+def read_index_generation(index_dir: Path | str) -> int:
+    """Return the write generation of a FAISS index directory (0 if never written)."""
+    try:
+        return int((Path(index_dir) / INDEX_GENERATION_FILE).read_text(encoding="utf-8").strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+@contextmanager
+def index_write_lock(index_dir: Path | str) -> Iterator[None]:
+    """One writer per index directory at a time, across threads and worker processes."""
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_dir / INDEX_WRITE_LOCK_FILE, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def bump_index_generation(index_dir: Path | str) -> int:
+    """
+    Increment the index generation; readers use it to drop stale caches. The new value
+    is published with an atomic rename, but read-add-write is not atomic across writers:
+    callers hold index_write_lock.
+    """
+    index_dir = Path(index_dir)
+    gen = read_index_generation(index_dir) + 1
+    tmp = index_dir / f".{INDEX_GENERATION_FILE}.{uuid.uuid4().hex[:6]}"
+    tmp.write_text(str(gen), encoding="utf-8")
+    os.replace(tmp, index_dir / INDEX_GENERATION_FILE)
+    return gen
+
+def file_sha256(path: Path | str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """sha256 hex digest of a file on disk, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def max_upload_bytes() -> Optional[int]:
+    raw = os.getenv("MAX_UPLOAD_BYTES") or _UPLOAD_CFG.get("max_bytes")
+    return int(raw) if raw else None
+
+def _open_upload_stream(uf) -> BinaryIO:
+    # FastAPIFileAdapter exposes the spooled file; Streamlit/file objects expose read();
+    # anything else only offers getbuffer() and is wrapped without copying.
+    if hasattr(uf, "open_stream"):
+        return uf.open_stream()
+    if hasattr(uf, "read"):
+        return uf
+    return io.BytesIO(uf.getbuffer())
+
+def stream_upload_to_path(
+    uf,
+    out: Path,
+    *,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_bytes: Optional[int] = None,
+) -> Tuple[str, int]:
+    """
+    Copy an upload to `out` in fixed-size chunks, hashing as it goes.
+    Returns (sha256 hex digest, byte count). Memory use is bounded by chunk_size.
+    """
+    out = Path(out)
+    max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+    tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:6]}.part")
+    digest = hashlib.sha256()
+    size = 0
+    src = _open_upload_stream(uf)
+    try:
+        with open(tmp, "wb") as f:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Upload {getattr(uf, 'name', out.name)} exceeds the {max_bytes}-byte limit"
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return digest.hexdigest(), size
+
+def save_uploaded_files(uploaded_files: Iterable, target_dir: Path, blobs=None) -> List[Path]:
+    """
+    Save uploaded files (Streamlit-like) and return local paths.
+    With a BlobStore the bytes are stored once by sha256 and `target_dir` gets a
+    <sha256><ext> link to them, so a re-upload costs one hash.
+    """
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
         saved: List[Path] = []
@@ -29,19 +138,24 @@ def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path
             if ext not in SUPPORTED_EXTENSIONS:
                 log.warning("Unsupported file skipped", filename=name)
                 continue
+            if blobs is not None:
+                sha256, size, _, reused = blobs.put(uf, ext)
+                out = blobs.link(sha256, target_dir / f"{sha256}{ext}")
+                saved.append(out)
+                log.info("File saved for ingestion", uploaded=name, saved_as=str(out), bytes=size,
+                         sha256=sha256, reused=reused)
+                continue
             # Clean file name (only alphanum, dash, underscore)
             safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', Path(name).stem).lower()
             fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
             fname = f"{uuid.uuid4().hex[:8]}{ext}"
             out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
+            sha256, size = stream_upload_to_path(uf, out)
             saved.append(out)
-            log.info("File saved for ingestion", uploaded=name, saved_as=str(out))
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), bytes=size, sha256=sha256)
         return saved
+    except UploadTooLargeError:
+        raise
     except Exception as e:
         log.error("Failed to save uploaded files", error=str(e), dir=str(target_dir))
-        raise DocumentPortalException("Failed to save uploaded files", e) from e
\ No newline at end of file
+        raise DocumentPortalException("Failed to save uploaded files", e) from e
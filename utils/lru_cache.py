@@ -0,0 +1,114 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from logger import GLOBAL_LOGGER as log
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache bounded by entry count and (estimated) bytes.
+
+    Each entry can carry a ``generation``; a lookup with a different generation
+    is treated as a miss and drops the stale entry. With ``ttl_seconds`` entries
+    also expire. ``on_evict(key)`` is called whenever an entry leaves the cache, and
+    ``dispose(value)`` with its value (e.g. to close a connection the value owns).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 32,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable], None]] = None,
+        dispose: Optional[Callable[[Any], None]] = None,
+    ):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.ttl_seconds = float(ttl_seconds) if ttl_seconds else None
+        self.on_evict = on_evict
+        self.dispose = dispose
+        # key -> (value, generation, nbytes, expires_at)
+        self._data: "OrderedDict[Hashable, Tuple[Any, Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, generation: Any = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, entry_gen, _, expires_at = entry
+            if entry_gen != generation or (expires_at is not None and expires_at < time.monotonic()):
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, *, generation: Any = None, nbytes: int = 0) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, generation, int(nbytes), expires_at)
+            self._bytes += int(nbytes)
+            self._evict()
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                for k in list(self._data):
+                    self._drop(k)
+            elif key in self._data:
+                self._drop(key)
+
+    def invalidate_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every key matching `predicate`; returns how many were dropped."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    # ---------- Internals ----------
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._data.pop(key)
+        self._bytes -= entry[2]
+        if self.on_evict is not None:
+            self.on_evict(key)
+        if self.dispose is not None:
+            self.dispose(entry[0])
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds max_bytes
+        while len(self._data) > 1 and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._drop(key)
+            self.evictions += 1
+            log.info("Cache entry evicted", cache=self.name, key=str(key))
@@ -1,8 +1,11 @@
 import os
 import sys
 import json
+import threading
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 from utils.config_loader import load_config
+from utils.embedding_cache import CachedEmbeddings, get_embedding_cache_store
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from logger import GLOBAL_LOGGER as log
@@ -68,13 +71,23 @@ class ModelLoader:
 
     def load_embeddings(self):
         """
-        Load and return embedding model from Google Generative AI.
+        Load and return embedding model from Google Generative AI,
+        wrapped in the on-disk embedding cache when enabled in config.
         """
         try:
             model_name = self.config["embedding_model"]["model_name"]
             log.info("Loading embedding model", model=model_name)
-            return GoogleGenerativeAIEmbeddings(model=model_name,
-                                                google_api_key=self.api_key_mgr.get("GOOGLE_API_KEY")) #type: ignore
+            embeddings = GoogleGenerativeAIEmbeddings(model=model_name,
+                                                      google_api_key=self.api_key_mgr.get("GOOGLE_API_KEY")) #type: ignore
+            cache_cfg = self.config.get("embedding_cache", {})
+            if cache_cfg.get("enabled", False):
+                store = get_embedding_cache_store(
+                    os.getenv("EMBEDDING_CACHE_PATH", cache_cfg.get("path", "cache/embeddings.sqlite")),
+                    max_entries=cache_cfg.get("max_entries", 500_000),
+                )
+                log.info("Embedding cache enabled", path=str(store.path))
+                return CachedEmbeddings(embeddings, store, model_name)
+            return embeddings
         except Exception as e:
             log.error("Error loading embedding model", error=str(e))
             raise DocumentPortalException("Failed to load embedding model", sys)
@@ -126,6 +139,69 @@ class ModelLoader:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
 
+class ModelRegistry:
+    """
+    Process-wide registry of the ModelLoader, config, LLM and embedding clients.
+    Everything is built lazily on first use and shared by all components of the
+    worker; call refresh() to rebuild after a config/secret change.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loader: Optional[ModelLoader] = None
+        self._llm: Any = None
+        self._embeddings: Any = None
+
+    @property
+    def loader(self) -> ModelLoader:
+        if self._loader is None:
+            with self._lock:
+                if self._loader is None:
+                    self._loader = ModelLoader()
+                    log.info("ModelRegistry: ModelLoader built")
+        return self._loader
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return self.loader.config
+
+    def get_llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self.loader.load_llm()
+        return self._llm
+
+    def get_embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self.loader.load_embeddings()
+        return self._embeddings
+
+    def warm(self) -> None:
+        """
+        Build loader, LLM and embeddings now. Call it on the event-loop thread: the
+        Google clients create their grpc.aio channel when constructed, which fails on a
+        worker thread ("no current event loop") and binds them to the loop that uses them.
+        """
+        self.get_llm()
+        self.get_embeddings()
+        log.info("ModelRegistry warmed")
+
+    def refresh(self) -> None:
+        """Drop all cached clients; the next access rebuilds them from env + config."""
+        with self._lock:
+            self._loader = None
+            self._llm = None
+            self._embeddings = None
+        log.info("ModelRegistry refreshed")
+
+
+# Single shared registry per worker process
+MODEL_REGISTRY = ModelRegistry()
+
+
 if __name__ == "__main__":
     loader = ModelLoader()
 
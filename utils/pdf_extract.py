@@ -0,0 +1,104 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+import fitz  # PyMuPDF
+from langchain.schema import Document
+from utils.config_loader import load_config
+from utils.concurrency import get_cpu_executor, in_cpu_worker
+from utils.file_io import file_sha256
+from utils.result_cache import ResultCacheStore
+from logger import GLOBAL_LOGGER as log
+
+# Cache kind for extracted page text; bump (with blob_store.PARSED_ARTIFACT) when the extraction changes
+PDF_PAGES_KIND = "pdf_pages_v1"
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Text of pages [start, stop). Runs in worker processes."""
+    with fitz.open(path) as doc:
+        return [doc.load_page(n).get_text() for n in range(start, stop)]  # type: ignore
+
+
+def pages_to_text(pages: List[str]) -> str:
+    """One text with "--- Page N ---" markers (read by map_reduce.split_pages); blank pages left out."""
+    return "\n".join(f"\n--- Page {n + 1} ---\n{text}" for n, text in enumerate(pages) if text.strip())
+
+
+class PdfExtractor:
+    """
+    PyMuPDF page text for every PDF path (analysis, compare and chat ingestion).
+
+    Page texts are cached by the file's sha256, so the same bytes are extracted once
+    whatever the session or endpoint. PDFs with at least `parallel_min_pages` pages
+    are cut into `workers` page ranges extracted on the shared CPU process pool.
+    """
+
+    def __init__(self, cache: Optional[ResultCacheStore] = None, workers: int = 1, parallel_min_pages: int = 64):
+        self.cache = cache
+        self.workers = max(1, int(workers))
+        self.parallel_min_pages = int(parallel_min_pages)
+
+    def _extract(self, path: str) -> List[str]:
+        with fitz.open(path) as doc:
+            if doc.needs_pass:
+                raise ValueError(f"PDF is encrypted: {Path(path).name}")
+            count = doc.page_count
+            # Already in a CPU pool worker (e.g. load_documents, read_pdf_via_handler): serial
+            if self.workers <= 1 or count < self.parallel_min_pages or in_cpu_worker():
+                return [doc.load_page(n).get_text() for n in range(count)]  # type: ignore
+        step = -(-count // self.workers)
+        starts = list(range(0, count, step))
+        parts = get_cpu_executor().map(
+            _extract_range, [path] * len(starts), starts, [min(s + step, count) for s in starts]
+        )
+        return [text for part in parts for text in part]
+
+    def page_texts(self, path: Path | str, sha256: Optional[str] = None) -> List[str]:
+        """Text of every page, blank pages included (index = page number - 1)."""
+        path = str(path)
+        sha256 = sha256 or file_sha256(path)
+        if self.cache is not None:
+            cached = self.cache.get(PDF_PAGES_KIND, sha256)
+            if cached is not None:
+                log.info("PDF text served from cache", path=path, pages=len(cached), sha256=sha256)
+                return cached
+        t0 = time.perf_counter()
+        pages = self._extract(path)
+        log.info("PDF text extracted", path=path, pages=len(pages), seconds=round(time.perf_counter() - t0, 3))
+        if self.cache is not None:
+            self.cache.put(PDF_PAGES_KIND, sha256, pages)
+        return pages
+
+    def documents(self, path: Path | str, sha256: Optional[str] = None) -> List[Document]:
+        """One Document per page, with PyPDFLoader's source/page (0-based)/total_pages metadata."""
+        pages = self.page_texts(path, sha256)
+        return [
+            Document(page_content=text, metadata={"source": str(path), "page": n, "total_pages": len(pages)})
+            for n, text in enumerate(pages)
+        ]
+
+
+_EXTRACTOR: Optional[PdfExtractor] = None
+_EXTRACTOR_LOCK = threading.Lock()
+
+def get_pdf_extractor() -> PdfExtractor:
+    """Process-wide extractor configured from the `pdf_extraction` section."""
+    global _EXTRACTOR
+    with _EXTRACTOR_LOCK:
+        if _EXTRACTOR is None:
+            cfg = load_config().get("pdf_extraction", {})
+            cache_cfg = cfg.get("cache", {})
+            cache = None
+            if cache_cfg.get("enabled", True):
+                cache = ResultCacheStore(
+                    os.getenv("PDF_TEXT_CACHE_PATH", cache_cfg.get("path", "cache/pdf_text.sqlite")),
+                    max_entries=cache_cfg.get("max_entries", 5000),
+                    max_bytes=cache_cfg.get("max_bytes"),
+                )
+            _EXTRACTOR = PdfExtractor(
+                cache, workers=cfg.get("workers", 1), parallel_min_pages=cfg.get("parallel_min_pages", 64)
+            )
+        return _EXTRACTOR
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+from utils.config_loader import load_config
+from logger import GLOBAL_LOGGER as log
+
+
+class ResultCacheStore:
+    """
+    Persistent cache of parsed LLM results (SQLite, WAL mode), keyed by (kind, key).
+    Evicts least recently used rows beyond `max_entries` or `max_bytes` of JSON payload.
+    """
+
+    def __init__(self, path: Path | str, max_entries: int = 10_000, max_bytes: Optional[int] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_results_access ON results(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM results WHERE kind=? AND key=?", (kind, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE results SET last_access=? WHERE kind=? AND key=?", (time.time(), kind, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results(kind, key, payload, nbytes, created_at, last_access) "
+                "VALUES (?,?,?,?,?,?)",
+                (kind, key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, nbytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results"
+            ).fetchone()
+            total = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "bytes": nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _evict(self) -> None:
+        count, nbytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results"
+        ).fetchone()
+        if count <= self.max_entries and (self.max_bytes is None or nbytes <= self.max_bytes):
+            return
+        # One statement: keep the most recently used rows while both limits hold (running
+        # count and byte sum, newest first) and delete the rest. The row just written is
+        # always kept, even if it alone exceeds max_bytes.
+        evicted = self._conn.execute(
+            "DELETE FROM results WHERE rowid IN ("
+            " SELECT rowid FROM ("
+            "  SELECT rowid, ROW_NUMBER() OVER w AS rn, SUM(nbytes) OVER w AS kept FROM results"
+            "  WINDOW w AS (ORDER BY last_access DESC, rowid DESC ROWS UNBOUNDED PRECEDING)"
+            " ) WHERE rn > 1 AND (rn > ? OR (? IS NOT NULL AND kept > ?)))",
+            (self.max_entries, self.max_bytes, self.max_bytes),
+        ).rowcount
+        self._conn.commit()
+        if evicted:
+            self.evictions += evicted
+            log.info("Result cache evicted", evicted=evicted, max_entries=self.max_entries)
+
+
+def llm_name(llm: Any) -> str:
+    """Model identifier of a chat model client (ChatGroq uses model_name, Gemini uses model)."""
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+
+def prompt_version(prompt: Any) -> str:
+    """Short hash of a prompt's template text; editing the prompt changes it."""
+    text = prompt.pretty_repr() if hasattr(prompt, "pretty_repr") else repr(prompt)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def result_key(
+    file_hashes: Sequence[str], prompts: Any, llm: Any, settings: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Cache key for an LLM result over the given uploads (order matters). `prompts` is every
+    prompt that can shape the result (one prompt or a list) and `settings` the config
+    values that do (e.g. map-reduce budgets), so editing any of them gives a new key.
+    """
+    if not isinstance(prompts, (list, tuple)):
+        prompts = [prompts]
+    parts = [*file_hashes, *(prompt_version(p) for p in prompts), llm_name(llm)]
+    if settings:
+        parts.append(json.dumps(settings, sort_keys=True, default=str))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+_STORE: Optional[ResultCacheStore] = None
+_STORE_LOCK = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCacheStore]:
+    """Process-wide result cache, or None when `result_cache.enabled` is false."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            cfg = load_config().get("result_cache", {})
+            if not cfg.get("enabled", True):
+                return None
+            _STORE = ResultCacheStore(
+                os.getenv("RESULT_CACHE_PATH", cfg.get("path", "cache/results.sqlite")),
+                max_entries=cfg.get("max_entries", 10_000),
+                max_bytes=cfg.get("max_bytes"),
+            )
+        return _STORE
@@ -0,0 +1,268 @@
+from __future__ import annotations
+import fcntl
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from utils.blob_store import BlobStore, get_blob_store
+from utils.config_loader import load_config
+from logger import GLOBAL_LOGGER as log
+
+# Store name -> env var that relocates its root (same variables the API and handlers read)
+_PATH_ENV = {"chat_uploads": "UPLOAD_BASE", "analysis": "DATA_STORAGE_PATH", "chat_index": "FAISS_BASE"}
+
+
+def dir_size(path: Path) -> int:
+    """Bytes of all regular files below `path` (symlinks not followed)."""
+    total = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            continue
+    return total
+
+
+class StorageLifecycle:
+    """
+    Size and last-access ledger for per-session folders, with quota/TTL eviction.
+
+    Each store is a root whose direct subfolders are sessions (data/<session>,
+    data/document_analysis/<session>, faiss_index/<session>, ...). Handlers call
+    touch(); the sweeper lists each root one level deep and re-measures only folders
+    whose mtime moved since their last measurement. Per store, sessions idle past
+    `ttl_days` go first, then least recently used ones until `max_sessions` and
+    `max_bytes` hold. Sessions used within `grace_seconds` are never evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | str,
+        stores: Dict[str, Dict[str, Any]],
+        grace_seconds: float = 900,
+        sweep_interval: float = 600,
+        touch_interval: float = 60,
+        blobs: Optional[BlobStore] = None,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.stores = stores
+        self.grace_seconds = float(grace_seconds)
+        self.sweep_interval = float(sweep_interval)
+        self.touch_interval = float(touch_interval)
+        self.blobs = blobs  # upload blobs left without session links are collected on sweep
+        self._lock = threading.Lock()
+        self._touched: Dict[tuple, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                store TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                nbytes INTEGER,
+                measured_at REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (store, session_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_access ON sessions(store, last_access)")
+        self._conn.commit()
+
+    # ---------- Tracking ----------
+
+    def touch(self, store: str, session_id: Optional[str]) -> None:
+        """Record a use of `session_id` in `store` (at most one write per touch_interval)."""
+        if not session_id or store not in self.stores:
+            return
+        now = time.time()
+        key = (store, session_id)
+        with self._lock:
+            if now - self._touched.get(key, 0.0) < self.touch_interval:
+                return
+            self._touched[key] = now
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO sessions(store, session_id, last_access) VALUES (?, ?, ?) "
+                    "ON CONFLICT(store, session_id) DO UPDATE SET last_access=excluded.last_access",
+                    (store, session_id, now),
+                )
+
+    def _root(self, store: str) -> Path:
+        return Path(self.stores[store]["path"])
+
+    def refresh(self, store: str) -> None:
+        """Sync the ledger with the store's folders; size new and changed sessions only."""
+        root = self._root(store)
+        exclude = set(self.stores[store].get("exclude") or [])
+        found: Dict[str, float] = {}
+        if root.is_dir():
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or entry.name in exclude or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    found[entry.name] = entry.stat(follow_symlinks=False).st_mtime
+        with self._lock:
+            rows = {
+                sid: (nbytes, measured_at)
+                for sid, nbytes, measured_at in self._conn.execute(
+                    "SELECT session_id, nbytes, measured_at FROM sessions WHERE store=?", (store,)
+                )
+            }
+        gone = [sid for sid in rows if sid not in found]
+        measured = []
+        for sid, mtime in found.items():
+            nbytes, measured_at = rows.get(sid, (None, None))
+            if nbytes is None or measured_at is None or mtime > measured_at:
+                measured.append((store, sid, dir_size(root / sid), time.time(), mtime))
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM sessions WHERE store=? AND session_id=?", [(store, s) for s in gone])
+            # New folders start with their mtime as last access
+            self._conn.executemany(
+                "INSERT INTO sessions(store, session_id, nbytes, measured_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(store, session_id) DO UPDATE SET nbytes=excluded.nbytes, measured_at=excluded.measured_at",
+                measured,
+            )
+
+    # ---------- Eviction ----------
+
+    def plan(self, store: str, now: Optional[float] = None) -> Dict[str, Any]:
+        """What a sweep of `store` would evict, and why (ttl / max_sessions / max_bytes)."""
+        now = now or time.time()
+        cfg = self.stores[store]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, COALESCE(nbytes, 0), last_access FROM sessions "
+                "WHERE store=? ORDER BY last_access",
+                (store,),
+            ).fetchall()
+        ttl = float(cfg["ttl_days"]) * 86400 if cfg.get("ttl_days") else None
+        max_sessions = cfg.get("max_sessions")
+        max_bytes = cfg.get("max_bytes")
+        count, total = len(rows), sum(r[1] for r in rows)
+        evict: List[Dict[str, Any]] = []
+        for sid, nbytes, last_access in rows:  # least recently used first
+            if now - last_access < self.grace_seconds:
+                break
+            if ttl is not None and now - last_access > ttl:
+                reason = "ttl"
+            elif max_sessions is not None and count > int(max_sessions):
+                reason = "max_sessions"
+            elif max_bytes is not None and total > int(max_bytes):
+                reason = "max_bytes"
+            else:
+                continue
+            evict.append({"session_id": sid, "bytes": nbytes, "last_access": last_access, "reason": reason})
+            count -= 1
+            total -= nbytes
+        return {
+            "path": str(self._root(store)),
+            "sessions": len(rows),
+            "bytes": sum(r[1] for r in rows),
+            "max_sessions": max_sessions,
+            "max_bytes": max_bytes,
+            "ttl_days": cfg.get("ttl_days"),
+            "evict": evict,
+            "bytes_after": total,
+            "sessions_after": count,
+        }
+
+    def _delete(self, store: str, session_id: str) -> None:
+        path = self._root(store) / session_id
+        # Rename first so readers see the session vanish at once, then delete at leisure
+        trash = path.with_name(f".evicted-{session_id}-{uuid.uuid4().hex[:6]}")
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            trash = None  # type: ignore[assignment]
+        if trash is not None:
+            shutil.rmtree(trash, ignore_errors=True)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE store=? AND session_id=?", (store, session_id))
+            self._touched.pop((store, session_id), None)
+
+    def sweep(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Refresh every store and evict per plan(); dry_run only reports."""
+        report: Dict[str, Any] = {"dry_run": dry_run, "stores": {}}
+        for store in self.stores:
+            self.refresh(store)
+            plan = self.plan(store)
+            if not dry_run:
+                for item in plan["evict"]:
+                    self._delete(store, item["session_id"])
+                if plan["evict"]:
+                    log.info("Storage sessions evicted", store=store, evicted=len(plan["evict"]),
+                             freed=plan["bytes"] - plan["bytes_after"])
+            report["stores"][store] = plan
+        if self.blobs is not None:
+            report["blobs"] = self.blobs.collect_garbage(self.grace_seconds, dry_run=dry_run)
+        return report
+
+    # ---------- Background sweeper ----------
+
+    def _sweep_exclusive(self) -> None:
+        # One sweeper at a time across uvicorn workers; the others skip this round
+        with open(self.db_path.with_suffix(".sweep.lock"), "a") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                self.sweep()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self._sweep_exclusive()
+            except Exception as e:
+                log.error("Storage sweep failed", error=str(e))
+
+    def start(self) -> None:
+        if self._thread is not None or self.sweep_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="storage-sweeper", daemon=True)
+        self._thread.start()
+        log.info("Storage sweeper started", interval=self.sweep_interval, stores=list(self.stores))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_LIFECYCLE: Optional[StorageLifecycle] = None
+_LIFECYCLE_LOCK = threading.Lock()
+
+def get_storage_lifecycle() -> StorageLifecycle:
+    """Process-wide lifecycle manager configured from the `storage` section."""
+    global _LIFECYCLE
+    with _LIFECYCLE_LOCK:
+        if _LIFECYCLE is None:
+            cfg = load_config().get("storage", {})
+            stores = {}
+            for name, store_cfg in (cfg.get("stores") or {}).items():
+                env = _PATH_ENV.get(name)
+                stores[name] = {**store_cfg, "path": os.getenv(env, store_cfg["path"]) if env else store_cfg["path"]}
+            _LIFECYCLE = StorageLifecycle(
+                os.getenv("STORAGE_DB_PATH", cfg.get("db_path", "cache/storage.sqlite")),
+                stores,
+                grace_seconds=cfg.get("grace_seconds", 900),
+                sweep_interval=cfg.get("sweep_interval_seconds", 600),
+                blobs=get_blob_store(),
+            )
+        return _LIFECYCLE